@@ -0,0 +1,59 @@
+from cube import EngagementCube
+
+
+class ScoreAccumulator:
+    """Running per-region and per-college engagement sums and counts.
+
+    Chunks are folded in one at a time with ``update`` and partial
+    accumulators can be combined with ``merge``, so only the grouped totals
+    are ever kept in memory, never the scored rows themselves. ``cube``
+    collects the same chunks per region, college, zone and emotion.
+    """
+
+    def __init__(self):
+        self.region_totals = None
+        self.college_totals = None
+        self.score_sum = 0.0
+        self.score_count = 0
+        self.cube = EngagementCube()
+
+    @staticmethod
+    def _combine(current, partial):
+        if current is None:
+            return partial
+        return current.add(partial, fill_value=0)
+
+    def update(self, processed):
+        """Fold a scored chunk (output of calculate_engagement) into the totals."""
+        scores = processed["engagement_score"]
+        region_totals = processed.groupby("region", observed=True)["engagement_score"].agg(["sum", "count"])
+        college_totals = processed.groupby("college_name", observed=True)["engagement_score"].agg(["sum", "count"])
+
+        self.region_totals = self._combine(self.region_totals, region_totals)
+        self.college_totals = self._combine(self.college_totals, college_totals)
+        self.score_sum += float(scores.sum())
+        self.score_count += int(scores.count())
+        self.cube.update(processed)
+
+    def merge(self, other):
+        """Combine the totals of another accumulator into this one."""
+        if other.region_totals is not None:
+            self.region_totals = self._combine(self.region_totals, other.region_totals)
+            self.college_totals = self._combine(self.college_totals, other.college_totals)
+        self.score_sum += other.score_sum
+        self.score_count += other.score_count
+        self.cube.merge(other.cube)
+        return self
+
+    @staticmethod
+    def _means(totals):
+        means = totals["sum"] / totals["count"]
+        means.name = "engagement_score"
+        return means.sort_values(ascending=False)
+
+    def result(self):
+        """Return region scores, institution scores and the overall score."""
+        if self.region_totals is None:
+            raise ValueError("No rows were scored.")
+        overall = self.score_sum / self.score_count if self.score_count else float("nan")
+        return self._means(self.region_totals), self._means(self.college_totals), overall
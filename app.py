@@ -1,51 +1,388 @@
-from flask import Flask, render_template, jsonify
-import fireducks_test  # import the fireducks_test module
-import pandas_test  # import the test_pandas module
+import time
+
+STARTUP_BEGAN = time.perf_counter()
+
+from flask import Flask, Response, render_template, jsonify, request, redirect, url_for
+import functools
+import hashlib
 import json
+import os
+import threading
+
+import engine
+from engine import BACKENDS
+from jobs import JobManager
+from metrics_store import METRICS_SNAPSHOT
+from result_cache import RESULT_CACHE
 
 app = Flask(__name__)
 
+DATA_FILE = 'large_dataset_new.csv'
+
+# Comma separated backends (e.g. "pandas,fireducks", or "all") imported in a
+# background thread PREWARM_DELAY seconds after startup, so the first report
+# does not pay for the imports. Unset, every backend loads on first use.
+PREWARM_BACKENDS = os.environ.get('PREWARM_BACKENDS', '')
+PREWARM_DELAY = float(os.environ.get('PREWARM_DELAY', '1.0'))
+
+# Scoring columns kept resident in memory-mapped files shared by every worker
+# process: "1" keeps them in .cache next to the data file, a directory (e.g.
+# /dev/shm/engagement) puts them there. They are written at startup if missing
+# or stale, and in-memory reports then score them instead of loading the file.
+RESIDENT_DATA = os.environ.get('RESIDENT_DATA', '')
+RESIDENT = True if RESIDENT_DATA in ('1', 'true', 'yes') else RESIDENT_DATA or None
+
+# Length of the rolling window of detections posted to /ingest
+LIVE_WINDOW_SECONDS = float(os.environ.get('LIVE_WINDOW_SECONDS', '300'))
+
+# Reports run as background jobs; identical requests in flight share one job.
+# The report code and each backend's library are imported when a report first runs.
+jobs = JobManager({
+    name: functools.partial(engine.run_report, backend=name) for name in BACKENDS
+})
+REPORT_TEMPLATES = {
+    "fireducks": "fireducks_report.html",
+    "pandas": "pandas_report.html",
+}
+
+startup = {"import_seconds": None, "prewarm": {"status": "off", "seconds": None},
+           "resident": {"status": "off", "seconds": None}}
+
+
+def prewarm_backends(names):
+    """Import the report code and the ``names`` backends, recording how long it took."""
+    startup["prewarm"]["status"] = "running"
+    try:
+        startup["prewarm"]["seconds"] = engine.prewarm(names)
+    except Exception as e:
+        startup["prewarm"].update(status="failed", error=f"{type(e).__name__}: {e}")
+    else:
+        startup["prewarm"]["status"] = "done"
+
+
+def start_prewarm():
+    if not PREWARM_BACKENDS:
+        return
+    names = None if PREWARM_BACKENDS == 'all' else [name.strip() for name in PREWARM_BACKENDS.split(',')]
+    startup["prewarm"]["status"] = "scheduled"
+    timer = threading.Timer(PREWARM_DELAY, prewarm_backends, args=(names,))
+    timer.daemon = True
+    timer.start()
+
+def resident_directory():
+    """Directory of the resident columns: the one in RESIDENT_DATA, else None for .cache next to the data."""
+    return None if RESIDENT in (None, True) else RESIDENT
+
+def build_resident():
+    """Write the resident scoring columns unless they are up to date; the first worker builds, the rest wait."""
+    from resident import ensure_resident
+
+    startup["resident"] = {"status": "building", "seconds": None}
+    start = time.perf_counter()
+    try:
+        path, built = ensure_resident(DATA_FILE, resident_directory())
+    except Exception as e:
+        startup["resident"] = {"status": "failed", "seconds": time.perf_counter() - start,
+                               "error": f"{type(e).__name__}: {e}"}
+    else:
+        startup["resident"] = {"status": "built" if built else "ready", "seconds": time.perf_counter() - start,
+                               "path": path}
+
+def preload_resident():
+    """With RESIDENT_DATA set, write the resident columns before the app serves, so no report waits for them.
+
+    Otherwise nothing is done at startup: the first /sweep writes them,
+    behind the file lock of ``resident.ensure_resident``.
+    """
+    if RESIDENT:
+        build_resident()
+
+def report_window():
+    """The ``created_at`` window of the query string, as a pair of ISO strings, or None.
+
+    ``last`` (e.g. ``30m``, ``2h``) covers that long up to now, aligned to
+    the time partitions so requests in the same partition share a job and
+    cached result; otherwise ``start`` and/or ``end`` give the bounds.
+    """
+    if 'last' in request.args:
+        # Imported here so the app starts without pandas
+        from partitions import last_window
+        start, end = last_window(request.args['last'])
+        return start.isoformat(), end.isoformat()
+    if 'start' in request.args or 'end' in request.args:
+        return request.args.get('start') or None, request.args.get('end') or None
+    return None
+
+def report_options(backend):
+    """Read the optional report tuning parameters from the query string.
+
+    The resident columns are only used for ``backend`` and options that
+    compute the same result from them; other runs read the data file.
+    """
+    options = {
+        "chunksize": request.args.get('chunksize', type=int),
+        "median_mode": request.args.get('median_mode', 'exact'),
+        "kernel": request.args.get('kernel'),
+        "workers": request.args.get('workers', type=int),
+        "incremental": request.args.get('incremental', 'false').lower() in ('1', 'true', 'yes'),
+        "profiler": request.args.get('profiler'),
+        "window": report_window(),
+        "resident": None,
+    }
+    if RESIDENT and backend in BACKENDS and engine.resident_supported(backend, options["kernel"],
+                                                                       options["median_mode"]):
+        options["resident"] = RESIDENT
+    return options
+
 @app.route('/')
 def home():
-    return render_template('home.html')
+    return render_template('home.html', backends=[BACKENDS[name] for name in engine.available_backends()])
 
 @app.route('/fireducks_report')
 def fireducks_report():
-    region_scores, institution_scores, overall_score, total_chunk_time= fireducks_test.generate_engagement_report('large_dataset_new.csv')
-    return render_template('fireducks_report.html', region_scores=region_scores, institution_scores=institution_scores, overall_score=overall_score, total_chunk_time=total_chunk_time)
+    job = jobs.submit("fireducks", DATA_FILE, **report_options("fireducks"))
+    return redirect(url_for('job_progress', job_id=job.id))
 
 @app.route('/pandas_report')
 def pandas_report():
-    region_scores, institution_scores, overall_score, total_chunk_time= pandas_test.generate_engagement_report('large_dataset_new.csv')
-    return render_template('pandas_report.html', region_scores=region_scores, institution_scores=institution_scores, overall_score=overall_score, total_chunk_time=total_chunk_time)
+    job = jobs.submit("pandas", DATA_FILE, **report_options("pandas"))
+    return redirect(url_for('job_progress', job_id=job.id))
+
+@app.route('/reports/<backend>')
+def backend_report(backend):
+    """Run the report on any backend of ``engine.BACKENDS``, e.g. ``/reports/polars``."""
+    try:
+        job = jobs.submit(backend, DATA_FILE, **report_options(backend))
+    except ValueError as e:
+        return str(e), 404
+    return redirect(url_for('job_progress', job_id=job.id))
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a report job and return its id; ``backend`` names one of ``engine.BACKENDS``."""
+    try:
+        backend = request.args.get('backend', 'pandas')
+        job = jobs.submit(backend, DATA_FILE, **report_options(backend))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "job_id": job.id,
+        "status_url": url_for('job_status', job_id=job.id),
+        "events_url": url_for('job_events', job_id=job.id),
+    }), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Status and per-stage progress of a job, with the scores once it is done."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-sent events stream of the job status, one event per change until it finishes."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    def stream():
+        while True:
+            status = job.to_dict()
+            yield f"data: {json.dumps(status)}\n\n"
+            if status["status"] in ("done", "failed"):
+                return
+            job.wait(status["version"], timeout=15)
+
+    return Response(stream(), mimetype='text/event-stream', headers={"Cache-Control": "no-cache"})
+
+@app.route('/jobs/<job_id>/progress')
+def job_progress(job_id):
+    """Progress page of a report job; it opens the report when the job is done."""
+    job = jobs.get(job_id)
+    if job is None:
+        return "Unknown job", 404
+    return render_template('job_progress.html', job=job, backend=BACKENDS[job.backend])
+
+@app.route('/jobs/<job_id>/report')
+def job_report(job_id):
+    """Render the report of a finished job."""
+    job = jobs.get(job_id)
+    if job is None:
+        return "Unknown job", 404
+    if job.status != "done":
+        return redirect(url_for('job_progress', job_id=job.id))
+    region_scores, institution_scores, overall_score, total_chunk_time = job.result
+    return render_template(REPORT_TEMPLATES.get(job.backend, 'report.html'), backend=BACKENDS[job.backend], region_scores=region_scores, institution_scores=institution_scores, overall_score=overall_score, total_chunk_time=total_chunk_time)
+
+@app.route('/cube')
+def drill_down():
+    """Roll up the summary cube of the latest report without rescanning the data.
+
+    ``backend`` picks the report (default ``pandas``), ``by`` lists the
+    dimensions to group by (``region``, ``college_name``, ``zone``,
+    ``emotion``; none for the overall total) and each dimension given as a
+    parameter filters the cells, e.g.
+    ``/cube?by=zone&college_name=IIT%20Madras&emotion=happy``.
+    """
+    # Imported here so the app starts without NumPy and pandas
+    from cube import CUBES, DIMENSIONS
+
+    backend = request.args.get('backend', 'pandas')
+    cube = CUBES.get(DATA_FILE, backend)
+    if cube is None:
+        return jsonify({"error": f"No {backend} report has run in this process yet",
+                        "report_url": url_for('backend_report', backend=backend)}), 404
+    by = [dimension for dimension in request.args.get('by', '').split(',') if dimension]
+    filters = {dimension: request.args.getlist(dimension) for dimension in DIMENSIONS if dimension in request.args}
+    try:
+        rows = cube.rollup(by, filters)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"backend": backend, "by": by, "filters": filters, "rows": rows})
+
+@app.route('/cube/labels')
+def drill_down_labels():
+    """Labels of each cube dimension, for building drill-down filters."""
+    from cube import CUBES
+
+    backend = request.args.get('backend', 'pandas')
+    cube = CUBES.get(DATA_FILE, backend)
+    if cube is None:
+        return jsonify({"error": f"No {backend} report has run in this process yet"}), 404
+    return jsonify(cube.labels())
+
+@app.route('/sweep', methods=['POST'])
+def sweep():
+    """Score the data under several scoring parameter sets in one pass and compare their rankings.
+
+    The body is a JSON list of parameter overrides, or an object with the
+    list under ``variants``, e.g. ``[{"name": "strict", "max_deviation": 30}]``.
+    See ``sweep.sweep_engagement`` for the response. The sweep reads the
+    resident columns, writing them first if they are missing or stale.
+    """
+    # Imported here so the app starts without NumPy and pandas
+    from sweep import sweep_engagement
+
+    body = request.get_json(silent=True)
+    variants = body.get('variants') if isinstance(body, dict) else body
+    if not isinstance(variants, list) or not all(isinstance(variant, dict) for variant in variants):
+        return jsonify({"error": "Expected a JSON list of parameter overrides"}), 400
+    try:
+        result = sweep_engagement(DATA_FILE, variants, resident_directory())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+@app.route('/ingest', methods=['POST'])
+def ingest():
+    """Append a batch of detection records to the live window.
+
+    The body is a JSON array of records in the generator's schema, or an
+    object with such an array under ``records``. Only the scoring columns are
+    required; ``created_at`` defaults to the time of arrival.
+    """
+    # Imported here so the app starts without NumPy and pandas
+    from live import get_live_engagement
+    from schema import SchemaError
+
+    body = request.get_json(silent=True)
+    records = body.get('records') if isinstance(body, dict) else body
+    if not isinstance(records, list):
+        return jsonify({"error": "Expected a JSON array of records"}), 400
+    try:
+        accepted = get_live_engagement(LIVE_WINDOW_SECONDS).ingest(records)
+    except SchemaError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(accepted)
+
+@app.route('/live')
+def live_scores():
+    """Current engagement scores of the live window, kept up to date by ``/ingest``.
+
+    The response is the latest snapshot as is; its ``version`` goes into the ETag,
+    so a poll that finds nothing new gets a 304.
+    """
+    from live import get_live_engagement
+
+    snapshot = get_live_engagement(LIVE_WINDOW_SECONDS).snapshot
+    etag = f"{os.getpid()}-{snapshot['version']}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    response = jsonify(snapshot)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 @app.route('/get_metrics', methods=['GET'])
 def get_metrics():
-    """API endpoint to fetch metrics data."""
-    filename = "static/metrics_history.json"
-    try:
-        with open(filename, "r") as f:
-            data = json.load(f)
-    except FileNotFoundError:
-        return jsonify({"error": "Metrics file not found"}), 404
-
-    # Separate FireDucks and Pandas metrics
-    fireducks_data = [
-        {"session": key, "processing_time": value["processing_time"]}
-        for key, value in data.get("fireducks", {}).items()
-    ]
-    pandas_data = [
-        {"session": key, "processing_time": value["processing_time"]}
-        for key, value in data.get("pandas", {}).items()
+    """API endpoint to fetch metrics data.
+
+    Served from an in-memory snapshot of the metrics store that is refreshed
+    when the database changes. Optional query parameters: ``since`` (only
+    sessions with a larger ``id``), ``backend`` and a ``from``/``to`` time
+    window in Unix seconds. ``last_id`` in the response is the ``since`` to
+    pass on the next poll, and ``aggregates`` summarizes the whole history.
+    Responses carry an ETag; a matching If-None-Match gets a 304.
+    """
+    snapshot = METRICS_SNAPSHOT.refresh()
+    since = request.args.get('since', type=int)
+    backend = request.args.get('backend')
+    start_time = request.args.get('from', type=float)
+    end_time = request.args.get('to', type=float)
+
+    cache_counters = RESULT_CACHE.counters
+    etag = hashlib.blake2b(repr((snapshot.version, since, backend, start_time, end_time,
+                                 sorted(cache_counters.items()))).encode(), digest_size=12).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    sessions = [
+        session for session in snapshot.since(since)
+        if (backend is None or session["backend"] == backend)
+        and (start_time is None or session["created_at"] >= start_time)
+        and (end_time is None or session["created_at"] < end_time)
     ]
 
-    return jsonify({"fireducks": fireducks_data, "pandas": pandas_data})
+    # Separate the metrics of each backend
+    metrics = {name: [session for session in sessions if session["backend"] == name] for name in BACKENDS}
+
+    response = jsonify(dict(metrics, last_id=max(snapshot.last_id, since or 0), aggregates=snapshot.aggregates,
+                            result_cache=RESULT_CACHE.stats()))
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 
 @app.route('/metrics_chart')
 def metrics_chart():
-    """Renders the real-time chart page for metrics."""
-    return render_template('metrics_chart.html')
+    """Renders the real-time chart page for metrics, with one series per backend."""
+    backends = [{"name": name, "label": backend.label} for name, backend in BACKENDS.items()]
+    return render_template('metrics_chart.html', backends=backends)
+
+@app.route('/health')
+def health():
+    """Startup time of this process, pre-warming progress and which backends are loaded."""
+    return jsonify({
+        "status": "ok",
+        "pid": os.getpid(),
+        "startup": startup,
+        "backends": {
+            name: {"available": backend.available(), "loaded": backend.loaded,
+                   "import_seconds": backend.import_seconds}
+            for name, backend in BACKENDS.items()
+        },
+    })
+
+
+preload_resident()
+startup["import_seconds"] = time.perf_counter() - STARTUP_BEGAN
+print(f"App ready in {startup['import_seconds']:.3f} seconds (pid {os.getpid()}).")
+start_prewarm()
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    app.run(debug=True, threaded=True)
@@ -0,0 +1,312 @@
+# Headless benchmark of the engagement report engines. Generates datasets of
+# several sizes, runs every available engine on each with warmup and repeated
+# runs in a fresh subprocess, checks that the engines agree and writes the
+# results as JSON. A stored result file can be passed as a baseline to flag
+# regressions. --sweep K also times one what-if sweep over K parameter sets
+# against K separate sweeps of one set each:
+#
+#     python benchmark.py --sizes 100k,1m --repeat 5 --output results.json
+#     python benchmark.py --sizes 100k,1m --baseline results.json
+#     python benchmark.py --sizes 1m --engines numpy --sweep 8
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from engine.backends import get_backend
+from profiling import RunProfile, host_info, peak_rss_mb
+
+# Engine name -> engine backend and scoring kernel. "pandas" and "fireducks" run
+# the original DataFrame scoring; "numpy", "polars" and "duckdb" compute medians
+# and scores in NumPy after parsing with pandas, Polars and DuckDB.
+ENGINES = {
+    "pandas": ("pandas", "reference"),
+    "fireducks": ("fireducks", "reference"),
+    "numpy": ("numpy", "numpy"),
+    "polars": ("polars", "numpy"),
+    "duckdb": ("duckdb", "numpy"),
+}
+DEFAULT_SIZES = "100k,1m,5m,20m"
+DEFAULT_DATA_DIR = os.path.join(".cache", "benchmark")
+
+# Largest score difference between engines still counted as the same result
+PARITY_TOLERANCE = 1e-6
+
+# Slowdown of the median wall time against the baseline flagged as a regression
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+
+RESULT_MARKER = "BENCHMARK_RESULT "
+
+
+def parse_size(text):
+    """Parse a row count such as ``100k``, ``5m`` or ``20000``."""
+    text = text.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+
+def engine_available(engine):
+    """FireDucks, Polars and DuckDB are optional; the other engines only need pandas and NumPy."""
+    return get_backend(ENGINES[engine][0]).available()
+
+
+def dataset_path(data_dir, rows, seed):
+    return os.path.join(data_dir, f"bench-{rows}-seed{seed}.csv")
+
+
+def ensure_dataset(data_dir, rows, seed):
+    """Generate the benchmark CSV for ``rows`` unless it already exists."""
+    from generator import RegionalCollegeDataGenerator
+
+    path = dataset_path(data_dir, rows, seed)
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        print(f"Generating {rows:,} rows into {path}...")
+        RegionalCollegeDataGenerator(seed=seed).write_dataset(path + ".tmp", rows)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def run_engine(engine, data_file, warmup, repeat, report_options):
+    """Time one engine in this process; used by the subprocess of ``benchmark_engine``."""
+    from engine import generate_engagement_report
+
+    backend, kernel = ENGINES[engine]
+
+    runs = []
+    for run in range(warmup + repeat):
+        profile = RunProfile(engine)
+        start = time.perf_counter()
+        region_scores, institution_scores, overall_score, _ = generate_engagement_report(
+            data_file, backend=backend, kernel=kernel, use_result_cache=False, record_metrics=False, profile=profile, **report_options)
+        wall = time.perf_counter() - start
+        if run >= warmup:
+            runs.append({"wall": wall, "rows": profile.rows, "stages": profile.stages})
+
+    return {
+        "runs": runs,
+        "peak_rss_mb": peak_rss_mb(),
+        "scores": {
+            "region": {str(k): float(v) for k, v in region_scores.items()},
+            "institution": {str(k): float(v) for k, v in institution_scores.items()},
+            "overall": float(overall_score),
+        },
+    }
+
+
+def benchmark_engine(engine, data_file, warmup, repeat, report_options):
+    """Run ``run_engine`` in a fresh interpreter so imports, caches and peak RSS are per engine."""
+    command = [sys.executable, os.path.abspath(__file__), "--worker", engine, os.path.abspath(data_file),
+               "--warmup", str(warmup), "--repeat", str(repeat), "--report-options", json.dumps(report_options)]
+    completed = subprocess.run(command, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise RuntimeError(f"{engine} benchmark failed:\n{completed.stderr[-2000:]}")
+
+
+def summarize(engine, rows, measured):
+    """Median/p95 wall time, throughput and per-stage timings of the measured runs."""
+    walls = np.array([run["wall"] for run in measured["runs"]])
+    stages = {}
+    for name in measured["runs"][0]["stages"]:
+        seconds = np.array([run["stages"][name]["seconds"] for run in measured["runs"] if name in run["stages"]])
+        stages[name] = {
+            "median_seconds": float(np.median(seconds)),
+            "p95_seconds": float(np.percentile(seconds, 95)),
+            "rss_delta_mb": max(run["stages"][name]["rss_delta_mb"] or 0 for run in measured["runs"]
+                                if name in run["stages"]),
+        }
+    median = float(np.median(walls))
+    return {
+        "engine": engine,
+        "rows": rows,
+        "repeat": len(walls),
+        "wall": {
+            "median": median,
+            "p95": float(np.percentile(walls, 95)),
+            "min": float(walls.min()),
+            "runs": walls.tolist(),
+        },
+        "rows_per_sec": rows / median if median else None,
+        "peak_rss_mb": measured["peak_rss_mb"],
+        "stages": stages,
+    }
+
+
+def sweep_variants(count):
+    """``count`` what-if variants: max_deviation spread over 20-80 degrees, every other one also reweighting happy."""
+    variants = []
+    for index in range(count):
+        variant = {"name": f"variant-{index + 1}", "max_deviation": 20 + 60 * index / max(count - 1, 1)}
+        if index % 2:
+            variant["emotion_weights"] = {"happy": 10}
+        variants.append(variant)
+    return variants
+
+
+def _sweep_scores(variant):
+    return {
+        "region": {row["label"]: row["score"] for row in variant["region_scores"]},
+        "institution": {row["label"]: row["score"] for row in variant["institution_scores"]},
+        "overall": variant["overall_score"],
+    }
+
+
+def benchmark_sweep(data_file, count, warmup, repeat):
+    """Time one sweep over ``count`` variants against ``count`` separate sweeps of one variant each.
+
+    Both read the resident columns, written before timing starts, and both
+    score the baseline parameters too: once in the single sweep, once per
+    separate sweep, as running the variants one at a time would.
+    """
+    from sweep import sweep_engagement
+
+    variants = sweep_variants(count)
+    sweep_engagement(data_file, [])
+    combined, separate = [], []
+    for run in range(warmup + repeat):
+        start = time.perf_counter()
+        result = sweep_engagement(data_file, variants)
+        combined_wall = time.perf_counter() - start
+        start = time.perf_counter()
+        singles = [sweep_engagement(data_file, [variant]) for variant in variants]
+        separate_wall = time.perf_counter() - start
+        if run >= warmup:
+            combined.append(combined_wall)
+            separate.append(separate_wall)
+
+    difference = max(score_difference(_sweep_scores(variant), _sweep_scores(single["variants"][1]))
+                     for variant, single in zip(result["variants"][1:], singles))
+    combined_median, separate_median = float(np.median(combined)), float(np.median(separate))
+    return {
+        "rows": result["rows"],
+        "variants": count,
+        "sweep": {"median": combined_median, "runs": combined},
+        "separate": {"median": separate_median, "runs": separate},
+        "speedup": separate_median / combined_median if combined_median else None,
+        "parity": {"max_abs_diff": difference, "ok": difference <= PARITY_TOLERANCE},
+    }
+
+
+def score_difference(scores, reference):
+    """Largest absolute difference between two engines' region, institution and overall scores."""
+    difference = abs(scores["overall"] - reference["overall"])
+    for level in ("region", "institution"):
+        if scores[level].keys() != reference[level].keys():
+            return float("inf")
+        difference = max([difference] + [abs(value - reference[level][key]) for key, value in scores[level].items()])
+    return difference
+
+
+def compare_to_baseline(results, baseline, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    """Return the (size, engine) results whose median wall time regressed past ``threshold``."""
+    previous = {(entry["rows"], entry["engine"]): entry for entry in baseline["results"]}
+    regressions = []
+    for entry in results:
+        before = previous.get((entry["rows"], entry["engine"]))
+        if before is None:
+            continue
+        ratio = entry["wall"]["median"] / before["wall"]["median"]
+        entry["baseline_ratio"] = ratio
+        if ratio > 1 + threshold:
+            regressions.append(entry)
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the engagement report engines.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma separated row counts, e.g. 100k,1m,5m")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="comma separated engines to run")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs before measuring")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per engine and size")
+    parser.add_argument("--seed", type=int, default=42, help="seed of the generated datasets")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="where the generated datasets are kept")
+    parser.add_argument("--chunksize", type=int, default=None, help="benchmark the streaming path instead")
+    parser.add_argument("--columnar-cache", action="store_true", help="load through the columnar cache")
+    parser.add_argument("--sweep", type=int, default=None, metavar="K",
+                        help="also time one sweep over K parameter sets against K separate sweeps")
+    parser.add_argument("--output", default=None, help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="compare against the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="slowdown against the baseline reported as a regression")
+    parser.add_argument("--worker", nargs=2, metavar=("ENGINE", "DATA_FILE"), help=argparse.SUPPRESS)
+    parser.add_argument("--report-options", default="{}", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.worker:
+        engine, data_file = args.worker
+        measured = run_engine(engine, data_file, args.warmup, args.repeat, json.loads(args.report_options))
+        print(RESULT_MARKER + json.dumps(measured))
+        return 0
+
+    engines = []
+    for engine in filter(None, args.engines.split(",")):
+        if engine not in ENGINES:
+            raise SystemExit(f"Unknown engine: {engine}")
+        if engine_available(engine):
+            engines.append(engine)
+        else:
+            print(f"Skipping {engine}: the library is not installed.")
+    report_options = {"chunksize": args.chunksize, "use_cache": args.columnar_cache}
+
+    results = []
+    sweeps = []
+    for rows in map(parse_size, args.sizes.split(",")):
+        data_file = ensure_dataset(args.data_dir, rows, args.seed)
+        reference = None
+        for engine in engines:
+            print(f"Benchmarking {engine} on {rows:,} rows ({args.warmup} warmup, {args.repeat} timed runs)...")
+            measured = benchmark_engine(engine, data_file, args.warmup, args.repeat, report_options)
+            entry = summarize(engine, rows, measured)
+            reference = reference or (engine, measured["scores"])
+            difference = score_difference(measured["scores"], reference[1])
+            entry["parity"] = {"reference": reference[0], "max_abs_diff": difference,
+                               "ok": difference <= PARITY_TOLERANCE}
+            results.append(entry)
+            print(f"  median {entry['wall']['median']:.3f}s, p95 {entry['wall']['p95']:.3f}s, "
+                  f"{entry['rows_per_sec']:,.0f} rows/sec, process peak RSS {entry['peak_rss_mb'] or 0:.0f} MiB, "
+                  f"parity {'ok' if entry['parity']['ok'] else 'MISMATCH'} ({difference:.2e})")
+        if args.sweep:
+            print(f"Benchmarking a sweep of {args.sweep} variants against {args.sweep} separate sweeps "
+                  f"on {rows:,} rows...")
+            entry = benchmark_sweep(data_file, args.sweep, args.warmup, args.repeat)
+            sweeps.append(entry)
+            print(f"  one sweep {entry['sweep']['median']:.3f}s, separate {entry['separate']['median']:.3f}s, "
+                  f"{entry['speedup']:.2f}x, parity {'ok' if entry['parity']['ok'] else 'MISMATCH'} "
+                  f"({entry['parity']['max_abs_diff']:.2e})")
+
+    exit_code = 0 if all(entry["parity"]["ok"] for entry in results + sweeps) else 1
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare_to_baseline(results, json.load(f), args.threshold)
+        for entry in regressions:
+            print(f"REGRESSION: {entry['engine']} on {entry['rows']:,} rows is "
+                  f"{entry['baseline_ratio']:.2f}x the baseline median")
+        if regressions:
+            exit_code = 1
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "host": host_info(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("worker", "report_options")},
+        "results": results,
+        "sweeps": sweeps,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+        print(f"Results saved to {args.output}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
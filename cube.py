@@ -0,0 +1,140 @@
+import math
+import os
+import threading
+
+import numpy as np
+import pandas
+
+# Dimensions of the summary cube, in key order
+DIMENSIONS = ("region", "college_name", "zone", "emotion")
+
+
+def _codes_and_labels(column):
+    """Integer codes of a label column and the label of each code; -1 marks missing values."""
+    if isinstance(column.dtype, pandas.CategoricalDtype):
+        return np.asarray(column.cat.codes.to_numpy(), dtype=np.int64), list(column.cat.categories)
+    codes, uniques = pandas.factorize(np.asarray(column))
+    return codes.astype(np.int64), list(uniques)
+
+
+class EngagementCube:
+    """Sum, count and sum of squares of ``engagement_score`` per (region, college, zone, emotion) cell.
+
+    Built from the scored chunks in the same pass as the report, so any
+    rollup or filter over these dimensions is answered from a few hundred
+    cells instead of rescanning the data. Missing labels are kept as None.
+    """
+
+    def __init__(self):
+        self.cells = {}
+
+    def update(self, processed):
+        """Fold a scored chunk (output of a scoring kernel) into the cells."""
+        codes, labels = zip(*(_codes_and_labels(processed[dimension]) for dimension in DIMENSIONS))
+        return self.add_codes(processed["engagement_score"].to_numpy(), codes, labels)
+
+    def add_codes(self, scores, codes, labels):
+        """Fold scores into the cells, given the integer codes of each dimension and the label of each code.
+
+        ``codes`` and ``labels`` follow ``DIMENSIONS``; code -1 marks a missing
+        label. Each row gets a combined cell code from its dimension codes,
+        then one ``bincount`` per statistic adds up the whole chunk.
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        valid = ~np.isnan(scores)
+        combined = np.zeros(len(scores), dtype=np.int64)
+        cell_labels = []
+        for dimension_codes, dimension_labels in zip(codes, labels):
+            dimension_codes = np.asarray(dimension_codes).astype(np.int64)
+            # Missing labels get the slot after the last category
+            dimension_codes[dimension_codes < 0] = len(dimension_labels)
+            combined = combined * (len(dimension_labels) + 1) + dimension_codes
+            cell_labels.append(list(dimension_labels) + [None])
+
+        combined, scores = combined[valid], scores[valid]
+        size = math.prod(len(dimension_labels) for dimension_labels in cell_labels)
+        counts = np.bincount(combined, minlength=size)
+        sums = np.bincount(combined, weights=scores, minlength=size)
+        squares = np.bincount(combined, weights=scores * scores, minlength=size)
+
+        for cell in np.flatnonzero(counts):
+            # Decode a copy; ``cell`` still indexes the statistics below
+            remainder = int(cell)
+            key = []
+            for dimension_labels in reversed(cell_labels):
+                remainder, code = divmod(remainder, len(dimension_labels))
+                key.append(dimension_labels[code])
+            self._add(tuple(reversed(key)), float(sums[cell]), int(counts[cell]), float(squares[cell]))
+        return self
+
+    def _add(self, key, total, count, squares):
+        cell = self.cells.get(key)
+        if cell is None:
+            self.cells[key] = [total, count, squares]
+        else:
+            cell[0] += total
+            cell[1] += count
+            cell[2] += squares
+
+    def merge(self, other):
+        """Add the cells of another cube into this one."""
+        for key, (total, count, squares) in other.cells.items():
+            self._add(key, total, count, squares)
+        return self
+
+    def rollup(self, by=(), filters=None):
+        """Aggregate the cells to the ``by`` dimensions, keeping only cells matching ``filters``.
+
+        ``filters`` maps a dimension to the labels to keep. Returns one dict
+        per group with its labels, ``count``, ``sum``, ``mean`` and
+        (population) ``std``, highest mean first.
+        """
+        by = tuple(by)
+        filters = filters or {}
+        for dimension in by + tuple(filters):
+            if dimension not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension: {dimension}")
+        positions = [DIMENSIONS.index(dimension) for dimension in by]
+        wanted = [(DIMENSIONS.index(dimension), set(values)) for dimension, values in filters.items()]
+
+        groups = {}
+        for key, (total, count, squares) in self.cells.items():
+            if all(key[position] in values for position, values in wanted):
+                group = tuple(key[position] for position in positions)
+                totals = groups.setdefault(group, [0.0, 0, 0.0])
+                totals[0] += total
+                totals[1] += count
+                totals[2] += squares
+
+        rows = []
+        for group, (total, count, squares) in groups.items():
+            mean = total / count
+            row = dict(zip(by, group))
+            row.update(count=count, sum=total, mean=mean, std=math.sqrt(max(squares / count - mean * mean, 0.0)))
+            rows.append(row)
+        return sorted(rows, key=lambda row: row["mean"], reverse=True)
+
+    def labels(self):
+        """The labels present in each dimension."""
+        return {dimension: sorted({key[position] for key in self.cells}, key=lambda label: (label is None, str(label)))
+                for position, dimension in enumerate(DIMENSIONS)}
+
+
+class CubeStore:
+    """Cube of the latest report per input file and backend, for the drill-down endpoints."""
+
+    def __init__(self):
+        self.cubes = {}
+        self.lock = threading.Lock()
+
+    def put(self, data_file, backend, cube):
+        with self.lock:
+            self.cubes[(os.path.abspath(data_file), backend)] = cube
+
+    def get(self, data_file, backend):
+        with self.lock:
+            return self.cubes.get((os.path.abspath(data_file), backend))
+
+
+# Filled by generate_engagement_report in this process
+CUBES = CubeStore()
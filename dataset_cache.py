@@ -0,0 +1,118 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pandas
+import pyarrow as pa
+
+from schema import INPUT_SCHEMA, SCORING_COLUMNS, read_report_csv, to_backend_frame
+
+# Content hash samples: this many evenly spaced blocks of SAMPLE_BYTES each
+SAMPLE_BYTES = 1 << 20
+SAMPLE_COUNT = 16
+
+# Key of the cache metadata (fingerprint, schema and row count) in the Arrow schema metadata
+META_KEY = "engagement_cache"
+
+
+def file_fingerprint(path, full_hash=False):
+    """Return size, mtime and a content hash identifying the current version of a file.
+
+    By default the hash covers ``SAMPLE_COUNT`` evenly spaced blocks plus the
+    first and last block, which is enough to notice rewrites and appends
+    without reading gigabytes. ``full_hash`` hashes the whole file.
+    """
+    stat = os.stat(path)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(stat.st_size).encode())
+    with open(path, "rb") as f:
+        if full_hash:
+            for block in iter(lambda: f.read(SAMPLE_BYTES), b""):
+                digest.update(block)
+        else:
+            last = max(stat.st_size - SAMPLE_BYTES, 0)
+            for offset in sorted({0, last} | {last * i // SAMPLE_COUNT for i in range(SAMPLE_COUNT)}):
+                f.seek(offset)
+                digest.update(f.read(SAMPLE_BYTES))
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "content_hash": digest.hexdigest()}
+
+
+def cache_path(csv_file, cache_dir=None):
+    """Return the Arrow file that caches ``csv_file``."""
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(csv_file)), ".cache")
+    stem = os.path.splitext(os.path.basename(csv_file))[0]
+    return os.path.join(cache_dir, f"{stem}.arrow")
+
+
+def write_cache(frame, csv_file, fingerprint, cache_dir=None):
+    """Write the scoring columns of ``frame`` as an uncompressed, memory-mappable Arrow file.
+
+    Columns keep their schema dtypes: labels are stored dictionary-encoded
+    and floats as float32. The fingerprint of the CSV goes into the schema
+    metadata, so the data and the metadata describing it are replaced by a
+    single rename.
+    """
+    arrow_path = cache_path(csv_file, cache_dir)
+    os.makedirs(os.path.dirname(arrow_path), exist_ok=True)
+    table = pa.Table.from_pandas(frame[SCORING_COLUMNS].astype(INPUT_SCHEMA), preserve_index=False)
+    meta = {"fingerprint": fingerprint, "schema": INPUT_SCHEMA, "rows": table.num_rows}
+    table = table.replace_schema_metadata(dict(table.schema.metadata or {}, **{META_KEY: json.dumps(meta)}))
+
+    # Write to a file unique to this process and thread and rename, so readers never see a half-written cache
+    tmp_path = f"{arrow_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, arrow_path)
+
+
+def read_cache(arrow_path, fingerprint):
+    """Load a cached Arrow file through a memory map if it caches this exact file version, else return None."""
+    try:
+        with pa.memory_map(arrow_path, "r") as source:
+            reader = pa.ipc.open_file(source)
+            meta = json.loads((reader.schema.metadata or {}).get(META_KEY.encode(), b"{}"))
+            if meta.get("fingerprint") != fingerprint or meta.get("schema") != INPUT_SCHEMA:
+                return None
+            return reader.read_all().to_pandas()
+    except (FileNotFoundError, pa.ArrowInvalid, json.JSONDecodeError):
+        return None
+
+
+def load_scoring_frame(csv_file, cache_dir=None, pd=None, full_hash=False):
+    """Load the scoring columns of a CSV file, through the columnar cache.
+
+    A cold load parses the CSV and writes the cache, a warm load maps the
+    cached Arrow file. Concurrent cold loads take a file lock, so the first
+    one writes the cache and the others wait for it and then map it. Returns
+    the frame (converted to ``pd.DataFrame`` when a different pandas-compatible
+    module is given) and a dict with the load source (``"cache-cold"`` or
+    ``"cache-warm"``), the load time in seconds and the part of it spent
+    converting to ``pd``.
+    """
+    start_time = time.time()
+    fingerprint = file_fingerprint(csv_file, full_hash=full_hash)
+    arrow_path = cache_path(csv_file, cache_dir)
+    frame = read_cache(arrow_path, fingerprint)
+    source = "cache-warm"
+
+    if frame is None:
+        os.makedirs(os.path.dirname(arrow_path), exist_ok=True)
+        with open(arrow_path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                frame = read_cache(arrow_path, fingerprint)
+                if frame is None:
+                    frame = read_report_csv(pandas, csv_file)
+                    write_cache(frame, csv_file, fingerprint, cache_dir)
+                    source = "cache-cold"
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    convert_start = time.time()
+    frame = to_backend_frame(pd, frame)
+    end_time = time.time()
+    return frame, {"load_source": source, "load_time": end_time - start_time, "convert_time": end_time - convert_start}
@@ -0,0 +1,47 @@
+"""Engagement report engine shared by every dataframe backend.
+
+The report code lives in ``engine.report`` and runs on any backend of
+``engine.backends.BACKENDS``; pandas_test.py and fireducks_test.py are thin
+entry points bound to one backend each. The report names are imported from
+``engine.report`` on first access, so modules that only need the backend
+registry (e.g. ``metrics_store``, which ``engine.report`` itself imports)
+can import this package without loading the report code.
+"""
+import importlib
+import time
+
+from engine.backends import BACKENDS, RESIDENT_BACKEND, Backend, available_backends, get_backend, resident_supported
+
+_REPORT_NAMES = ("SCORING_KERNELS", "calculate_engagement", "find_common_viewpoint", "generate_engagement_report",
+                 "get_scoring_kernel", "save_metrics_to_json")
+
+__all__ = ["BACKENDS", "RESIDENT_BACKEND", "Backend", "available_backends", "get_backend", "prewarm",
+           "resident_supported", "run_report", *_REPORT_NAMES]
+
+
+def run_report(data_file, backend="pandas", **options):
+    """Call ``engine.report.generate_engagement_report``, importing the report code on the first call."""
+    from engine.report import generate_engagement_report
+    return generate_engagement_report(data_file, backend=backend, **options)
+
+
+def prewarm(backends=None):
+    """Import the report code and the libraries of ``backends`` (every installed one by default).
+
+    Returns the seconds each import took, with the report code under
+    ``"report"``; backends loaded earlier report their original import time.
+    """
+    start = time.perf_counter()
+    importlib.import_module("engine.report")
+    timings = {"report": time.perf_counter() - start}
+    for name in backends or available_backends():
+        backend = get_backend(name)
+        backend.load()
+        timings[backend.name] = backend.import_seconds
+    return timings
+
+
+def __getattr__(name):
+    if name in _REPORT_NAMES:
+        return getattr(importlib.import_module("engine.report"), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,53 @@
+# Run the engagement report from the command line on any installed backend:
+#
+#     python -m engine large_dataset_new.csv --backend fireducks
+#     python -m engine large_dataset_new.csv --backend polars --chunksize 500000
+import argparse
+import sys
+
+from engine.backends import BACKENDS, available_backends, get_backend
+from engine.report import SCORING_KERNELS, generate_engagement_report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the engagement report with a chosen backend.")
+    parser.add_argument("data_file", nargs="?", default="large_dataset_new.csv",
+                        help="CSV, Parquet or Arrow file, or a shard manifest")
+    parser.add_argument("--backend", default="pandas", choices=list(BACKENDS), help="dataframe backend to run on")
+    parser.add_argument("--kernel", default=None, choices=list(SCORING_KERNELS),
+                        help="scoring kernel (default: the backend's)")
+    parser.add_argument("--chunksize", type=int, default=None, help="stream the input in chunks of this many rows")
+    parser.add_argument("--workers", type=int, default=None, help="split the input across this many processes")
+    parser.add_argument("--median-mode", default="exact", choices=("exact", "approx"))
+    parser.add_argument("--incremental", action="store_true", help="only read rows appended since the last run")
+    parser.add_argument("--resident", nargs="?", const=True, default=None, metavar="DIR",
+                        help="score the shared memory-mapped columns, kept in DIR if given")
+    parser.add_argument("--no-result-cache", action="store_true", help="always recompute the report")
+    parser.add_argument("--list", action="store_true", help="list the backends and whether they are installed")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.list:
+        installed = available_backends()
+        for name, backend in BACKENDS.items():
+            print(f"{name:10} {backend.label:10} {'installed' if name in installed else 'not installed'}")
+        return 0
+
+    backend = get_backend(args.backend)
+    if not backend.available():
+        raise SystemExit(f"The {backend.label} backend needs {backend.requires}, which is not installed.")
+
+    region_scores, institution_scores, overall_score, processing_time = generate_engagement_report(
+        args.data_file, backend=backend, chunksize=args.chunksize, median_mode=args.median_mode, kernel=args.kernel,
+        workers=args.workers, incremental=args.incremental, use_result_cache=not args.no_result_cache,
+        resident=args.resident)
+    print("Region scores:")
+    print(region_scores.to_string())
+    print(f"\nOverall engagement score: {overall_score:.4f} ({processing_time:.2f} seconds)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+import importlib
+import importlib.util
+import time
+
+# Strings read_csv parses as missing by default in pandas. The Polars and DuckDB
+# readers pass the same list, so e.g. an emotion of "NaN" stays unweighted
+# instead of matching the "NaN" entry of the emotion weights.
+PANDAS_NA_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+]
+
+
+class ArrowCSVReader:
+    """``read_csv`` of a CSV engine that hands its results over as pandas frames.
+
+    The report code only needs ``read_csv`` and ``DataFrame`` from the module
+    it is given as ``pd``. Subclasses parse with their own engine and convert
+    through Arrow; everything after the read runs on pandas.
+    """
+
+    @property
+    def DataFrame(self):
+        import pandas
+        return pandas.DataFrame
+
+    def read_csv(self, source, usecols=None, dtype=None, chunksize=None, header="infer", names=None):
+        batches = self._read_batches(source, usecols, header is not None, names, chunksize)
+        frames = (self._to_pandas(batch, dtype) for batch in batches)
+        return frames if chunksize else next(frames)
+
+    @staticmethod
+    def _to_pandas(table, dtype):
+        frame = table.to_pandas()
+        return frame.astype(dtype) if dtype else frame
+
+    def _read_batches(self, source, usecols, has_header, names, chunksize):
+        """Yield Arrow tables (or frames with ``to_pandas``) of at most ``chunksize`` rows, one table without it."""
+        raise NotImplementedError
+
+
+class PolarsReader(ArrowCSVReader):
+    def _read_batches(self, source, usecols, has_header, names, chunksize):
+        import polars
+
+        options = {"has_header": has_header, "null_values": PANDAS_NA_VALUES}
+        if usecols is not None:
+            # Without a header Polars names columns column_1...; select by position and rename
+            options["columns"] = usecols if has_header else [names.index(column) for column in usecols]
+            if not has_header:
+                options["new_columns"] = list(usecols)
+        elif names is not None:
+            options["new_columns"] = list(names)
+
+        if not chunksize:
+            yield polars.read_csv(source, **options)
+            return
+        reader = polars.read_csv_batched(source, batch_size=chunksize, **options)
+        while True:
+            batches = reader.next_batches(1)
+            if not batches:
+                return
+            yield batches[0]
+
+
+class DuckDBReader(ArrowCSVReader):
+    def _read_batches(self, source, usecols, has_header, names, chunksize):
+        import duckdb
+
+        connection = duckdb.connect()
+        try:
+            relation = connection.read_csv(source, header=has_header, names=names, na_values=PANDAS_NA_VALUES)
+            if usecols is not None:
+                relation = relation.project(", ".join(f'"{column}"' for column in usecols))
+            if not chunksize:
+                yield relation.arrow()
+                return
+            for batch in relation.fetch_record_batch(chunksize):
+                yield batch
+        finally:
+            connection.close()
+
+
+class Backend:
+    """A dataframe library the report engine can run on.
+
+    ``module`` is the import path of a pandas-compatible module, or a reader
+    class for libraries with another API; it is imported on first use of
+    ``pd``, so selecting one backend never loads the others. ``kernel`` is
+    the default scoring kernel and ``medians`` is ``"groupby"`` (grouped
+    ``median()`` on the loaded frame) or ``"sketch"`` (the NumPy histogram of
+    ``medians.PoseMedianSketch``). ``import_seconds`` is how long the first
+    ``load()`` took, None until then.
+    """
+
+    def __init__(self, name, label, module, requires=None, kernel="numpy", medians="groupby"):
+        self.name = name
+        self.label = label
+        self.module = module
+        self.requires = requires or module
+        self.kernel = kernel
+        self.medians = medians
+        self._pd = None
+        self.import_seconds = None
+
+    def available(self):
+        """Whether the library is installed, checked without importing it."""
+        return importlib.util.find_spec(self.requires) is not None
+
+    @property
+    def loaded(self):
+        return self._pd is not None
+
+    def load(self):
+        """Import the library and return the module the report uses as ``pd``."""
+        if self._pd is None:
+            start = time.perf_counter()
+            if isinstance(self.module, str):
+                pd = importlib.import_module(self.module)
+            else:
+                importlib.import_module(self.requires)
+                pd = self.module()
+            self.import_seconds = time.perf_counter() - start
+            self._pd = pd
+        return self._pd
+
+    @property
+    def pd(self):
+        return self.load()
+
+    def __repr__(self):
+        return f"Backend({self.name!r})"
+
+
+BACKENDS = {
+    "pandas": Backend("pandas", "Pandas", "pandas"),
+    "fireducks": Backend("fireducks", "FireDucks", "fireducks.pandas", requires="fireducks"),
+    # pandas parses; medians and scores are computed in NumPy
+    "numpy": Backend("numpy", "NumPy", "pandas", medians="sketch"),
+    "polars": Backend("polars", "Polars", PolarsReader, requires="polars", medians="sketch"),
+    "duckdb": Backend("duckdb", "DuckDB", DuckDBReader, requires="duckdb", medians="sketch"),
+}
+
+
+def get_backend(backend):
+    """Look up a backend by name; a ``Backend`` is returned as is."""
+    if isinstance(backend, Backend):
+        return backend
+    try:
+        return BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown backend: {backend}") from None
+
+
+# Resident reports compute exact medians and fused NumPy scores on the shared
+# columns, which is what this backend does with its own copy of the data
+RESIDENT_BACKEND = "numpy"
+
+
+def resident_supported(backend, kernel=None, median_mode="exact"):
+    """Whether a report on ``backend`` with these options may be computed from the resident columns."""
+    backend = get_backend(backend)
+    return backend.name == RESIDENT_BACKEND and (kernel or backend.kernel) == "numpy" and median_mode == "exact"
+
+
+def available_backends():
+    """Names of the backends whose library is installed."""
+    return [name for name, backend in BACKENDS.items() if backend.available()]
@@ -0,0 +1,504 @@
+import time
+
+from aggregates import ScoreAccumulator
+from cube import CUBES, EngagementCube
+from dataset_cache import load_scoring_frame
+from engine.backends import RESIDENT_BACKEND, get_backend, resident_supported
+from incremental import DEFAULT_MEDIAN_TOLERANCE, incremental_engagement_totals
+from medians import PoseMedianSketch, streaming_zone_medians
+from metrics_store import record_session
+from parallel import parallel_engagement_totals
+from partitions import iter_window_chunks, plan_window, read_window_data, window_key, window_source
+from profiling import RunProfile
+from resident import find_common_viewpoint_resident, open_resident, score_resident
+from schema import MEDIAN_COLUMNS, POSE_COLUMNS, ZONES, dataset_files, iter_report_chunks, read_report_data
+from result_cache import RESULT_CACHE, report_cache_key
+from scoring import SCORING_PARAMS, calculate_engagement_numpy
+
+# Rows per chunk when streaming the CSV instead of loading it whole
+STREAM_CHUNKSIZE = 500_000
+
+
+def save_metrics_to_json(metrics_data, session_type="pandas", load_info=None, profile=None):
+    """Record the processing time of a session, with separate session counters per backend.
+
+    Sessions are appended to the SQLite metrics store in ``metrics_store``,
+    which replaced ``static/metrics_history.json``; the name is kept for
+    existing callers. ``load_info`` optionally adds how the data was loaded
+    (source and load time) and ``profile`` the stage timings of the run
+    (``RunProfile.to_dict``).
+    """
+    record_session(session_type, metrics_data, load_info, profile)
+
+
+def find_common_viewpoint(data):
+    """Calculate median head pose for each zone, all zones and angles in one groupby pass.
+
+    Medians are returned as float64 so scoring runs in float64 on the float32 pose columns.
+    """
+    medians = data.groupby('zone', observed=True)[POSE_COLUMNS].median()
+    zone_median_pose = {}
+
+    for zone in ZONES:
+        if zone in medians.index:
+            zone_median_pose[zone] = {
+                f"median_{column.split('.')[1]}": float(medians.at[zone, column]) for column in POSE_COLUMNS
+            }
+
+    return zone_median_pose
+
+
+def find_common_viewpoint_sketch(data):
+    """Calculate the exact median head pose for each zone from a NumPy histogram instead of a groupby."""
+    return PoseMedianSketch().update(data).exact([data])
+
+
+def calculate_engagement(chunk, zone_median_pose, params=SCORING_PARAMS):
+    """Calculate engagement scores for a chunk."""
+    emotion_weights = params["emotion_weights"]
+
+    # Map emotion weights
+    chunk["emotion_weight"] = chunk["emotion"].map(emotion_weights).fillna(0)
+    chunk["weighted_emotion"] = chunk["emotion_weight"] * chunk["confidence"]
+
+    # Retrieve the median pose values for each zone, as a frame of the chunk's own library
+    zone_median_df = type(chunk)(zone_median_pose).T.reset_index().rename(columns={
+        "index": "zone",
+        "median_pitch": "zone_median_pitch",
+        "median_yaw": "zone_median_yaw",
+        "median_roll": "zone_median_roll"
+    })
+    chunk = chunk.merge(zone_median_df, on="zone", how="left")
+
+    # Calculate deviations
+    chunk["pitch_deviation"] = (chunk["pose.pitch"] - chunk["zone_median_pitch"]).abs().clip(upper=100)
+    chunk["yaw_deviation"] = (chunk["pose.yaw"] - chunk["zone_median_yaw"]).abs().clip(upper=100)
+
+    # Normalize scores
+    max_deviation = params["max_deviation"]
+    chunk["yaw_score"] = (100 - (chunk["yaw_deviation"] / max_deviation * 100)).clip(lower=0)
+    chunk["pitch_score"] = (100 - (chunk["pitch_deviation"] / max_deviation * 100)).clip(lower=0)
+
+    # Aggregate scores
+    chunk["head_pose_score"] = (chunk["yaw_score"] * params["yaw_weight"]) + (chunk["pitch_score"] * params["pitch_weight"])
+    chunk["normalized_emotion"] = ((chunk["weighted_emotion"] + 50).clip(lower=0, upper=100))
+    chunk["engagement_score"] = ((chunk["head_pose_score"] * params["head_pose_weight"]) + (chunk["normalized_emotion"] * params["emotion_blend_weight"])).clip(lower=0, upper=100)
+
+    return chunk[["engagement_score", "zone", "region", "college_name", "emotion"]]
+
+
+# calculate_engagement is the reference implementation; "numpy" is the fused kernel
+SCORING_KERNELS = {
+    "reference": calculate_engagement,
+    "numpy": calculate_engagement_numpy,
+}
+
+# Backend.medians -> zone median implementation of the in-memory report
+MEDIAN_FUNCTIONS = {
+    "groupby": find_common_viewpoint,
+    "sketch": find_common_viewpoint_sketch,
+}
+
+
+def no_progress(stage, detail=None):
+    """Default progress callback of the report functions: ignore updates."""
+
+
+def get_scoring_kernel(name):
+    """Look up a scoring kernel by name."""
+    try:
+        return SCORING_KERNELS[name]
+    except KeyError:
+        raise ValueError(f"Unknown scoring kernel: {name}") from None
+
+
+def generate_engagement_report(data_file, backend="pandas", chunksize=None, median_mode="exact", kernel=None,
+                               workers=None, use_cache=True, progress=no_progress, use_result_cache=True,
+                               incremental=False, tolerance=DEFAULT_MEDIAN_TOLERANCE, profiler=None, profile=None,
+                               record_metrics=True, cube=None, window=None, resident=None):
+    """Process the entire dataset and calculate engagement scores.
+
+    ``backend`` is the name of a backend in ``engine.backends.BACKENDS`` (or
+    a ``Backend``); its library is imported the first time it is used.
+    ``data_file`` is a CSV, Parquet or Arrow file, or the manifest of a sharded
+    dataset written by generator.py. When ``chunksize`` is given the data is
+    streamed in chunks of that many rows instead of being loaded whole, see
+    ``stream_engagement_report``. When ``workers`` is given the file is split
+    across that many processes, see ``parallel_engagement_report``. With
+    ``incremental`` only the rows appended to a CSV file since the last run
+    are read, see ``incremental_engagement_report``. ``median_mode`` is
+    ``"exact"`` or ``"approx"`` (zone medians from the histogram sketch, within
+    one bucket width, see ``medians.PoseMedianSketch``). ``kernel``
+    selects the scoring implementation from ``SCORING_KERNELS`` and defaults
+    to the backend's. With
+    ``use_cache`` the in-memory path loads the scoring columns of a CSV file
+    from the columnar cache in ``dataset_cache`` instead of parsing the whole
+    CSV; columnar inputs are read directly. ``progress(stage, detail=None)``
+    is called as the report enters each of the stages in ``jobs.STAGES``.
+
+    ``window`` is a ``(start, end)`` pair of ``created_at`` bounds (datetimes,
+    ISO strings or Unix seconds, None for an open side, see
+    ``partitions.parse_window``). Only the rows in it are scored, and the zone
+    medians are computed from them too. With ``use_cache`` the rows are read
+    from time partitions of the input, built on first use, so only the
+    partitions and row groups overlapping the window are read; otherwise the
+    input is scanned. Windows work with the in-memory and streaming paths.
+
+    With ``resident`` the in-memory path scores the memory-mapped columns
+    shared by every process on the machine instead of loading its own copy,
+    see ``resident_engagement_report``. ``True`` keeps them next to the
+    input; a directory (e.g. under ``/dev/shm``) puts them there. Only the
+    numpy backend with the numpy kernel and exact medians computes the same
+    result, so ``resident`` with anything else raises ValueError.
+
+    With ``use_result_cache`` a report already computed for the same input
+    version, backend, median mode, scoring parameters and code is returned from
+    ``result_cache.RESULT_CACHE`` instead.
+
+    Every computed run records per-stage timings, memory high-water marks,
+    rows/sec and host details with its metrics, see ``profiling.RunProfile``.
+    ``profiler`` (``"cprofile"`` or ``"tracemalloc"``) additionally dumps a
+    profile of the run to ``.cache/profiles``. Pass a ``RunProfile`` as
+    ``profile`` to read the timings back. With ``record_metrics=False`` the
+    run is not added to the metrics store.
+
+    The scoring pass also fills a ``cube.EngagementCube`` with the score
+    sum, count and sum of squares per region, college, zone and emotion. It
+    is cached with the result and kept in ``cube.CUBES`` for the drill-down
+    endpoints; pass an empty cube as ``cube`` to receive it.
+    """
+    backend = get_backend(backend)
+    cube = cube if cube is not None else EngagementCube()
+    kernel = kernel or backend.kernel
+    score_chunk = get_scoring_kernel(kernel)
+    if median_mode not in ("exact", "approx"):
+        raise ValueError(f"Unknown median mode: {median_mode}")
+    if window is not None and (incremental or workers):
+        raise ValueError("Time windows are only supported by the in-memory and streaming reports")
+    if resident and not resident_supported(backend, kernel, median_mode):
+        raise ValueError(f"Resident data is only scored by the {RESIDENT_BACKEND} backend with the numpy kernel "
+                         f"and exact medians")
+    if use_result_cache:
+        start_time = time.time()
+        cache_key = report_cache_key(data_file, backend.name, __file__, median_mode,
+                                     window=None if window is None else window_key(window),
+                                     tolerance=tolerance if incremental else None)
+        cached = RESULT_CACHE.get(cache_key)
+        if cached is not None:
+            progress("read", "result cache hit")
+            total_processing_time = time.time() - start_time
+            print(f"Served the engagement report from the result cache in {total_processing_time:.4f} seconds.\n")
+            if len(cached) > 4:
+                CUBES.put(data_file, backend.name, cube.merge(cached[4]))
+            return cached[:3] + (total_processing_time,)
+
+    profile = profile or RunProfile(backend.name, profiler)
+    try:
+        if incremental:
+            result = incremental_engagement_report(data_file, backend, median_mode, kernel, tolerance, progress,
+                                                   profile, record_metrics, cube)
+        elif workers:
+            result = parallel_engagement_report(data_file, backend, workers, median_mode, kernel, progress, profile,
+                                                record_metrics, cube)
+        elif chunksize:
+            result = stream_engagement_report(data_file, backend, chunksize, median_mode, kernel, progress, profile,
+                                              record_metrics, cube, window, use_cache)
+        elif resident and window is None:
+            result = resident_engagement_report(data_file, backend, None if resident is True else resident,
+                                                progress, profile, record_metrics, cube)
+        else:
+            result = memory_engagement_report(data_file, backend, score_chunk, use_cache, progress, profile,
+                                              record_metrics, cube, window, median_mode)
+    finally:
+        profile.stop()
+
+    CUBES.put(data_file, backend.name, cube)
+    if use_result_cache:
+        RESULT_CACHE.put(cache_key, result + (cube,))
+    return result
+
+
+def memory_engagement_report(data_file, backend, score_chunk, use_cache=True, progress=no_progress, profile=None,
+                             record_metrics=True, cube=None, window=None, median_mode="exact"):
+    """Calculate engagement scores with the whole dataset loaded into memory.
+
+    The scored rows are added to ``cube`` when one is given. With a
+    ``window`` only the rows in it are loaded, see ``partitions.read_window_data``.
+    With ``median_mode="approx"`` the zone medians are read from the
+    histogram sketch without the exact refinement.
+    """
+    backend = get_backend(backend)
+    pd = backend.pd
+    profile = (profile or RunProfile(backend.name)).start()
+    start_time = time.time()
+    print(f"=== Starting Engagement Report Generation ({backend.label}) ===\n")
+
+    # Step 1: Reading the scoring columns with their schema dtypes, from the columnar cache when enabled
+    progress("read")
+    files = dataset_files(data_file)
+    if window is not None:
+        print("Reading the rows in the time window...")
+        data, load_info = read_window_data(pd, data_file, window, use_partitions=use_cache)
+        print(f"Read {load_info['files_read']} of {load_info['files_total']} files.")
+    elif use_cache and files == [(data_file, "csv")]:
+        print("Loading the scoring columns through the columnar cache...")
+        data, load_info = load_scoring_frame(data_file, pd=pd)
+    else:
+        print("Reading the scoring columns of the data file...")
+        load_start = time.time()
+        data = read_report_data(pd, data_file)
+        load_source = "manifest" if data_file.endswith(".json") else files[0][1]
+        load_info = {"load_source": load_source, "load_time": time.time() - load_start}
+    print(f"Loaded data ({load_info['load_source']}) in {load_info['load_time']:.2f} seconds.")
+    profile.record("read", load_info["load_time"] - load_info.get("convert_time", 0.0))
+    if "convert_time" in load_info:
+        profile.record("convert", load_info["convert_time"])
+    profile.rows = len(data)
+
+    # Step 2: Finding common viewpoints for the dataset
+    print("Calculating common viewpoints...")
+    progress("medians")
+    with profile.stage("medians"):
+        if median_mode == "approx":
+            zone_median_pose = PoseMedianSketch().update(data).approximate()
+        else:
+            zone_median_pose = MEDIAN_FUNCTIONS[backend.medians](data)
+
+    # Step 3: Calculating engagement scores for the entire dataset
+    print("Calculating engagement scores...")
+    progress("scoring")
+    with profile.stage("scoring"):
+        processed_data = score_chunk(data, zone_median_pose)
+
+    # Step 4: Calculating final metrics
+    print("Calculating final metrics...")
+    progress("aggregation")
+    with profile.stage("aggregation"):
+        final_region_scores = processed_data.groupby('region', observed=True)['engagement_score'].mean().sort_values(ascending=False)
+        final_institution_scores = processed_data.groupby('college_name', observed=True)['engagement_score'].mean().sort_values(ascending=False)
+        final_overall_score = processed_data['engagement_score'].mean()
+        if cube is not None:
+            cube.update(processed_data)
+
+    total_processing_time = time.time() - start_time
+    print(f"Completed processing in {total_processing_time:.2f} seconds.\n")
+    profile.stop()
+    if record_metrics:
+        save_metrics_to_json(total_processing_time, backend.name, load_info=load_info,
+                             profile=profile.to_dict(total_processing_time))
+
+    return final_region_scores, final_institution_scores, final_overall_score, total_processing_time
+
+
+def resident_engagement_report(data_file, backend=RESIDENT_BACKEND, directory=None, progress=no_progress,
+                               profile=None, record_metrics=True, cube=None):
+    """Calculate engagement scores over the resident columns shared by every process on the machine.
+
+    The first run writes the scoring columns once as int16 label codes and
+    float32 arrays (see ``resident.ensure_resident``); every process then maps
+    them read-only and computes the zone medians and the fused NumPy scores
+    directly on the mapped arrays, so no process holds its own copy of the
+    data. The scored rows are added to ``cube`` when one is given. The run is
+    recorded under ``backend``, which must be ``RESIDENT_BACKEND``: no other
+    backend's library or median mode is involved.
+    """
+    backend = get_backend(backend)
+    if backend.name != RESIDENT_BACKEND:
+        raise ValueError(f"Resident data is only scored by the {RESIDENT_BACKEND} backend, not {backend.name}")
+    profile = (profile or RunProfile(backend.name)).start()
+    start_time = time.time()
+    print(f"=== Starting Resident Engagement Report Generation ({backend.label}) ===\n")
+
+    # Step 1: Mapping the shared columns, writing them first if the input changed
+    progress("read")
+    with profile.stage("read"):
+        dataset, load_source = open_resident(data_file, directory)
+    load_info = {"load_source": load_source, "load_time": time.time() - start_time}
+    print(f"Mapped {dataset.rows:,} rows ({load_source}) in {load_info['load_time']:.2f} seconds.")
+    profile.rows = dataset.rows
+
+    # Step 2: Finding common viewpoints from the mapped zone and pose columns
+    print("Calculating common viewpoints...")
+    progress("medians")
+    with profile.stage("medians"):
+        zone_median_pose = find_common_viewpoint_resident(dataset)
+
+    # Step 3: Scoring the mapped rows and summing them per region and college
+    print("Calculating engagement scores...")
+    progress("scoring")
+    with profile.stage("scoring"):
+        final_region_scores, final_institution_scores, final_overall_score = score_resident(
+            dataset, zone_median_pose, cube)
+    progress("aggregation")
+
+    total_processing_time = time.time() - start_time
+    print(f"Completed processing in {total_processing_time:.2f} seconds.\n")
+    profile.stop()
+    if record_metrics:
+        save_metrics_to_json(total_processing_time, backend.name, load_info=load_info,
+                             profile=profile.to_dict(total_processing_time))
+
+    return final_region_scores, final_institution_scores, final_overall_score, total_processing_time
+
+
+def find_common_viewpoint_streaming(data_file, backend="pandas", chunksize=STREAM_CHUNKSIZE, median_mode="exact",
+                                    window=None, plan=None):
+    """Calculate median head pose for each zone one chunk at a time.
+
+    Only the zone and pose columns are read. ``median_mode`` is ``"exact"``
+    (two passes) or ``"approx"`` (one pass), see ``medians.PoseMedianSketch``.
+    With a ``window`` only its rows are read, following ``plan`` from
+    ``partitions.plan_window`` when given.
+    """
+    pd = get_backend(backend).pd
+
+    def read_chunks():
+        if window is not None:
+            return iter_window_chunks(data_file, window, MEDIAN_COLUMNS, chunksize=chunksize, plan=plan)
+        return iter_report_chunks(pd, data_file, MEDIAN_COLUMNS, chunksize=chunksize)
+
+    return streaming_zone_medians(read_chunks, mode=median_mode)
+
+
+def stream_engagement_report(data_file, backend="pandas", chunksize=STREAM_CHUNKSIZE, median_mode="exact",
+                             kernel="numpy", progress=no_progress, profile=None, record_metrics=True, cube=None,
+                             window=None, use_partitions=True):
+    """Calculate engagement scores chunk by chunk, keeping only running per-group totals.
+
+    The accumulated cells are merged into ``cube`` when one is given. With a
+    ``window`` only its rows are read, from the time partitions of the input
+    when ``use_partitions`` is set, see ``partitions.iter_window_chunks``.
+    """
+    backend = get_backend(backend)
+    score_chunk = get_scoring_kernel(kernel)
+    profile = (profile or RunProfile(backend.name)).start()
+    start_time = time.time()
+    print(f"=== Starting Streaming Engagement Report Generation ({backend.label}, chunksize={chunksize}) ===\n")
+    load_info = None
+    plan = None
+    if window is not None:
+        with profile.stage("read"):
+            data_file, load_source = window_source(data_file, use_partitions)
+            plan, total = plan_window(data_file, window)
+        load_info = {"load_source": load_source, "files_read": len(plan), "files_total": total,
+                     "window": window_key(window)}
+        print(f"Reading {len(plan)} of {total} files for the time window.")
+
+    # Step 1: Finding common viewpoints from the zone and pose columns only
+    print("Calculating common viewpoints...")
+    progress("medians")
+    with profile.stage("medians"):
+        zone_median_pose = find_common_viewpoint_streaming(data_file, backend, chunksize, median_mode, window, plan)
+
+    # Step 2: Scoring each chunk and folding it into the running totals
+    print("Calculating engagement scores chunk by chunk...")
+    progress("scoring")
+    accumulator = ScoreAccumulator()
+    if window is not None:
+        chunks = iter_window_chunks(data_file, window, chunksize=chunksize, plan=plan)
+    else:
+        chunks = iter_report_chunks(backend.pd, data_file, chunksize=chunksize)
+    chunks = profile.timed_iter("read", chunks)
+    for chunk_number, chunk in enumerate(chunks, start=1):
+        with profile.stage("scoring"):
+            processed = score_chunk(chunk, zone_median_pose)
+        with profile.stage("aggregation"):
+            accumulator.update(processed)
+        print(f"Processed chunk {chunk_number} ({accumulator.score_count} rows so far)")
+        progress("scoring", f"{chunk_number} chunks, {accumulator.score_count} rows")
+
+    # Step 3: Merging the running totals into the final metrics
+    print("Calculating final metrics...")
+    progress("aggregation")
+    with profile.stage("aggregation"):
+        final_region_scores, final_institution_scores, final_overall_score = accumulator.result()
+        if cube is not None:
+            cube.merge(accumulator.cube)
+
+    total_processing_time = time.time() - start_time
+    print(f"Completed processing in {total_processing_time:.2f} seconds.\n")
+    profile.rows = accumulator.score_count
+    profile.stop()
+    if record_metrics:
+        save_metrics_to_json(total_processing_time, backend.name, load_info=load_info,
+                             profile=profile.to_dict(total_processing_time))
+
+    return final_region_scores, final_institution_scores, final_overall_score, total_processing_time
+
+
+def parallel_engagement_report(data_file, backend="pandas", workers=None, median_mode="exact", kernel="numpy",
+                               progress=no_progress, profile=None, record_metrics=True, cube=None):
+    """Calculate engagement scores over CSV byte ranges, row groups or shards in a process pool.
+
+    The workers' cells are merged into ``cube`` when one is given.
+    """
+    backend = get_backend(backend)
+    profile = (profile or RunProfile(backend.name)).start()
+    start_time = time.time()
+    print(f"=== Starting Parallel Engagement Report Generation ({backend.label}, workers={workers}) ===\n")
+
+    # Step 1: Median sketches and scoring per read unit, merged in this process
+    print("Calculating common viewpoints and engagement scores in worker processes...")
+    with profile.stage("workers"):
+        zone_median_pose, accumulator = parallel_engagement_totals(
+            data_file, backend.name, workers=workers, median_mode=median_mode, kernel=kernel, progress=progress)
+
+    # Step 2: Merging the partial totals into the final metrics
+    print("Calculating final metrics...")
+    progress("aggregation")
+    with profile.stage("aggregation"):
+        final_region_scores, final_institution_scores, final_overall_score = accumulator.result()
+        if cube is not None:
+            cube.merge(accumulator.cube)
+
+    total_processing_time = time.time() - start_time
+    print(f"Completed processing in {total_processing_time:.2f} seconds.\n")
+    profile.rows = accumulator.score_count
+    profile.stop()
+    if record_metrics:
+        save_metrics_to_json(total_processing_time, backend.name, profile=profile.to_dict(total_processing_time))
+
+    return final_region_scores, final_institution_scores, final_overall_score, total_processing_time
+
+
+def incremental_engagement_report(csv_file, backend="pandas", median_mode="exact", kernel="numpy",
+                                  tolerance=DEFAULT_MEDIAN_TOLERANCE, progress=no_progress, profile=None,
+                                  record_metrics=True, cube=None):
+    """Update the persisted report state with the rows appended to the CSV since the last run.
+
+    The whole file is only rescored when the zone medians drift more than
+    ``tolerance`` degrees, see ``incremental.incremental_engagement_totals``.
+    The persisted cells are merged into ``cube`` when one is given.
+    """
+    backend = get_backend(backend)
+    profile = (profile or RunProfile(backend.name)).start()
+    start_time = time.time()
+    print(f"=== Starting Incremental Engagement Report Generation ({backend.label}) ===\n")
+
+    # Step 1: Reading the new rows and folding them into the persisted state
+    print("Updating the report state with the new rows...")
+    with profile.stage("update"):
+        zone_median_pose, accumulator, update_info = incremental_engagement_totals(
+            csv_file, backend.name, backend.pd, get_scoring_kernel(kernel), median_mode=median_mode,
+            tolerance=tolerance, progress=progress)
+    print(f"Update mode: {update_info['mode']} ({update_info['new_bytes']} new bytes, "
+          f"median drift {update_info['drift']:.4f})")
+
+    # Step 2: Merging the running totals into the final metrics
+    print("Calculating final metrics...")
+    progress("aggregation")
+    with profile.stage("aggregation"):
+        final_region_scores, final_institution_scores, final_overall_score = accumulator.result()
+        if cube is not None:
+            cube.merge(accumulator.cube)
+
+    total_processing_time = time.time() - start_time
+    print(f"Completed processing in {total_processing_time:.2f} seconds.\n")
+    profile.rows = accumulator.score_count
+    profile.stop()
+    if record_metrics:
+        save_metrics_to_json(total_processing_time, backend.name,
+                             load_info={"load_source": f"incremental-{update_info['mode']}"},
+                             profile=profile.to_dict(total_processing_time))
+
+    return final_region_scores, final_institution_scores, final_overall_score, total_processing_time
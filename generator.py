@@ -1,10 +1,30 @@
+import argparse
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-import random
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+# Rows generated (and held in memory) at a time when streaming to disk
+DEFAULT_BATCH_SIZE = 1_000_000
+
+# Output formats and their file extensions
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+
+COLUMNS = [
+    'face_id', 'region', 'college_name', 'zone', 'emotion', 'confidence', 'created_at',
+    'position.x1', 'position.y1', 'position.x2', 'position.y2', 'position.center_x', 'position.center_y',
+    'pose.pitch', 'pose.yaw', 'pose.roll', 'pose.confidence'
+]
 
 class RegionalCollegeDataGenerator:
-    def __init__(self):
+    def __init__(self, seed=None):
         # Define regions and their colleges
         self.college_data = {
     'North': {
@@ -76,123 +96,377 @@ class RegionalCollegeDataGenerator:
             'right': 0.30
         }
 
+        # Position and yaw depend on the zone: inclusive x1 range and mean yaw
+        self.zone_x1_ranges = {
+            'left': (100, 300),
+            'center': (301, 600),
+            'right': (601, 800)
+        }
+        self.zone_yaw_means = {
+            'left': 15,     # Looking slightly right
+            'center': 0,    # Looking straight
+            'right': -15    # Looking slightly left
+        }
+
+        # Each batch draws from its own child of this seed sequence, so the output
+        # only depends on the seed and batch size, not on how many processes run
+        self.seed_sequence = np.random.SeedSequence(seed)
+
+        # Lookup arrays indexed by region, college and zone code
+        self.regions = list(self.college_data)
+        self.colleges = [name for colleges in self.college_data.values() for name in colleges]
+        self.region_colleges = [
+            np.array([self.colleges.index(name) for name in colleges]) for colleges in self.college_data.values()
+        ]
+        self.college_size_ranges = np.array(
+            [info['size_range'] for colleges in self.college_data.values() for info in colleges.values()]
+        )
+        self.zones = list(self.zone_probs)
+        self.emotions = list(self.emotion_probs)
+        self.x1_ranges = np.array([self.zone_x1_ranges[zone] for zone in self.zones])
+        self.yaw_means = np.array([self.zone_yaw_means[zone] for zone in self.zones], dtype=np.float64)
+
+    def batch_plan(self, num_records=500000, batch_size=DEFAULT_BATCH_SIZE):
+        """Split the records into ``(start_row, size)`` batches.
+
+        Records are split equally between regions, so the total is rounded down
+        to a multiple of the number of regions.
+        """
+        total = num_records // len(self.college_data) * len(self.college_data)
+        return [(start, min(batch_size, total - start)) for start in range(0, total, batch_size)]
+
+    def batch_rng(self, batch_index):
+        """Random generator for one batch, derived from the seed and the batch index only."""
+        seed = np.random.SeedSequence(self.seed_sequence.entropy, spawn_key=(batch_index,))
+        return np.random.default_rng(seed)
+
+    def _college_runs(self, region_code, length, rng):
+        """College code per row: random colleges of the region, each for a batch of students."""
+        candidates = self.region_colleges[region_code]
+        smallest = self.college_size_ranges[candidates, 0].min()
+        picks = candidates[rng.integers(0, len(candidates), length // smallest + 1)]
+        low, high = self.college_size_ranges[picks].T
+        sizes = rng.integers(low, high + 1)
+
+        # Keep just enough batches to cover the rows and trim the last one
+        ends = np.cumsum(sizes)
+        count = np.searchsorted(ends, length) + 1
+        sizes = sizes[:count]
+        sizes[-1] -= ends[count - 1] - length
+        return np.repeat(picks[:count], sizes)
+
+    def generate_batch(self, start, size, num_records, rng, now=None):
+        """Generate rows ``start`` to ``start + size`` of a ``num_records`` dataset as a DataFrame."""
+        now = np.datetime64(now or datetime.now(), 's')
+        rows = np.arange(start, start + size)
+
+        # Regions take equal consecutive blocks of rows; colleges come in batches within them
+        region_codes = rows // (num_records // len(self.college_data))
+        college_codes = np.concatenate([
+            self._college_runs(region, np.count_nonzero(region_codes == region), rng)
+            for region in np.unique(region_codes)
+        ])
+
+        zone_codes = rng.choice(len(self.zones), size, p=list(self.zone_probs.values()))
+        emotion_codes = rng.choice(len(self.emotions), size, p=list(self.emotion_probs.values()))
+
+        # Generate position based on zone
+        x1 = rng.integers(self.x1_ranges[zone_codes, 0], self.x1_ranges[zone_codes, 1] + 1)
+        y1 = rng.integers(100, 401, size)
+        width = rng.integers(100, 151, size)
+        height = rng.integers(120, 181, size)
+
+        # Generate pose data based on zone
+        yaw = rng.normal(self.yaw_means[zone_codes], 5)
+
+        return pd.DataFrame({
+            'face_id': 'face_' + pd.Series(rows + 1).astype(str),
+            'region': pd.Categorical.from_codes(region_codes, self.regions),
+            'college_name': pd.Categorical.from_codes(college_codes, self.colleges),
+            'zone': pd.Categorical.from_codes(zone_codes, self.zones),
+            'emotion': pd.Categorical.from_codes(emotion_codes, self.emotions),
+            'confidence': rng.uniform(0.85, 1.0, size).round(2),
+            'created_at': now + rng.integers(-120, 121, size).astype('timedelta64[m]'),
+            'position.x1': x1,
+            'position.y1': y1,
+            'position.x2': x1 + width,
+            'position.y2': y1 + height,
+            'position.center_x': x1 + width // 2,
+            'position.center_y': y1 + height // 2,
+            'pose.pitch': rng.normal(5, 10, size).round(2),  # Slight upward tilt
+            'pose.yaw': yaw.round(2),
+            'pose.roll': rng.normal(0, 5, size).round(2),  # Mostly level heads
+            'pose.confidence': rng.uniform(0.9, 1.0, size).round(2)
+        })
+
+    def iter_batches(self, num_records=500000, batch_size=DEFAULT_BATCH_SIZE, now=None):
+        """Yield the dataset as DataFrames of at most ``batch_size`` rows."""
+        now = now or datetime.now()
+        for batch_index, (start, size) in enumerate(self.batch_plan(num_records, batch_size)):
+            yield self.generate_batch(start, size, num_records, self.batch_rng(batch_index), now)
+
     def generate_student_data(self, num_records=500000):
         """Generate mock face detection data for students across regions and colleges."""
-        data = []
-        student_count = 0
-
-        # Calculate records per region (approximately equal distribution)
-        records_per_region = num_records // len(self.college_data)
-
-        for region, colleges in self.college_data.items():
-            records_remaining = records_per_region
-            
-            while records_remaining > 0:
-                # Randomly select a college from the region
-                college_name = random.choice(list(colleges.keys()))
-                college_info = colleges[college_name]
-                
-                # Generate a batch of students for this college
-                batch_size = min(
-                    random.randint(*college_info['size_range']),
-                    records_remaining
-                )
-                
-                # Generate data for each student in the batch
-                for _ in range(batch_size):
-                    student_count += 1
-                    
-                    # Generate base data
-                    zone = random.choices(
-                        list(self.zone_probs.keys()),
-                        weights=list(self.zone_probs.values())
-                    )[0]
-                    
-                    emotion = random.choices(
-                        list(self.emotion_probs.keys()),
-                        weights=list(self.emotion_probs.values())
-                    )[0]
-
-                    # Generate position based on zone
-                    if zone == 'left':
-                        x1 = random.randint(100, 300)
-                    elif zone == 'center':
-                        x1 = random.randint(301, 600)
-                    else:  # right
-                        x1 = random.randint(601, 800)
-
-                    y1 = random.randint(100, 400)
-                    width = random.randint(100, 150)
-                    height = random.randint(120, 180)
-                    x2 = x1 + width
-                    y2 = y1 + height
-                    center_x = x1 + width // 2
-                    center_y = y1 + height // 2
-
-                    # Generate pose data based on zone
-                    if zone == 'left':
-                        yaw = random.normalvariate(15, 5)  # Looking slightly right
-                    elif zone == 'center':
-                        yaw = random.normalvariate(0, 5)   # Looking straight
-                    else:  # right
-                        yaw = random.normalvariate(-15, 5) # Looking slightly left
-
-                    data.append({
-                        'face_id': f'face_{student_count}',
-                        'region': region,
-                        'college_name': college_name,
-                        'zone': zone,
-                        'emotion': emotion,
-                        'confidence': round(random.uniform(0.85, 1.0), 2),
-                        'created_at': (
-                            datetime.now() + 
-                            timedelta(
-                                minutes=random.randint(-120, 120)
-                            )
-                        ).strftime('%Y-%m-%d %H:%M:%S'),
-                        'position.x1': x1,
-                        'position.y1': y1,
-                        'position.x2': x2,
-                        'position.y2': y2,
-                        'position.center_x': center_x,
-                        'position.center_y': center_y,
-                        'pose.pitch': round(random.normalvariate(5, 10), 2),  # Slight upward tilt
-                        'pose.yaw': round(yaw, 2),
-                        'pose.roll': round(random.normalvariate(0, 5), 2),  # Mostly level heads
-                        'pose.confidence': round(random.uniform(0.9, 1.0), 2)
-                    })
-                
-                records_remaining -= batch_size
-
-        return pd.DataFrame(data)
-
-def main():
+        return pd.concat(self.iter_batches(num_records), ignore_index=True)
+
+    def write_dataset(self, output_file, num_records=500000, batch_size=DEFAULT_BATCH_SIZE, workers=1,
+                      file_format="csv", shards=1):
+        """Stream the dataset to disk batch by batch and return its DatasetSummary.
+
+        ``file_format`` is one of ``FORMATS``. With ``shards > 1`` the batches are
+        split into that many consecutive shard files plus a manifest next to
+        ``output_file``; when there are fewer batches than shards the batch size
+        is reduced so that every shard gets rows. With ``workers > 1`` files
+        (or, for a single output file, temporary parts of it) are written in a
+        process pool. Only one batch per process is held in memory, and the rows
+        only depend on the seed and batch size. The summary lists the files
+        written and the manifest path, if any.
+        """
+        if shards < 1:
+            raise ValueError(f"shards must be at least 1, got {shards}")
+        now = datetime.now()
+        plan = list(enumerate(self.batch_plan(num_records, batch_size)))
+        if shards > len(plan):
+            total = sum(size for _, (_, size) in plan)
+            if shards > total:
+                raise ValueError(f"Cannot split {total:,} records into {shards} shards")
+            batch_size = total // shards
+            plan = list(enumerate(self.batch_plan(num_records, batch_size)))
+        merge_parts = shards == 1 and workers > 1
+        parts = min(workers if merge_parts else shards, len(plan)) or 1
+
+        if merge_parts and parts > 1:
+            paths = [f"{output_file}.part{part:05d}" for part in range(parts)]
+        elif parts > 1:
+            paths = shard_paths(output_file, parts)
+        else:
+            paths = [output_file]
+        batch_groups = [plan[len(plan) * part // parts:len(plan) * (part + 1) // parts] for part in range(parts)]
+        tasks = [(self, path, file_format, group, num_records, now, not merge_parts) for path, group in zip(paths, batch_groups)]
+
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_write_file, *zip(*tasks)))
+        else:
+            results = [_write_file(*task) for task in tasks]
+
+        summary = DatasetSummary()
+        for part_summary in results:
+            summary.merge(part_summary)
+
+        if merge_parts and len(paths) > 1:
+            merge_files(paths, output_file, file_format)
+            summary.files = [output_file]
+        elif len(paths) > 1:
+            write_manifest(output_file, file_format, paths, results, self, batch_size, summary)
+            summary.files = paths
+            summary.manifest = manifest_path(output_file)
+        else:
+            summary.files = paths
+        return summary
+
+
+class BatchWriter:
+    """Append DataFrame batches to one CSV, Parquet or Arrow IPC file.
+
+    Labels are written dictionary-encoded to Parquet and Arrow, and as plain
+    strings to CSV using Arrow's CSV writer, which is several times faster than
+    ``DataFrame.to_csv``. CSV labels never need quoting; quoting style 'none'
+    makes the writer fail rather than emit a malformed row if one ever does.
+    """
+
+    def __init__(self, path, file_format="csv", header=True):
+        if file_format not in FORMATS:
+            raise ValueError(f"Unknown output format: {file_format}")
+        self.path = path
+        self.file_format = file_format
+        self.header = header
+        self.rows = 0
+        self._sink = None
+        self._writer = None
+
+    def write(self, batch):
+        table = pa.Table.from_pandas(batch, preserve_index=False)
+        if self.file_format == "csv":
+            if self._sink is None:
+                self._sink = open(self.path, "wb")
+                if self.header:
+                    self._sink.write((",".join(table.column_names) + "\n").encode())
+            table = table.cast(pa.schema([
+                pa.field(field.name, pa.string()) if pa.types.is_dictionary(field.type) else field
+                for field in table.schema
+            ]))
+            pa_csv.write_csv(table, self._sink, pa_csv.WriteOptions(include_header=False, quoting_style="none"))
+        elif self.file_format == "parquet":
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table, row_group_size=table.num_rows)
+        else:
+            if self._writer is None:
+                self._sink = pa.OSFile(self.path, "wb")
+                self._writer = pa.ipc.new_file(self._sink, table.schema)
+            self._writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class DatasetSummary:
+    """Row count and value counts of the summary columns, accumulated batch by batch."""
+
+    COLUMNS = ('region', 'college_name', 'emotion', 'zone')
+
+    def __init__(self):
+        self.rows = 0
+        self.counts = {column: {} for column in self.COLUMNS}
+        # Set by write_dataset: the data files written and the shard manifest
+        self.files = []
+        self.manifest = None
+
+    def update(self, batch):
+        self.rows += len(batch)
+        for column in self.COLUMNS:
+            for label, count in batch[column].value_counts().items():
+                self.counts[column][label] = self.counts[column].get(label, 0) + int(count)
+        return self
+
+    def merge(self, other):
+        self.rows += other.rows
+        for column in self.COLUMNS:
+            for label, count in other.counts[column].items():
+                self.counts[column][label] = self.counts[column].get(label, 0) + count
+        return self
+
+    def series(self, column, normalize=False):
+        counts = pd.Series(self.counts[column], name='count').sort_values(ascending=False)
+        counts.index.name = column
+        return counts / counts.sum() if normalize else counts
+
+    def to_dict(self):
+        return {"rows": self.rows, "counts": self.counts}
+
+
+def _write_file(generator, path, file_format, batches, num_records, now, header=True):
+    """Generate the given ``(batch_index, (start, size))`` batches into one file and summarize them."""
+    summary = DatasetSummary()
+    with BatchWriter(path, file_format, header=header) as writer:
+        for batch_index, (start, size) in batches:
+            batch = generator.generate_batch(start, size, num_records, generator.batch_rng(batch_index), now)
+            writer.write(batch)
+            summary.update(batch)
+    return summary
+
+
+def shard_paths(output_file, shards):
+    """File names of the shards of ``output_file``: ``name-00000-of-00004.ext`` and so on."""
+    stem, ext = os.path.splitext(output_file)
+    return [f"{stem}-{shard:05d}-of-{shards:05d}{ext}" for shard in range(shards)]
+
+
+def manifest_path(output_file):
+    """Path of the manifest describing the shards of ``output_file``."""
+    return os.path.splitext(output_file)[0] + ".manifest.json"
+
+
+def write_manifest(output_file, file_format, paths, summaries, generator, batch_size, summary):
+    """Write the shard manifest: format, rows per shard, generation settings and summary counts."""
+    manifest = {
+        "format": file_format,
+        "rows": summary.rows,
+        "columns": COLUMNS,
+        "seed": generator.seed_sequence.entropy,
+        "batch_size": batch_size,
+        "shards": [
+            {"path": os.path.basename(path), "rows": shard_summary.rows}
+            for path, shard_summary in zip(paths, summaries)
+        ],
+        "summary": summary.counts,
+    }
+    with open(manifest_path(output_file), "w") as f:
+        json.dump(manifest, f, indent=4)
+
+
+def merge_files(parts, output_file, file_format):
+    """Concatenate part files written without headers into ``output_file`` and delete them."""
+    if file_format == "csv":
+        with open(output_file, "wb") as output:
+            output.write((",".join(COLUMNS) + "\n").encode())
+            for part in parts:
+                with open(part, "rb") as source:
+                    shutil.copyfileobj(source, output)
+    elif file_format == "parquet":
+        writer = None
+        for part in parts:
+            source = pq.ParquetFile(part)
+            writer = writer or pq.ParquetWriter(output_file, source.schema_arrow)
+            for row_group in range(source.num_row_groups):
+                writer.write_table(source.read_row_group(row_group))
+        writer.close()
+    else:
+        with pa.OSFile(output_file, "wb") as sink:
+            writer = None
+            for part in parts:
+                with pa.memory_map(part, "r") as source:
+                    reader = pa.ipc.open_file(source)
+                    writer = writer or pa.ipc.new_file(sink, reader.schema)
+                    for batch_index in range(reader.num_record_batches):
+                        writer.write_batch(reader.get_batch(batch_index))
+            writer.close()
+    for part in parts:
+        os.remove(part)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate mock face detection data.")
+    parser.add_argument("--rows", type=int, default=5_000_000, help="number of records to generate")
+    parser.add_argument("--output", default=None, help="output file (default: large_dataset_new.<format>)")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv", help="output file format")
+    parser.add_argument("--shards", type=int, default=1, help="split the output into this many files plus a manifest")
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducible output")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows generated at a time")
+    parser.add_argument("--workers", type=int, default=1, help="processes generating batches in parallel")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    output_file = args.output or "large_dataset_new" + FORMATS[args.format]
+
     # Initialize the generator
-    generator = RegionalCollegeDataGenerator()
-    
-    # Generate 500,000 records
-    print("Generating 50,00,000 records of face data...")
-    df = generator.generate_student_data(5000000)
-    
-    # Save to CSV
-    output_file = "large_dataset_new.csv"
-    df.to_csv(output_file, index=False)
-    print(f"\nData saved to {output_file}")
-    
-    # Print summary statistics
+    generator = RegionalCollegeDataGenerator(seed=args.seed)
+
+    print(f"Generating {args.rows:,} records of face data...")
+    summary = generator.write_dataset(output_file, args.rows, batch_size=args.batch_size, workers=args.workers,
+                                      file_format=args.format, shards=args.shards)
+    if summary.manifest:
+        print(f"\nData saved to {len(summary.files)} {args.format} shards, see {summary.manifest}")
+    else:
+        print(f"\nData saved to {output_file}")
+
+    # Print summary statistics, accumulated batch by batch while writing
     print("\nData Summary:")
     print("-" * 50)
     print("\nRecords per region:")
-    print(df['region'].value_counts())
-    
+    print(summary.series('region'))
+
     print("\nRecords per college (top 5):")
-    print(df['college_name'].value_counts().head())
-    
+    print(summary.series('college_name').head())
+
     print("\nEmotion distribution:")
-    print(df['emotion'].value_counts(normalize=True).round(3) * 100, "%")
-    
+    print(summary.series('emotion', normalize=True).round(3) * 100, "%")
+
     print("\nZone distribution:")
-    print(df['zone'].value_counts(normalize=True).round(3) * 100, "%")
+    print(summary.series('zone', normalize=True).round(3) * 100, "%")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
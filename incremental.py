@@ -0,0 +1,187 @@
+import hashlib
+import os
+import pickle
+
+from aggregates import ScoreAccumulator
+from medians import PoseMedianSketch
+from parallel import DEFAULT_RANGE_BYTES, read_byte_range, split_byte_ranges
+from schema import INPUT_SCHEMA, MEDIAN_COLUMNS, SCORING_COLUMNS, SchemaError, read_header, validate_columns
+from scoring import SCORING_PARAMS
+
+# Largest drift of any zone median, in degrees, tolerated before the rows
+# scored so far are rescored with the new medians
+DEFAULT_MEDIAN_TOLERANCE = 0.05
+
+# Bytes hashed at the start and at the end of the processed part of the file
+PREFIX_CHECK_BYTES = 1 << 20
+
+
+def state_path(csv_file, backend, cache_dir=None):
+    """Return the file holding the incremental state of ``csv_file`` for ``backend``."""
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(csv_file)), ".cache")
+    stem = os.path.splitext(os.path.basename(csv_file))[0]
+    return os.path.join(cache_dir, f"{stem}.{backend}.incremental.pkl")
+
+
+def prefix_hash(csv_file, offset):
+    """Hash the first and last ``PREFIX_CHECK_BYTES`` before ``offset`` to notice rewrites."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(csv_file, "rb") as f:
+        digest.update(f.read(min(offset, PREFIX_CHECK_BYTES)))
+        f.seek(max(offset - PREFIX_CHECK_BYTES, 0))
+        digest.update(f.read(offset - f.tell()))
+    return digest.hexdigest()
+
+
+def complete_rows_end(csv_file, start):
+    """Offset just past the last newline, so a row still being appended is left for the next run."""
+    end = os.path.getsize(csv_file)
+    with open(csv_file, "rb") as f:
+        while end > start:
+            block_start = max(end - 65536, start)
+            f.seek(block_start)
+            newline = f.read(end - block_start).rfind(b"\n")
+            if newline >= 0:
+                return block_start + newline + 1
+            end = block_start
+    return start
+
+
+def _read_ranges(csv_file, start, end, columns, usecols, pd, range_bytes):
+    parts = max(1, -(-(end - start) // range_bytes))
+    for range_start, range_end in split_byte_ranges(csv_file, parts, start=start, end=end):
+        yield read_byte_range(csv_file, range_start, range_end, columns, usecols, pd)
+
+
+def load_state(path):
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        # Missing, truncated, or pickled from classes this code no longer has: rebuild
+        return None
+
+
+def save_state(path, state):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+
+
+def _state_matches(state, csv_file, columns, median_mode, params):
+    """Whether ``state`` was built from an unchanged prefix of this file with the same settings.
+
+    A state of another layout (missing keys, or not a dict at all) does not match.
+    """
+    try:
+        return (
+            state["columns"] == columns
+            and state["schema"] == INPUT_SCHEMA
+            and state["median_mode"] == median_mode
+            and state["params"] == params
+            and hasattr(state["accumulator"], "cube")
+            and os.path.getsize(csv_file) >= state["offset"]
+            and prefix_hash(csv_file, state["offset"]) == state["prefix_hash"]
+        )
+    except (KeyError, TypeError, IndexError):
+        return False
+
+
+def median_drift(old, new):
+    """Largest absolute change of any zone median between two viewpoints."""
+    drift = 0.0
+    for zone in set(old) | set(new):
+        if zone not in old or zone not in new:
+            return float("inf")
+        for name, value in new[zone].items():
+            drift = max(drift, abs(value - old[zone][name]))
+    return drift
+
+
+def incremental_engagement_totals(csv_file, backend, pd, score_chunk, median_mode="exact",
+                                  tolerance=DEFAULT_MEDIAN_TOLERANCE, cache_dir=None,
+                                  range_bytes=DEFAULT_RANGE_BYTES, progress=None, params=SCORING_PARAMS):
+    """Update the persisted report state of an append-only CSV file with the rows added since the last run.
+
+    The state holds the median sketch of every row processed so far, the
+    medians the rows were scored with, the per-region/college totals and the
+    byte offset processed up to. Only the rows after that offset are read.
+    They are scored with the stored medians as long as the sketch's medians
+    stay within ``tolerance`` degrees of the ones last used for scoring;
+    beyond that, or when the processed part of the file was rewritten, the
+    whole file is recomputed.
+
+    Returns the zone medians, the ``ScoreAccumulator`` and a dict describing
+    the update (``mode`` is ``"full"``, ``"incremental"`` or ``"unchanged"``).
+    Raises SchemaError for anything but a CSV file.
+    """
+    if median_mode not in ("exact", "approx"):
+        raise ValueError(f"Unknown median mode: {median_mode}")
+    # Byte offsets only make sense for CSV; other files would fail later while decoding the header
+    if os.path.splitext(csv_file)[1].lower() != ".csv":
+        raise SchemaError(f"Incremental mode only reads CSV files: {csv_file}")
+    progress = progress or (lambda stage, detail=None: None)
+
+    columns, data_start = read_header(csv_file)
+    validate_columns(columns, source=csv_file)
+    path = state_path(csv_file, backend, cache_dir)
+    state = load_state(path)
+    if not _state_matches(state, csv_file, columns, median_mode, params):
+        state = None
+
+    start = state["offset"] if state else data_start
+    end = complete_rows_end(csv_file, start)
+    info = {"mode": "unchanged", "new_bytes": end - start, "drift": 0.0}
+
+    if state is not None:
+        if end == start:
+            return state["zone_median_pose"], state["accumulator"], info
+
+        # Fold the new rows into a copy of the sketch and check how far the medians moved
+        progress("medians", f"{end - start} new bytes")
+        sketch = PoseMedianSketch().merge(state["sketch"])
+        for chunk in _read_ranges(csv_file, start, end, columns, MEDIAN_COLUMNS, pd, range_bytes):
+            sketch.update(chunk)
+        info["drift"] = median_drift(state["scored_approximate"], sketch.approximate())
+        if info["drift"] > tolerance:
+            state = None
+            start = data_start
+
+    if state is not None:
+        info["mode"] = "incremental"
+        zone_median_pose = state["zone_median_pose"]
+        scored_approximate = state["scored_approximate"]
+        accumulator = state["accumulator"]
+    else:
+        info["mode"] = "full"
+        progress("medians", "full recompute")
+        sketch = PoseMedianSketch()
+        for chunk in _read_ranges(csv_file, start, end, columns, MEDIAN_COLUMNS, pd, range_bytes):
+            sketch.update(chunk)
+        if median_mode == "approx":
+            zone_median_pose = sketch.approximate()
+        else:
+            zone_median_pose = sketch.exact(
+                _read_ranges(csv_file, start, end, columns, MEDIAN_COLUMNS, pd, range_bytes))
+        scored_approximate = sketch.approximate()
+        accumulator = ScoreAccumulator()
+
+    progress("scoring")
+    for chunk in _read_ranges(csv_file, start, end, columns, SCORING_COLUMNS, pd, range_bytes):
+        accumulator.update(score_chunk(chunk, zone_median_pose))
+
+    save_state(path, {
+        "columns": columns,
+        "schema": INPUT_SCHEMA,
+        "median_mode": median_mode,
+        "params": params,
+        "offset": end,
+        "prefix_hash": prefix_hash(csv_file, end),
+        "sketch": sketch,
+        "zone_median_pose": zone_median_pose,
+        "scored_approximate": scored_approximate,
+        "accumulator": accumulator,
+    })
+    return zone_median_pose, accumulator, info
@@ -0,0 +1,175 @@
+import itertools
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Pipeline stages reported by generate_engagement_report, in order
+STAGES = ("read", "medians", "scoring", "aggregation")
+
+# Finished jobs kept for status lookups; older ones are forgotten first
+MAX_FINISHED_JOBS = 100
+
+
+class Job:
+    """One report run: its request, status, per-stage progress and result."""
+
+    def __init__(self, key, backend, data_file, options):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.backend = backend
+        self.data_file = data_file
+        self.options = options
+        self.status = "queued"
+        self.stage = None
+        self.stages = {stage: {"status": "pending", "seconds": None, "detail": None} for stage in STAGES}
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.version = 0
+        self._stage_started = None
+        self.changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def _touch(self):
+        self.version += 1
+        self.changed.notify_all()
+
+    def start(self):
+        with self.changed:
+            self.status = "running"
+            self.started_at = time.time()
+            self._touch()
+
+    def progress(self, stage, detail=None):
+        """Progress callback for the report: enter ``stage``, or update its ``detail``.
+
+        Stages skipped by a report path (the streaming path reads while it
+        computes medians) are marked done when a later stage starts.
+        """
+        with self.changed:
+            now = time.time()
+            if stage != self.stage:
+                self._finish_stage(now)
+                for earlier in STAGES[:STAGES.index(stage)]:
+                    if self.stages[earlier]["status"] == "pending":
+                        self.stages[earlier]["status"] = "skipped"
+                self.stage = stage
+                self._stage_started = now
+                self.stages[stage]["status"] = "running"
+            self.stages[stage]["detail"] = detail
+            self._touch()
+
+    def _finish_stage(self, now):
+        if self.stage is not None:
+            self.stages[self.stage]["status"] = "done"
+            self.stages[self.stage]["seconds"] = now - self._stage_started
+
+    def finish(self, result=None, error=None):
+        with self.changed:
+            now = time.time()
+            if error is None:
+                self._finish_stage(now)
+                self.status = "done"
+                self.result = result
+            else:
+                self.status = "failed"
+                self.error = error
+            self.finished_at = now
+            self._touch()
+
+    def wait(self, version, timeout=None):
+        """Block until the job changes past ``version`` or finishes; return the new version."""
+        with self.changed:
+            self.changed.wait_for(lambda: self.version != version or self.finished, timeout)
+            return self.version
+
+    def to_dict(self):
+        with self.changed:
+            status = {
+                "id": self.id,
+                "backend": self.backend,
+                "data_file": self.data_file,
+                "options": self.options,
+                "status": self.status,
+                "stage": self.stage,
+                "stages": {stage: dict(info) for stage, info in self.stages.items()},
+                "error": self.error,
+                "submitted_at": self.submitted_at,
+                "elapsed": (self.finished_at or time.time()) - (self.started_at or self.submitted_at),
+                "version": self.version,
+            }
+            if self.status == "done":
+                region_scores, institution_scores, overall_score, total_chunk_time = self.result
+                status["result"] = {
+                    "region_scores": {str(k): float(v) for k, v in region_scores.items()},
+                    "institution_scores": {str(k): float(v) for k, v in institution_scores.items()},
+                    "overall_score": float(overall_score),
+                    "processing_time": total_chunk_time,
+                }
+            return status
+
+
+class JobManager:
+    """Run report jobs on a background thread pool.
+
+    ``backends`` maps a backend name to its report function, called as
+    ``report(data_file, progress=job.progress, **options)``. Submitting a
+    request identical to one that is still queued or running returns that
+    job, so concurrent callers share one computation.
+    """
+
+    def __init__(self, backends, max_workers=2):
+        self.backends = backends
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-job")
+        self.jobs = {}
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def job_key(backend, data_file, options):
+        return (backend, data_file) + tuple(sorted((name, value) for name, value in options.items() if value is not None))
+
+    def submit(self, backend, data_file, **options):
+        """Queue a report run, or return the identical run already in flight."""
+        if backend not in self.backends:
+            raise ValueError(f"Unknown backend: {backend}")
+        key = self.job_key(backend, data_file, options)
+        with self.lock:
+            job = self.in_flight.get(key)
+            if job is not None:
+                return job
+            job = Job(key, backend, data_file, options)
+            self.jobs[job.id] = job
+            self.in_flight[key] = job
+            self._forget_finished()
+        self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def _run(self, job):
+        job.start()
+        try:
+            result = self.backends[job.backend](job.data_file, progress=job.progress, **job.options)
+        except Exception as e:
+            job.finish(error=f"{type(e).__name__}: {e}")
+        else:
+            job.finish(result)
+        finally:
+            with self.lock:
+                if self.in_flight.get(job.key) is job:
+                    del self.in_flight[job.key]
+
+    def _forget_finished(self):
+        finished = [job for job in self.jobs.values() if job.finished]
+        for job in itertools.islice(sorted(finished, key=lambda job: job.finished_at),
+                                    max(len(finished) - MAX_FINISHED_JOBS, 0)):
+            del self.jobs[job.id]
@@ -0,0 +1,312 @@
+# Live engagement over a rolling time window of detections posted to the app.
+# Records are appended to ring buffers of NumPy arrays and evicted once their
+# created_at falls out of the window. Every append and eviction is folded into
+# running per-region and per-college sums and into the zone pose histograms,
+# so reading the current scores never touches the buffered rows.
+import math
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from engine.backends import PANDAS_NA_VALUES
+from medians import PoseMedianSketch
+from schema import CATEGORY_COLUMNS, FLOAT_COLUMNS, SCORING_COLUMNS, TIME_COLUMN, ZONES, SchemaError
+from scoring import EMOTIONS, engagement_scores
+
+DEFAULT_WINDOW_SECONDS = 300.0
+
+# Rows the buffers start with; they double whenever the window holds more
+DEFAULT_CAPACITY = 1 << 18
+
+# Largest drift of any zone median, in degrees, before the buffered rows are
+# rescored. Live medians are read from the histograms alone (within one
+# bucket width), so a much tighter tolerance would rescore on rounding noise.
+DEFAULT_MEDIAN_TOLERANCE = 0.25
+
+# Rows checked at a time for expired rows at the head of the buffers
+EVICT_BLOCK = 4096
+
+# Buffer dtypes; floats are float32 like the report's parsed columns
+BUFFER_DTYPES = {
+    TIME_COLUMN: np.float64,
+    "region": np.int32,
+    "college_name": np.int32,
+    "zone": np.int8,
+    "emotion": np.int8,
+    "confidence": np.float32,
+    "pose.pitch": np.float32,
+    "pose.yaw": np.float32,
+    "engagement_score": np.float64,
+}
+
+# Labels read as missing, as pandas does when parsing the CSV
+MISSING_LABELS = frozenset(PANDAS_NA_VALUES)
+
+ZONE_CODES = {zone: code for code, zone in enumerate(ZONES)}
+EMOTION_CODES = {emotion: code for code, emotion in enumerate(EMOTIONS)}
+
+
+def to_seconds(value, now):
+    """Parse a ``created_at``: an ISO 8601 string or Unix seconds. A missing value is ``now``."""
+    if value is None or value == "":
+        return now
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        raise SchemaError(f"Invalid {TIME_COLUMN}: {value!r}") from None
+
+
+def _isoformat(seconds):
+    return None if seconds is None else datetime.fromtimestamp(seconds).isoformat(timespec="seconds")
+
+
+def records_to_columns(records):
+    """Split a list of record dicts into one list per scoring column, plus ``created_at``.
+
+    Only ``SCORING_COLUMNS`` are required; other fields of the generator's
+    schema are ignored and a missing ``created_at`` means now. Labels must
+    be strings or null; anything else raises SchemaError.
+    """
+    try:
+        columns = {column: [record[column] for record in records] for column in SCORING_COLUMNS}
+        columns[TIME_COLUMN] = [record.get(TIME_COLUMN) for record in records]
+    except KeyError as e:
+        raise SchemaError(f"record is missing required column: {e.args[0]}") from None
+    except (TypeError, AttributeError):
+        raise SchemaError("records must be JSON objects") from None
+    for column in CATEGORY_COLUMNS:
+        values = columns[column]
+        if not all(value is None or isinstance(value, str) for value in values):
+            raise SchemaError(f"{column} labels must be strings or null")
+        columns[column] = [None if value is None or value in MISSING_LABELS else value for value in values]
+    return columns
+
+
+class LiveEngagement:
+    """Rolling engagement scores of the detections of the last ``window_seconds``.
+
+    The window ends at the newest ``created_at`` ingested so far; records
+    arriving already outside it are counted as late and dropped. Rows are
+    evicted from the head of the buffers in arrival order, which assumes
+    records arrive in ``created_at`` order: a row that arrived after a newer
+    one stays until that newer row is evicted too, so out-of-order records
+    can outlive the window by as much as they arrived out of order. Scores use the fused kernel
+    of ``scoring.engagement_scores`` with the approximate zone medians of the
+    window. New rows are scored with the medians in use; once a median drifts
+    more than ``tolerance`` degrees from them, the whole window is rescored.
+
+    ``ingest`` is serialized by a lock. ``snapshot`` is replaced as a whole
+    after every ingest, so readers get the current scores without locking.
+    """
+
+    def __init__(self, window_seconds=DEFAULT_WINDOW_SECONDS, capacity=DEFAULT_CAPACITY,
+                 tolerance=DEFAULT_MEDIAN_TOLERANCE):
+        self.window_seconds = float(window_seconds)
+        self.tolerance = tolerance
+        self.capacity = capacity
+        self.buffers = {name: np.empty(capacity, dtype=dtype) for name, dtype in BUFFER_DTYPES.items()}
+        self.head = 0
+        self.size = 0
+        self.latest = None
+        self.labels = {"region": {}, "college_name": {}}
+        self.totals = {column: (np.zeros(0), np.zeros(0, dtype=np.int64)) for column in self.labels}
+        self.score_sum = 0.0
+        self.score_count = 0
+        self.sketch = PoseMedianSketch()
+        self.zone_median_pose = {}
+        self.counters = {"ingested": 0, "late": 0, "evicted": 0, "rescores": 0}
+        self.version = 0
+        self.lock = threading.Lock()
+        self.snapshot = self._snapshot()
+
+    def ingest(self, records):
+        """Append a batch of records (dicts in the generator's schema) and update the scores.
+
+        Returns how many records were accepted and dropped as late, with the
+        new snapshot version. Raises SchemaError for malformed records.
+        """
+        columns = records_to_columns(records)
+        now = time.time()
+        times = np.array([to_seconds(value, now) for value in columns[TIME_COLUMN]], dtype=np.float64)
+        try:
+            floats = {column: np.array(columns[column], dtype=np.float32) for column in FLOAT_COLUMNS}
+        except (TypeError, ValueError) as e:
+            raise SchemaError(f"Invalid numeric value: {e}") from None
+
+        with self.lock:
+            rows = dict(floats)
+            rows[TIME_COLUMN] = times
+            for column, labels in self.labels.items():
+                rows[column] = np.array([-1 if value is None else labels.setdefault(value, len(labels))
+                                         for value in columns[column]], dtype=np.int32)
+            rows["zone"] = np.array([ZONE_CODES.get(value, -1) for value in columns["zone"]], dtype=np.int8)
+            rows["emotion"] = np.array([EMOTION_CODES.get(value, -1) for value in columns["emotion"]],
+                                       dtype=np.int8)
+
+            if len(times):
+                self.latest = max(self.latest or -math.inf, float(times.max()))
+            cutoff = (self.latest or 0.0) - self.window_seconds
+            fresh = times >= cutoff
+            late = len(times) - int(np.count_nonzero(fresh))
+            if late:
+                rows = {name: values[fresh] for name, values in rows.items()}
+
+            self.sketch.add(rows["zone"], self._angles(rows))
+            self._evict(cutoff)
+            medians = self.sketch.approximate()
+            if self._drift(medians) > self.tolerance:
+                self.zone_median_pose = medians
+                rows["engagement_score"] = np.empty(len(rows[TIME_COLUMN]))
+                self._append(rows)
+                self._rescore()
+            else:
+                rows["engagement_score"] = self._score(rows)
+                self._append(rows)
+                self._add_totals(rows)
+
+            self.counters["ingested"] += len(rows[TIME_COLUMN])
+            self.counters["late"] += late
+            self.version += 1
+            self.snapshot = self._snapshot()
+            return {"accepted": len(rows[TIME_COLUMN]), "late": late, "version": self.version}
+
+    def _angles(self, rows):
+        return [rows[f"pose.{angle}"].astype(np.float64) for angle in self.sketch.angles]
+
+    def _positions(self, start, count):
+        """Buffer slots of ``count`` rows from the ``start``-th oldest row on."""
+        return (self.head + start + np.arange(count)) % self.capacity
+
+    def _rows(self, positions):
+        return {name: values[positions] for name, values in self.buffers.items()}
+
+    def _append(self, rows):
+        count = len(rows[TIME_COLUMN])
+        if self.size + count > self.capacity:
+            self._grow(self.size + count)
+        positions = self._positions(self.size, count)
+        for name, values in self.buffers.items():
+            values[positions] = rows[name]
+        self.size += count
+
+    def _grow(self, needed):
+        """Copy the rows, oldest first, into buffers at least twice as large."""
+        capacity = max(self.capacity * 2, needed)
+        positions = self._positions(0, self.size)
+        for name, values in self.buffers.items():
+            grown = np.empty(capacity, dtype=values.dtype)
+            grown[:self.size] = values[positions]
+            self.buffers[name] = grown
+        self.head = 0
+        self.capacity = capacity
+
+    def _evict(self, cutoff):
+        """Drop the rows at the head of the buffers older than ``cutoff`` and take them out of the totals.
+
+        Stops at the first row still inside the window, so older rows behind it wait for a later eviction.
+        """
+        expired = 0
+        while expired < self.size:
+            block = self._positions(expired, min(EVICT_BLOCK, self.size - expired))
+            inside = self.buffers[TIME_COLUMN][block] >= cutoff
+            if inside.any():
+                expired += int(inside.argmax())
+                break
+            expired += len(block)
+        if not expired:
+            return
+        rows = self._rows(self._positions(0, expired))
+        self.sketch.add(rows["zone"], self._angles(rows), sign=-1)
+        self._add_totals(rows, sign=-1)
+        self.head = (self.head + expired) % self.capacity
+        self.size -= expired
+        self.counters["evicted"] += expired
+
+    def _score(self, rows):
+        return engagement_scores(rows["zone"], rows["emotion"], rows["confidence"], rows["pose.pitch"],
+                                 rows["pose.yaw"], self.zone_median_pose)
+
+    def _rescore(self):
+        """Score every buffered row with the current medians and rebuild the totals from scratch."""
+        positions = self._positions(0, self.size)
+        rows = self._rows(positions)
+        rows["engagement_score"] = self._score(rows)
+        self.buffers["engagement_score"][positions] = rows["engagement_score"]
+        self.totals = {column: (np.zeros(0), np.zeros(0, dtype=np.int64)) for column in self.labels}
+        self.score_sum = 0.0
+        self.score_count = 0
+        self._add_totals(rows)
+        self.counters["rescores"] += 1
+
+    def _add_totals(self, rows, sign=1):
+        """Add (or with ``sign=-1`` subtract) the scores of ``rows`` to the running sums and counts."""
+        scores = rows["engagement_score"]
+        scored = ~np.isnan(scores)
+        for column, labels in self.labels.items():
+            codes = rows[column]
+            valid = scored & (codes >= 0)
+            sums = np.bincount(codes[valid], weights=scores[valid], minlength=len(labels))
+            counts = np.bincount(codes[valid], minlength=len(labels))
+            total_sums, total_counts = self.totals[column]
+            if len(total_sums) < len(labels):
+                total_sums = np.pad(total_sums, (0, len(labels) - len(total_sums)))
+                total_counts = np.pad(total_counts, (0, len(labels) - len(total_counts)))
+            self.totals[column] = (total_sums + sign * sums, total_counts + sign * counts)
+        self.score_sum += sign * float(scores[scored].sum())
+        self.score_count += sign * int(np.count_nonzero(scored))
+
+    def _drift(self, medians):
+        """Largest change of any zone median against the ones in use; infinite when a zone appears or goes."""
+        if medians.keys() != self.zone_median_pose.keys():
+            return math.inf
+        drift = 0.0
+        for zone, pose in medians.items():
+            for name, value in pose.items():
+                current = self.zone_median_pose[zone][name]
+                if math.isnan(value) != math.isnan(current):
+                    return math.inf
+                if not math.isnan(value):
+                    drift = max(drift, abs(value - current))
+        return drift
+
+    def _means(self, column):
+        sums, counts = self.totals[column]
+        means = {label: float(sums[code] / counts[code])
+                 for label, code in self.labels[column].items() if code < len(counts) and counts[code] > 0}
+        return dict(sorted(means.items(), key=lambda item: item[1], reverse=True))
+
+    def _snapshot(self):
+        """The current scores and window state, as served by ``/live``."""
+        return {
+            "version": self.version,
+            "updated_at": time.time(),
+            "window_seconds": self.window_seconds,
+            "window_start": None if self.latest is None else _isoformat(self.latest - self.window_seconds),
+            "window_end": _isoformat(self.latest),
+            "rows": self.size,
+            "region_scores": self._means("region"),
+            "institution_scores": self._means("college_name"),
+            "overall_score": self.score_sum / self.score_count if self.score_count else None,
+            "zone_median_pose": {
+                zone: {name: None if math.isnan(value) else value for name, value in pose.items()}
+                for zone, pose in self.zone_median_pose.items()
+            },
+            "counters": dict(self.counters),
+        }
+
+
+_live = None
+_live_lock = threading.Lock()
+
+
+def get_live_engagement(window_seconds=DEFAULT_WINDOW_SECONDS):
+    """The live window of this process, created on first use."""
+    global _live
+    with _live_lock:
+        if _live is None:
+            _live = LiveEngagement(window_seconds)
+        return _live
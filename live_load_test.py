@@ -0,0 +1,93 @@
+# Load test of the live ingestion endpoint. Generates detection records with
+# the data generator, posts them to a running app in batches from a few
+# client threads and reports the sustained ingestion rate and the request
+# latencies. Exits with status 1 when the rate is below --min-rate:
+#
+#     python app.py
+#     python live_load_test.py --records 200000 --batch-size 500 --threads 2
+#
+# Every record is stamped with the start time of the run, so all of them stay
+# in the live window.
+import argparse
+import json
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from generator import RegionalCollegeDataGenerator
+from schema import SCORING_COLUMNS, TIME_COLUMN
+
+DEFAULT_URL = "http://127.0.0.1:5000"
+DEFAULT_MIN_RATE = 2000
+
+
+def build_batches(records, batch_size, seed):
+    """Generate ``records`` detections and serialize them as JSON bodies of ``batch_size`` records."""
+    generator = RegionalCollegeDataGenerator(seed=seed)
+    now = datetime.now()
+    frame = generator.generate_batch(0, records, records, generator.batch_rng(0), now)
+    frame = frame[SCORING_COLUMNS].assign(**{TIME_COLUMN: now.isoformat(timespec="seconds")})
+    # Regions come in consecutive blocks; shuffle so every batch mixes them like live cameras would
+    frame = frame.iloc[np.random.default_rng(seed).permutation(len(frame))]
+    return [frame.iloc[start:start + batch_size].to_json(orient="records").encode()
+            for start in range(0, len(frame), batch_size)]
+
+
+def post(url, body):
+    """POST one batch and return the request latency in seconds and the response."""
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        result = json.load(response)
+    return time.perf_counter() - start, result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the ingestion rate of the live endpoint.")
+    parser.add_argument("--url", default=DEFAULT_URL, help="base URL of the running app")
+    parser.add_argument("--records", type=int, default=100_000, help="records to send")
+    parser.add_argument("--batch-size", type=int, default=500, help="records per request")
+    parser.add_argument("--threads", type=int, default=1, help="concurrent client threads")
+    parser.add_argument("--seed", type=int, default=42, help="random seed of the generated records")
+    parser.add_argument("--min-rate", type=float, default=DEFAULT_MIN_RATE,
+                        help="records/sec below which the test fails")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"Generating {args.records:,} records...")
+    batches = build_batches(args.records, args.batch_size, args.seed)
+    ingest_url = args.url.rstrip("/") + "/ingest"
+
+    print(f"Posting {len(batches)} batches of {args.batch_size} records from {args.threads} threads...")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(lambda body: post(ingest_url, body), batches))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([latency for latency, _ in results])
+    accepted = sum(result["accepted"] for _, result in results)
+    late = sum(result["late"] for _, result in results)
+    rate = accepted / elapsed
+    print(f"Accepted {accepted:,} records ({late:,} late) in {elapsed:.2f} seconds: {rate:,.0f} records/sec")
+    print(f"Request latency: p50 {np.percentile(latencies, 50) * 1000:.1f} ms, "
+          f"p95 {np.percentile(latencies, 95) * 1000:.1f} ms, max {latencies.max() * 1000:.1f} ms")
+
+    with urllib.request.urlopen(args.url.rstrip("/") + "/live") as response:
+        snapshot = json.load(response)
+    print(f"Live window: {snapshot['rows']:,} rows, overall score {snapshot['overall_score']}, "
+          f"{snapshot['counters']['rescores']} rescores")
+
+    if rate < args.min_rate:
+        print(f"FAILED: {rate:,.0f} records/sec is below the required {args.min_rate:,.0f}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+
+from schema import POSE_ANGLES, ZONES
+
+ANGLES = POSE_ANGLES
+
+# Head pose angles are bounded, so a fixed grid of buckets covers every value
+POSE_RANGE = (-180.0, 180.0)
+BIN_WIDTH = 0.01
+
+
+def category_codes(values, categories):
+    """Map a column of labels to integer codes for ``categories`` (-1 for anything else)."""
+    if isinstance(values, pd.Series) and isinstance(values.dtype, pd.CategoricalDtype):
+        if tuple(values.cat.categories) == tuple(categories):
+            return values.cat.codes.to_numpy()
+        # Re-index the column's own categories; its code -1 (missing) hits the trailing -1
+        lookup = np.append(pd.Index(categories).get_indexer(values.cat.categories), -1)
+        return lookup[values.cat.codes.to_numpy()]
+    return pd.Index(categories).get_indexer(np.asarray(values, dtype=object))
+
+
+class PoseMedianSketch:
+    """Bucketed histogram of head pose angles per zone, built one chunk at a time.
+
+    Every (zone, angle) pair gets a histogram of ``BIN_WIDTH`` wide buckets over
+    ``POSE_RANGE``; values outside the range land in the edge buckets. Sketches
+    of separate chunks can be merged by adding their histograms.
+
+    Two ways to read the medians back:
+
+    * ``approximate()`` takes the middle of the bucket holding the median rank.
+      The result is within one bucket width (0.01 degrees by default) of the
+      exact median for values inside ``POSE_RANGE``.
+    * ``exact(chunks)`` makes a second pass that keeps only the values falling
+      in the buckets holding the median ranks and selects the exact order
+      statistics from them, matching ``Series.median()``.
+    """
+
+    def __init__(self, zones=ZONES, angles=ANGLES, pose_range=POSE_RANGE, bin_width=BIN_WIDTH):
+        self.zones = tuple(zones)
+        self.angles = tuple(angles)
+        self.low, self.high = pose_range
+        self.bin_width = bin_width
+        self.n_bins = int(round((self.high - self.low) / bin_width))
+        self.counts = np.zeros((len(self.angles), len(self.zones), self.n_bins), dtype=np.int64)
+
+    def _columns(self, chunk):
+        return [chunk[f"pose.{angle}"].to_numpy(dtype=np.float64) for angle in self.angles]
+
+    def _bins(self, values):
+        bins = np.floor((values - self.low) / self.bin_width)
+        return np.clip(bins, 0, self.n_bins - 1).astype(np.int64)
+
+    def _valid(self, codes, values):
+        return (codes >= 0) & ~np.isnan(values)
+
+    def update(self, chunk):
+        """Add the zone and pose columns of a chunk to the histograms in a single pass."""
+        return self.add(category_codes(chunk["zone"], self.zones), self._columns(chunk))
+
+    def add(self, codes, columns, sign=1):
+        """Add rows given as zone codes and one array per angle; ``sign=-1`` removes them again."""
+        for a, values in enumerate(columns):
+            valid = self._valid(codes, values)
+            flat = codes[valid].astype(np.int64) * self.n_bins + self._bins(values[valid])
+            counts = np.bincount(flat, minlength=self.counts[a].size).reshape(self.counts[a].shape)
+            if sign < 0:
+                self.counts[a] -= counts
+            else:
+                self.counts[a] += counts
+        return self
+
+    def merge(self, other):
+        """Add the histograms of another sketch built with the same bucket grid."""
+        if other.counts.shape != self.counts.shape or other.zones != self.zones:
+            raise ValueError("Cannot merge sketches with different zones, angles or buckets.")
+        self.counts += other.counts
+        return self
+
+    def _median_ranks(self):
+        """Per (angle, zone): row count, the two middle ranks and the buckets holding them."""
+        cumulative = np.cumsum(self.counts, axis=-1)
+        totals = cumulative[..., -1]
+        ranks = np.stack([(totals - 1) // 2, totals // 2], axis=-1)
+        buckets = np.empty_like(ranks)
+        for a in range(len(self.angles)):
+            for z in range(len(self.zones)):
+                buckets[a, z] = np.searchsorted(cumulative[a, z], ranks[a, z], side="right")
+        below = np.where(buckets > 0, np.take_along_axis(cumulative, np.maximum(buckets - 1, 0), axis=-1), 0)
+        return totals, ranks, buckets, below
+
+    def _as_viewpoint(self, medians, totals):
+        zone_median_pose = {}
+        for z, zone in enumerate(self.zones):
+            if totals[:, z].max() == 0:
+                continue
+            zone_median_pose[zone] = {
+                f"median_{angle}": (float(medians[a, z]) if totals[a, z] else float("nan"))
+                for a, angle in enumerate(self.angles)
+            }
+        return zone_median_pose
+
+    def approximate(self):
+        """Return per-zone medians from the histograms alone, within one bucket width."""
+        totals, _, buckets, _ = self._median_ranks()
+        midpoints = self.low + (np.minimum(buckets, self.n_bins - 1) + 0.5) * self.bin_width
+        return self._as_viewpoint(midpoints.mean(axis=-1), totals)
+
+    def median_buckets(self):
+        """Return the buckets holding the two middle ranks, shaped (angles, zones, 2)."""
+        return self._median_ranks()[2]
+
+    def collect_candidates(self, chunk, buckets):
+        """Keep the values of a chunk that fall in the median ``buckets``.
+
+        Returns one list of arrays per (angle, zone). Only the bucket grid of
+        this sketch is used, so an empty sketch works in a worker process.
+        """
+        kept = [[[] for _ in self.zones] for _ in self.angles]
+        codes = category_codes(chunk["zone"], self.zones)
+        for a, values in enumerate(self._columns(chunk)):
+            valid = self._valid(codes, values)
+            zone_codes, values = codes[valid].astype(np.int64), values[valid]
+            bins = self._bins(values)
+            wanted = (bins == buckets[a, zone_codes, 0]) | (bins == buckets[a, zone_codes, 1])
+            for z in np.unique(zone_codes[wanted]):
+                kept[a][z].append(values[wanted & (zone_codes == z)])
+        return kept
+
+    @staticmethod
+    def merge_candidates(kept, other):
+        """Append the candidates collected from another chunk to ``kept``."""
+        for angle_kept, angle_other in zip(kept, other):
+            for zone_kept, zone_other in zip(angle_kept, angle_other):
+                zone_kept.extend(zone_other)
+        return kept
+
+    def select_exact(self, kept):
+        """Pick the exact median order statistics out of the collected candidates."""
+        totals, ranks, _, below = self._median_ranks()
+        medians = np.full((len(self.angles), len(self.zones)), np.nan)
+        for a in range(len(self.angles)):
+            for z in range(len(self.zones)):
+                if not totals[a, z]:
+                    continue
+                candidates = np.sort(np.concatenate(kept[a][z]))
+                # The two middle ranks sit in the same or adjacent non-empty buckets,
+                # so both are indexed from the start of the first kept bucket
+                offset = below[a, z, 0]
+                low_value, high_value = (candidates[rank - offset] for rank in ranks[a, z])
+                medians[a, z] = (low_value + high_value) / 2
+        return self._as_viewpoint(medians, totals)
+
+    def exact(self, chunks):
+        """Return exact per-zone medians using a second pass over the same chunks."""
+        buckets = self.median_buckets()
+        kept = [[[] for _ in self.zones] for _ in self.angles]
+        for chunk in chunks:
+            self.merge_candidates(kept, self.collect_candidates(chunk, buckets))
+        return self.select_exact(kept)
+
+
+def streaming_zone_medians(read_chunks, mode="exact", angles=ANGLES):
+    """Compute per-zone median head pose from a chunk iterator factory.
+
+    ``read_chunks`` is called once per pass and must return a fresh iterator of
+    chunks with ``zone`` and ``pose.*`` columns. ``mode`` is ``"exact"`` (two
+    passes) or ``"approx"`` (one pass, within one bucket width).
+    """
+    if mode not in ("exact", "approx"):
+        raise ValueError(f"Unknown median mode: {mode}")
+
+    sketch = PoseMedianSketch(angles=angles)
+    for chunk in read_chunks():
+        sketch.update(chunk)
+
+    if mode == "approx":
+        return sketch.approximate()
+    return sketch.exact(read_chunks())
@@ -0,0 +1,346 @@
+import argparse
+import bisect
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from engine.backends import BACKENDS as ENGINE_BACKENDS
+
+# Report sessions are appended to a SQLite database in WAL mode: writers never
+# rewrite history, readers never block writers, and session numbers are
+# assigned inside the inserting transaction so concurrent runs cannot collide.
+DEFAULT_DB_PATH = os.path.join("instance", "metrics.db")
+LEGACY_JSON_PATH = os.path.join("static", "metrics_history.json")
+BACKENDS = tuple(ENGINE_BACKENDS)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    backend TEXT NOT NULL,
+    session_number INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    processing_time REAL NOT NULL,
+    load_source TEXT,
+    load_time REAL,
+    details TEXT,
+    UNIQUE (backend, session_number)
+);
+CREATE INDEX IF NOT EXISTS sessions_backend_time ON sessions (backend, created_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class MetricsStore:
+    """Append-only store of report sessions with per-backend session numbers.
+
+    Each operation opens its own short-lived connection, so the store can be
+    shared by the Flask threads, report jobs and separate processes. The
+    first time a database is opened, the sessions of the legacy
+    ``static/metrics_history.json`` are imported into it.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, legacy_json=LEGACY_JSON_PATH):
+        self.path = path
+        self.legacy_json = legacy_json
+        self._ready = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _ensure_ready(self):
+        if self._ready:
+            return
+        with self._init_lock:
+            if self._ready:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = self._connect()
+            try:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(SCHEMA)
+                self._migrate_legacy_json(connection)
+            finally:
+                connection.close()
+            self._ready = True
+
+    def _migrate_legacy_json(self, connection):
+        """Import ``metrics_history.json`` once; the file itself is left in place."""
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            migrated = connection.execute("SELECT value FROM meta WHERE key = 'legacy_json_migrated'").fetchone()
+            if migrated is None and self.legacy_json and os.path.exists(self.legacy_json):
+                with open(self.legacy_json, "r") as f:
+                    data = json.load(f)
+                # The JSON history has no timestamps; the file's mtime is the best available
+                created_at = os.path.getmtime(self.legacy_json)
+                for backend in BACKENDS:
+                    for number, (session_key, entry) in enumerate(data.get(backend, {}).items(), start=1):
+                        self._insert(connection, backend, entry.pop("processing_time"), entry, created_at, number)
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_json_migrated', ?)",
+                               (str(time.time()),))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _insert(connection, backend, processing_time, details, created_at, session_number=None):
+        details = dict(details)
+        load_source = details.pop("load_source", None)
+        load_time = details.pop("load_time", None)
+        if session_number is None:
+            session_number = connection.execute(
+                "SELECT COALESCE(MAX(session_number), 0) + 1 FROM sessions WHERE backend = ?", (backend,)
+            ).fetchone()[0]
+        cursor = connection.execute(
+            "INSERT INTO sessions (backend, session_number, created_at, processing_time, load_source, load_time, details)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (backend, session_number, created_at, processing_time, load_source, load_time,
+             json.dumps(details) if details else None),
+        )
+        return cursor.lastrowid, session_number
+
+    def append(self, backend, processing_time, load_info=None, profile=None):
+        """Record one session and return it as ``sessions()`` would."""
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown session type: {backend}")
+        self._ensure_ready()
+        details = dict(load_info or {})
+        if profile is not None:
+            details["profile"] = profile
+        created_at = time.time()
+
+        connection = self._connect()
+        try:
+            # BEGIN IMMEDIATE takes the write lock before the next number is read
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                session_id, number = self._insert(connection, backend, processing_time, details, created_at)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        finally:
+            connection.close()
+        return self._as_session({"id": session_id, "backend": backend, "session_number": number,
+                                 "created_at": created_at, "processing_time": processing_time,
+                                 "load_source": details.pop("load_source", None),
+                                 "load_time": details.pop("load_time", None), "details": json.dumps(details)})
+
+    @staticmethod
+    def _as_session(row):
+        details = json.loads(row["details"]) if row["details"] else {}
+        return {
+            "id": row["id"],
+            "backend": row["backend"],
+            "session": f"session_{row['session_number']}",
+            "created_at": row["created_at"],
+            "processing_time": row["processing_time"],
+            "load_time": row["load_time"],
+            "load_source": row["load_source"],
+            "profile": details.get("profile"),
+        }
+
+    def sessions(self, backend=None, since=None, start_time=None, end_time=None, limit=None):
+        """Return sessions in insertion order, optionally filtered.
+
+        ``since`` returns only sessions with an ``id`` greater than it, so a
+        poller can pass the last id it has seen. ``start_time``/``end_time``
+        bound ``created_at`` (Unix seconds).
+        """
+        self._ensure_ready()
+        clauses, params = [], []
+        for clause, value in (("backend = ?", backend), ("id > ?", since),
+                              ("created_at >= ?", start_time), ("created_at < ?", end_time)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        query = "SELECT * FROM sessions"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        connection = self._connect()
+        try:
+            return [self._as_session(row) for row in connection.execute(query, params)]
+        finally:
+            connection.close()
+
+    def count(self):
+        """Number of sessions in the store."""
+        self._ensure_ready()
+        connection = self._connect()
+        try:
+            return connection.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        finally:
+            connection.close()
+
+    def file_version(self):
+        """Size and mtime of the database and its WAL file; any committed write changes them."""
+        version = []
+        for path in (self.path, self.path + "-wal"):
+            try:
+                stat = os.stat(path)
+                version.append((stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                version.append(None)
+        return tuple(version)
+
+    def last_id(self):
+        """Id of the newest session, or 0 for an empty store."""
+        self._ensure_ready()
+        connection = self._connect()
+        try:
+            return connection.execute("SELECT COALESCE(MAX(id), 0) FROM sessions").fetchone()[0]
+        finally:
+            connection.close()
+
+    def compact(self, keep_per_backend=None, max_age_days=None):
+        """Apply retention: drop sessions beyond the newest ``keep_per_backend`` or older than ``max_age_days``.
+
+        Session numbers and ids of the kept sessions do not change. Returns
+        the number of deleted sessions.
+        """
+        self._ensure_ready()
+        connection = self._connect()
+        try:
+            deleted = 0
+            # One transaction, so readers see either every deletion or none of them
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                if max_age_days is not None:
+                    deleted += connection.execute("DELETE FROM sessions WHERE created_at < ?",
+                                                  (time.time() - max_age_days * 86400,)).rowcount
+                if keep_per_backend is not None:
+                    for backend in BACKENDS:
+                        deleted += connection.execute(
+                            "DELETE FROM sessions WHERE backend = ? AND id NOT IN "
+                            "(SELECT id FROM sessions WHERE backend = ? ORDER BY id DESC LIMIT ?)",
+                            (backend, backend, keep_per_backend),
+                        ).rowcount
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            if deleted:
+                connection.execute("VACUUM")
+            return deleted
+        finally:
+            connection.close()
+
+
+def aggregate_sessions(sessions):
+    """Processing time statistics per backend and the FireDucks speedup over pandas.
+
+    ``speedup`` is the mean pandas time divided by the mean FireDucks time, so
+    values above 1 mean FireDucks is faster.
+    """
+    # Imported here so the Flask app starts without NumPy
+    import numpy as np
+
+    aggregates = {}
+    for backend in BACKENDS:
+        times = np.array([session["processing_time"] for session in sessions if session["backend"] == backend])
+        aggregates[backend] = {
+            "sessions": len(times),
+            "mean": float(times.mean()) if len(times) else None,
+            "min": float(times.min()) if len(times) else None,
+            "max": float(times.max()) if len(times) else None,
+            "p95": float(np.percentile(times, 95)) if len(times) else None,
+            "last": float(times[-1]) if len(times) else None,
+        }
+    fireducks_mean, pandas_mean = aggregates["fireducks"]["mean"], aggregates["pandas"]["mean"]
+    aggregates["speedup"] = pandas_mean / fireducks_mean if fireducks_mean and pandas_mean else None
+    return aggregates
+
+
+class MetricsSnapshot:
+    """In-memory copy of the store's sessions and their aggregates.
+
+    ``refresh()`` only stats the database files while nothing changed; after
+    a write it reads just the sessions past the newest one it holds (or
+    reloads everything if retention deleted sessions). Sessions after a
+    given id are then found by bisection, so answering a poll does not get
+    slower as the history grows.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.sessions = []
+        self.ids = []
+        self.aggregates = None
+        self.version = None
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        with self.lock:
+            self.store._ensure_ready()
+            version = self.store.file_version()
+            if version == self.version:
+                return self
+            new_sessions = self.store.sessions(since=self.ids[-1] if self.ids else None)
+            if self.store.count() == len(self.sessions) + len(new_sessions):
+                self.sessions = self.sessions + new_sessions
+            else:
+                self.sessions = self.store.sessions()
+            self.ids = [session["id"] for session in self.sessions]
+            self.aggregates = aggregate_sessions(self.sessions)
+            self.version = version
+        return self
+
+    def since(self, since=None):
+        """Sessions with an id greater than ``since`` (all of them for None)."""
+        if since is None:
+            return self.sessions
+        return self.sessions[bisect.bisect_right(self.ids, since):]
+
+    @property
+    def last_id(self):
+        return self.ids[-1] if self.ids else 0
+
+
+# Shared by the report backends and the Flask app
+METRICS_STORE = MetricsStore()
+METRICS_SNAPSHOT = MetricsSnapshot(METRICS_STORE)
+
+
+def record_session(session_type, processing_time, load_info=None, profile=None):
+    """Append a report session to ``METRICS_STORE``, printing where it went."""
+    try:
+        session = METRICS_STORE.append(session_type, processing_time, load_info, profile)
+    except ValueError as e:
+        print(e)
+        return None
+    print(f"Metrics saved as {session_type} {session['session']} in {METRICS_STORE.path}.")
+    return session
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the report metrics store.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="metrics database")
+    parser.add_argument("--keep", type=int, default=None, help="sessions to keep per backend")
+    parser.add_argument("--max-age-days", type=float, default=None, help="drop sessions older than this")
+    args = parser.parse_args(argv)
+
+    store = MetricsStore(args.db)
+    deleted = store.compact(keep_per_backend=args.keep, max_age_days=args.max_age_days)
+    print(f"Deleted {deleted} sessions; {len(store.sessions())} remain in {args.db}.")
+
+
+if __name__ == "__main__":
+    main()
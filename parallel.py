@@ -0,0 +1,184 @@
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from aggregates import ScoreAccumulator
+from engine.backends import get_backend
+from medians import PoseMedianSketch
+from schema import MEDIAN_COLUMNS, SCORING_COLUMNS, column_dtypes, dataset_files, file_columns, read_header, \
+    validate_columns
+
+# Upper bound on the bytes a worker parses at once; bigger files get more ranges
+DEFAULT_RANGE_BYTES = 64 * 1024 * 1024
+
+
+def default_workers():
+    """Number of worker processes to use when none is configured."""
+    return os.cpu_count() or 1
+
+
+def split_byte_ranges(csv_file, parts, start=None, end=None):
+    """Split the rows of a CSV file into at most ``parts`` newline-aligned byte ranges.
+
+    Rows must not contain quoted newlines, which holds for the generated data.
+    """
+    if start is None:
+        start = read_header(csv_file)[1]
+    if end is None:
+        end = os.path.getsize(csv_file)
+
+    boundaries = [start]
+    with open(csv_file, "rb") as f:
+        for i in range(1, parts):
+            position = start + (end - start) * i // parts
+            if position <= boundaries[-1]:
+                continue
+            # Reading from one byte back keeps a range that already starts on a new line intact
+            f.seek(position - 1)
+            f.readline()
+            boundary = min(f.tell(), end)
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+    if end > boundaries[-1]:
+        boundaries.append(end)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def read_byte_range(csv_file, start, end, columns, usecols=SCORING_COLUMNS, pd=None):
+    """Parse the ``usecols`` of the rows between two newline-aligned byte offsets of a CSV file."""
+    if pd is None:
+        import pandas as pd
+    with open(csv_file, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return pd.read_csv(io.BytesIO(data), header=None, names=columns, usecols=usecols, dtype=column_dtypes(usecols))
+
+
+def plan_read_units(path, workers, range_bytes=DEFAULT_RANGE_BYTES):
+    """Split an input file or shard manifest into independently readable units.
+
+    CSV files are split into newline-aligned byte ranges, with at least
+    ``workers`` ranges overall and none over ``range_bytes``. Parquet and
+    Arrow files split into their row groups and record batches. Each unit is a
+    tuple starting with the file format and the file.
+    """
+    files = dataset_files(path)
+    for file, file_format in files:
+        validate_columns(file_columns(file, file_format), source=file)
+    csv_bytes = sum(os.path.getsize(file) for file, file_format in files if file_format == "csv")
+
+    units = []
+    for file, file_format in files:
+        if file_format == "csv":
+            columns, data_start = read_header(file)
+            data_size = os.path.getsize(file) - data_start
+            parts = max(-(-workers * data_size // max(csv_bytes, 1)), -(-data_size // range_bytes), 1)
+            units.extend(("csv", file, start, end, columns)
+                         for start, end in split_byte_ranges(file, parts, start=data_start))
+        elif file_format == "parquet":
+            units.extend(("parquet", file, row_group) for row_group in range(pq.ParquetFile(file).num_row_groups))
+        else:
+            with pa.memory_map(file, "r") as source:
+                batches = pa.ipc.open_file(source).num_record_batches
+            units.extend(("arrow", file, batch_index) for batch_index in range(batches))
+    return units
+
+
+def read_unit(unit, usecols=SCORING_COLUMNS, pd=None):
+    """Read the ``usecols`` of one unit from ``plan_read_units``.
+
+    CSV ranges are parsed with ``pd``; row groups and record batches are read
+    as pandas frames.
+    """
+    file_format, file = unit[:2]
+    if file_format == "csv":
+        start, end, columns = unit[2:]
+        return read_byte_range(file, start, end, columns, usecols, pd)
+    if file_format == "parquet":
+        table = pq.ParquetFile(file).read_row_group(unit[2], columns=usecols)
+    else:
+        with pa.memory_map(file, "r") as source:
+            table = pa.Table.from_batches([pa.ipc.open_file(source).get_batch(unit[2])]).select(usecols)
+    return table.to_pandas().astype(column_dtypes(usecols))
+
+
+def _sketch_unit(backend, unit):
+    return PoseMedianSketch().update(read_unit(unit, MEDIAN_COLUMNS, get_backend(backend).pd))
+
+
+def _candidates_unit(backend, unit, buckets):
+    return PoseMedianSketch().collect_candidates(read_unit(unit, MEDIAN_COLUMNS, get_backend(backend).pd), buckets)
+
+
+def _score_unit(backend, unit, zone_median_pose, kernel):
+    # engine.report imports this module, so the kernels are looked up at call time
+    from engine.report import get_scoring_kernel
+    chunk = read_unit(unit, pd=get_backend(backend).pd)
+    accumulator = ScoreAccumulator()
+    accumulator.update(get_scoring_kernel(kernel)(chunk, zone_median_pose))
+    return accumulator
+
+
+def parallel_engagement_totals(path, backend, workers=None, median_mode="exact", kernel="numpy",
+                               range_bytes=DEFAULT_RANGE_BYTES, progress=None):
+    """Score an input file or shard manifest across a process pool and merge the partial results.
+
+    ``backend`` names the backend in ``engine.backends.BACKENDS`` whose
+    ``pd`` the workers read with; ``kernel`` names the scoring kernel. The input is split into
+    units with ``plan_read_units``; workers first return median sketches per
+    unit, which are merged into the zone medians, then score their unit and
+    return per-region/college sums and counts. Returns the zone medians and
+    the merged ``ScoreAccumulator``. ``progress(stage, detail=None)`` is told
+    when the median and scoring phases start and how many units are done.
+
+    With ``median_mode="exact"`` every unit is read three times: for the
+    histograms, for the candidate values in the median buckets, and for
+    scoring. ``"approx"`` skips the candidate pass. The first two passes
+    cannot be shared, because the median buckets are only known once the
+    histograms of every unit are merged.
+    """
+    if median_mode not in ("exact", "approx"):
+        raise ValueError(f"Unknown median mode: {median_mode}")
+
+    workers = workers or default_workers()
+    units = plan_read_units(path, workers, range_bytes)
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        def run(stage, task, *args):
+            futures = [pool.submit(task, backend, unit, *args) for unit in units]
+            results = []
+            for future in futures:
+                results.append(future.result())
+                if progress:
+                    progress(stage, f"{len(results)}/{len(units)} units")
+            return results
+
+        # Phase 1: median sketches per unit, merged in the parent
+        if progress:
+            progress("medians")
+        sketch = PoseMedianSketch()
+        for partial in run("medians", _sketch_unit):
+            sketch.merge(partial)
+
+        if median_mode == "approx":
+            zone_median_pose = sketch.approximate()
+        else:
+            buckets = sketch.median_buckets()
+            kept = [[[] for _ in sketch.zones] for _ in sketch.angles]
+            for partial in run("medians", _candidates_unit, buckets):
+                sketch.merge_candidates(kept, partial)
+            zone_median_pose = sketch.select_exact(kept)
+
+        # Phase 2: score every unit with the merged medians
+        if progress:
+            progress("scoring")
+        accumulator = ScoreAccumulator()
+        for partial in run("scoring", _score_unit, zone_median_pose, kernel):
+            accumulator.merge(partial)
+
+    return zone_median_pose, accumulator
@@ -0,0 +1,354 @@
+# Time-partitioned copies of the face detection data for time-window reports.
+# The rows are split into Parquet files of PARTITION_MINUTES each, sorted by
+# created_at and written in small row groups. The manifest is a regular shard
+# manifest, so full reports read it like any sharded dataset; it also records
+# the first and last created_at of each partition. A window query only opens
+# the partitions overlapping the window and, at its edges, only the row groups
+# whose created_at statistics overlap it.
+#
+#     python partitions.py large_dataset_new.csv --minutes 5
+import argparse
+import fcntl
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pandas
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from schema import INPUT_SCHEMA, SCORING_COLUMNS, TIME_COLUMN, column_dtypes, dataset_files, iter_report_chunks, \
+    to_backend_frame
+
+DEFAULT_PARTITION_MINUTES = 5
+ROW_GROUP_ROWS = 65536
+
+# Rows read at a time from the source while partitioning
+BUILD_CHUNKSIZE = 1_000_000
+
+WINDOW_COLUMNS = SCORING_COLUMNS + [TIME_COLUMN]
+
+# Labels are stored as strings (dictionary-encoded by Parquet) so every batch
+# has the same schema however its categories were inferred
+PARTITION_SCHEMA = pa.schema(
+    [(column, pa.string() if dtype == "category" else pa.float32()) for column, dtype in INPUT_SCHEMA.items()]
+    + [(TIME_COLUMN, pa.timestamp("s"))]
+)
+
+DURATION_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+
+
+def to_timestamp(value):
+    """Parse a window bound: a datetime, an ISO 8601 string or Unix seconds. None and "" stay None.
+
+    Timestamps are naive local time, like the ``created_at`` values the generator writes.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return pandas.Timestamp(datetime.fromtimestamp(value))
+    return pandas.Timestamp(value)
+
+
+def parse_window(window):
+    """Normalize a ``(start, end)`` window into Timestamps; a None bound leaves that side open.
+
+    The window includes ``start`` and excludes ``end``.
+    """
+    start, end = (to_timestamp(value) for value in window)
+    if start is not None and end is not None and end <= start:
+        raise ValueError(f"Empty time window: {start} to {end}")
+    return start, end
+
+
+def parse_duration(text):
+    """Parse a duration such as ``90s``, ``30m``, ``2h`` or ``1d`` (a bare number is minutes)."""
+    text = str(text).strip().lower()
+    unit = DURATION_UNITS.get(text[-1:], "minutes")
+    return timedelta(**{unit: float(text.rstrip("smhd"))})
+
+
+def last_window(duration, now=None, minutes=DEFAULT_PARTITION_MINUTES):
+    """Window covering the ``duration`` up to ``now``, e.g. ``last_window("30m")``.
+
+    The bounds are aligned to ``minutes`` wide partitions: the end is ``now``
+    rounded up to the next partition boundary and the start is ``duration``
+    before it, rounded down. Requests within the same partition then get the
+    same window, and so share its cache key and job, and every partition read
+    lies wholly inside it. ``minutes=None`` keeps the exact bounds.
+    """
+    now = pandas.Timestamp(now or datetime.now())
+    if minutes is None:
+        return now - parse_duration(duration), now
+    width = f"{minutes}min"
+    end = now.ceil(width)
+    return (end - parse_duration(duration)).floor(width), end
+
+
+def window_key(window):
+    """JSON-friendly form of a window for cache keys and metrics."""
+    return [None if bound is None else bound.isoformat() for bound in parse_window(window)]
+
+
+def _times(column):
+    """The time column as datetimes; CSV input yields strings."""
+    if pandas.api.types.is_datetime64_any_dtype(column.dtype):
+        return column
+    return pandas.to_datetime(column)
+
+
+def _in_window(times, start, end):
+    mask = times.notna()
+    if start is not None:
+        mask &= times >= start
+    if end is not None:
+        mask &= times < end
+    return mask
+
+
+def partition_paths(data_file):
+    """Directory of the time partitions of ``data_file`` and their manifest."""
+    stem = os.path.splitext(data_file)[0]
+    if stem.endswith(".manifest"):
+        stem = stem[:-len(".manifest")]
+    return stem + ".time", stem + ".time.manifest.json"
+
+
+def is_time_partitioned(path):
+    """Whether ``path`` is a manifest written by ``build_time_partitions``."""
+    if not path.endswith(".json") or not os.path.exists(path):
+        return False
+    with open(path, "r") as f:
+        return json.load(f).get("time_column") == TIME_COLUMN
+
+
+def load_manifest(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def build_time_partitions(data_file, minutes=DEFAULT_PARTITION_MINUTES, chunksize=BUILD_CHUNKSIZE):
+    """Rewrite the scoring and time columns of a dataset as time partitions and return the manifest path.
+
+    The source is read in chunks; each chunk's rows are appended to the file
+    of their ``minutes`` wide partition. Each partition is then sorted by
+    ``created_at`` and rewritten in row groups of ``ROW_GROUP_ROWS`` rows,
+    so the row group statistics bound contiguous time ranges. The files are
+    written to a temporary directory of their own and renamed into place, so
+    concurrent builds never share files; ``ensure_time_partitions`` also
+    serializes them with a file lock.
+    """
+    from result_cache import dataset_fingerprint
+
+    directory, manifest_file = partition_paths(data_file)
+    build_dir = tempfile.mkdtemp(prefix=os.path.basename(directory) + ".", suffix=".tmp",
+                                 dir=os.path.dirname(os.path.abspath(directory)))
+    try:
+        shards = _write_partitions(data_file, build_dir, os.path.basename(directory), minutes, chunksize)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(build_dir, directory)
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    manifest = {
+        "format": "parquet",
+        "rows": sum(shard["rows"] for shard in shards),
+        "columns": WINDOW_COLUMNS,
+        "time_column": TIME_COLUMN,
+        "partition_minutes": minutes,
+        "source": {"path": os.path.abspath(data_file), "fingerprint": dataset_fingerprint(data_file)},
+        "shards": shards,
+    }
+    tmp_path = f"{manifest_file}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_path, manifest_file)
+    return manifest_file
+
+
+def _write_partitions(data_file, build_dir, name, minutes, chunksize):
+    """Write the sorted partition files into ``build_dir`` and return their manifest entries under ``name``."""
+    # Pass 1: route every chunk's rows to the writer of their partition
+    writers = {}
+    try:
+        for chunk in iter_report_chunks(pandas, data_file, WINDOW_COLUMNS, chunksize=chunksize):
+            chunk[TIME_COLUMN] = _times(chunk[TIME_COLUMN])
+            # Columns in the partition schema's order; CSV chunks come in the file's column order
+            chunk = chunk.loc[chunk[TIME_COLUMN].notna(), PARTITION_SCHEMA.names]
+            for partition, rows in chunk.groupby(chunk[TIME_COLUMN].dt.floor(f"{minutes}min")):
+                table = pa.Table.from_pandas(rows, preserve_index=False).cast(PARTITION_SCHEMA, safe=False)
+                if partition not in writers:
+                    path = os.path.join(build_dir, f"unsorted-{partition:%Y%m%dT%H%M%S}.parquet")
+                    writers[partition] = pq.ParquetWriter(path, PARTITION_SCHEMA)
+                writers[partition].write_table(table)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    # Pass 2: sort each partition by time
+    shards = []
+    for partition in sorted(writers):
+        unsorted = os.path.join(build_dir, f"unsorted-{partition:%Y%m%dT%H%M%S}.parquet")
+        table = pq.read_table(unsorted).sort_by(TIME_COLUMN)
+        file_name = f"part-{partition:%Y%m%dT%H%M%S}.parquet"
+        pq.write_table(table, os.path.join(build_dir, file_name), row_group_size=ROW_GROUP_ROWS)
+        os.remove(unsorted)
+        times = table.column(TIME_COLUMN)
+        shards.append({
+            "path": os.path.join(name, file_name),
+            "rows": table.num_rows,
+            "created_at_min": times[0].as_py().isoformat(),
+            "created_at_max": times[-1].as_py().isoformat(),
+        })
+    return shards
+
+
+def _partitions_current(manifest_file, data_file, minutes):
+    from result_cache import dataset_fingerprint
+
+    if not os.path.exists(manifest_file):
+        return False
+    manifest = load_manifest(manifest_file)
+    return (manifest.get("partition_minutes") == minutes
+            and manifest.get("source", {}).get("fingerprint") == dataset_fingerprint(data_file))
+
+
+def ensure_time_partitions(data_file, minutes=DEFAULT_PARTITION_MINUTES):
+    """Return the time-partitioned manifest for ``data_file``, building it when missing or stale.
+
+    Returns the manifest path and whether it was (re)built. A time-partitioned
+    manifest is returned as is. Concurrent callers take a file lock, so the
+    first one builds the partitions and the others wait for it.
+    """
+    if is_time_partitioned(data_file):
+        return data_file, False
+    directory, manifest_file = partition_paths(data_file)
+    if _partitions_current(manifest_file, data_file, minutes):
+        return manifest_file, False
+    with open(directory + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if _partitions_current(manifest_file, data_file, minutes):
+                return manifest_file, False
+            return build_time_partitions(data_file, minutes), True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+
+def plan_window(path, window):
+    """Files to read for ``window`` as ``(file, format, inside)``, plus the total number of files.
+
+    For a time-partitioned manifest only the partitions overlapping the window
+    are listed, and ``inside`` tells whether all their rows fall in it. Any
+    other input lists every file, to be filtered row by row.
+    """
+    start, end = parse_window(window)
+    files = dataset_files(path)
+    if not is_time_partitioned(path):
+        return [(file, file_format, False) for file, file_format in files], len(files)
+
+    plan = []
+    for (file, file_format), shard in zip(files, load_manifest(path)["shards"]):
+        first, last = pandas.Timestamp(shard["created_at_min"]), pandas.Timestamp(shard["created_at_max"])
+        if (start is not None and last < start) or (end is not None and first >= end):
+            continue
+        inside = (start is None or first >= start) and (end is None or last < end)
+        plan.append((file, file_format, inside))
+    return plan, len(files)
+
+
+def _row_group_overlaps(metadata, row_group, column_index, start, end):
+    statistics = metadata.row_group(row_group).column(column_index).statistics
+    if statistics is None or not statistics.has_min_max:
+        return True
+    first, last = pandas.Timestamp(statistics.min), pandas.Timestamp(statistics.max)
+    return not ((start is not None and last < start) or (end is not None and first >= end))
+
+
+def iter_window_chunks(path, window, columns=SCORING_COLUMNS, chunksize=None, plan=None):
+    """Yield pandas chunks of ``columns`` for the rows with ``start <= created_at < end``.
+
+    Partitions entirely inside the window are read without filtering. At
+    the window's edges, row groups whose ``created_at`` statistics miss the
+    window are skipped and the rest are filtered row by row. Inputs that
+    are not time-partitioned are scanned in full, ``chunksize`` rows at a time.
+    """
+    start, end = parse_window(window)
+    read_columns = list(columns) + ([TIME_COLUMN] if TIME_COLUMN not in columns else [])
+    if plan is None:
+        plan = plan_window(path, window)[0]
+    partitioned = is_time_partitioned(path)
+
+    for file, file_format, inside in plan:
+        if partitioned:
+            parquet_file = pq.ParquetFile(file)
+            column_index = parquet_file.schema_arrow.get_field_index(TIME_COLUMN)
+            for row_group in range(parquet_file.num_row_groups):
+                if not inside and not _row_group_overlaps(parquet_file.metadata, row_group, column_index, start, end):
+                    continue
+                table = parquet_file.read_row_group(row_group, columns=read_columns)
+                chunk = table.to_pandas().astype(column_dtypes(read_columns))
+                if not inside:
+                    chunk = chunk[_in_window(chunk[TIME_COLUMN], start, end)]
+                yield chunk[list(columns)]
+        else:
+            for chunk in iter_report_chunks(pandas, file, read_columns, chunksize=chunksize):
+                chunk = chunk[_in_window(_times(chunk[TIME_COLUMN]), start, end)]
+                yield chunk[list(columns)]
+
+
+def window_source(data_file, use_partitions=True, minutes=DEFAULT_PARTITION_MINUTES):
+    """Input to read a window from, and how: through time partitions (built on first use) or a full scan."""
+    if not use_partitions:
+        return data_file, "time-scan"
+    source, built = ensure_time_partitions(data_file, minutes)
+    return source, "time-partitions-cold" if built else "time-partitions"
+
+
+def read_window_data(pd, data_file, window, use_partitions=True, columns=SCORING_COLUMNS):
+    """Read ``columns`` of the rows in ``window`` as a ``pd.DataFrame`` and describe the load.
+
+    The load info has the source (``time-partitions``, ``time-partitions-cold``
+    when they were built first, or ``time-scan``), the load time and the
+    number of files read out of the total.
+    """
+    start_time = time.time()
+    source, load_source = window_source(data_file, use_partitions)
+    plan, total = plan_window(source, window)
+    frames = list(iter_window_chunks(source, window, columns, chunksize=BUILD_CHUNKSIZE, plan=plan))
+    # Partitions parsed separately can infer different categories, so the dtypes are re-applied
+    dtypes = column_dtypes(columns)
+    if frames:
+        frame = pandas.concat(frames, ignore_index=True).astype(dtypes)
+    else:
+        frame = pandas.DataFrame({column: pandas.Series(dtype=dtypes.get(column, object)) for column in columns})
+    frame = to_backend_frame(pd, frame)
+    return frame, {"load_source": load_source, "load_time": time.time() - start_time,
+                   "files_read": len(plan), "files_total": total, "window": window_key(window)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Write time-partitioned Parquet copies of a dataset.")
+    parser.add_argument("data_file", nargs="?", default="large_dataset_new.csv",
+                        help="CSV, Parquet or Arrow file, or a shard manifest")
+    parser.add_argument("--minutes", type=int, default=DEFAULT_PARTITION_MINUTES, help="width of each partition")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    start = time.time()
+    manifest_file = build_time_partitions(args.data_file, args.minutes)
+    manifest = load_manifest(manifest_file)
+    print(f"Wrote {manifest['rows']:,} rows in {len(manifest['shards'])} partitions of {args.minutes} minutes "
+          f"to {manifest_file} in {time.time() - start:.2f} seconds.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+import cProfile
+import os
+import platform
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILERS = ("cprofile", "tracemalloc")
+DEFAULT_DUMP_DIR = os.path.join(".cache", "profiles")
+
+# Lines of the cProfile and tracemalloc reports written next to the raw dump
+REPORT_LINES = 40
+
+
+def peak_rss_mb():
+    """Lifetime high-water mark of this process's resident memory in MiB, or None where unsupported.
+
+    The mark only ever rises, so it covers everything the process did
+    before, not just the current run or stage.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb():
+    """Resident memory of this process right now in MiB, or None where ``/proc`` is unavailable."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def host_info():
+    """Machine and interpreter details recorded with every run."""
+    info = {
+        "hostname": platform.node(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+    }
+    try:
+        info["memory_mb"] = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        info["memory_mb"] = None
+    return info
+
+
+class RunProfile:
+    """Per-stage timers and memory use of one report run.
+
+    ``stage(name)`` times a block and ``timed_iter(name, chunks)`` times the
+    reads of a chunk iterator; a stage entered more than once (e.g. once per
+    chunk) accumulates. Each stage records the resident memory at its end
+    (``rss_mb``) and the largest growth of resident memory over one call
+    (``rss_delta_mb``, end minus start); memory allocated and freed within
+    a call does not show in either. ``peak_rss_mb`` of the whole run is the
+    process's lifetime high-water mark. ``profiler`` optionally also runs ``cProfile`` or
+    ``tracemalloc`` over the whole run and writes its output to ``dump_dir``.
+    With tracemalloc each stage also records the peak of traced Python
+    allocations made during it.
+    """
+
+    def __init__(self, backend, profiler=None, dump_dir=DEFAULT_DUMP_DIR):
+        if profiler not in (None,) + PROFILERS:
+            raise ValueError(f"Unknown profiler: {profiler}")
+        self.backend = backend
+        self.profiler = profiler
+        self.dump_dir = dump_dir
+        self.stages = {}
+        self.rows = None
+        self.dump = None
+        self._cprofile = None
+        self._started_at = None
+
+    def start(self):
+        """Start the run (and the profiler, if any); calling it again does nothing."""
+        if self._started_at is not None:
+            return self
+        self._started_at = time.time()
+        if self.profiler == "cprofile":
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        elif self.profiler == "tracemalloc":
+            tracemalloc.start()
+        return self
+
+    def stop(self):
+        """Stop the profiler, if any, and write its output."""
+        if self.profiler is None or self.dump is not None:
+            return
+        os.makedirs(self.dump_dir, exist_ok=True)
+        stem = os.path.join(self.dump_dir, f"{self.backend}-{datetime.now():%Y%m%d-%H%M%S-%f}")
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self.dump = stem + ".prof"
+            self._cprofile.dump_stats(self.dump)
+            with open(stem + ".txt", "w") as f:
+                pstats.Stats(self._cprofile, stream=f).sort_stats("cumulative").print_stats(REPORT_LINES)
+        else:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            self.dump = stem + ".tracemalloc.txt"
+            with open(self.dump, "w") as f:
+                for stat in snapshot.statistics("lineno")[:REPORT_LINES]:
+                    f.write(f"{stat}\n")
+
+    def _stage_entry(self, name):
+        return self.stages.setdefault(name, {"seconds": 0.0, "rss_mb": None, "rss_delta_mb": None, "calls": 0})
+
+    def record(self, name, seconds):
+        """Add a stage timed elsewhere, e.g. the load time reported by the columnar cache."""
+        entry = self._stage_entry(name)
+        entry["seconds"] += seconds
+        entry["calls"] += 1
+        entry["rss_mb"] = current_rss_mb()
+        return entry
+
+    @contextmanager
+    def stage(self, name):
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        rss_start = current_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.record(name, time.perf_counter() - start)
+            if rss_start is not None and entry["rss_mb"] is not None:
+                growth = entry["rss_mb"] - rss_start
+                entry["rss_delta_mb"] = growth if entry["rss_delta_mb"] is None else max(entry["rss_delta_mb"], growth)
+            if tracemalloc.is_tracing():
+                traced_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+                entry["traced_peak_mb"] = max(entry.get("traced_peak_mb", 0.0), traced_peak)
+
+    def timed_iter(self, name, chunks):
+        """Yield from ``chunks``, timing each fetch as stage ``name``."""
+        chunks = iter(chunks)
+        while True:
+            with self.stage(name):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    def to_dict(self, total_time):
+        """Summary stored with the run's metrics."""
+        return {
+            "backend": self.backend,
+            "rows": self.rows,
+            "rows_per_sec": self.rows / total_time if self.rows and total_time else None,
+            "stages": self.stages,
+            "peak_rss_mb": peak_rss_mb(),
+            "host": host_info(),
+            "profiler": self.profiler,
+            "dump": self.dump,
+            "started_at": self._started_at,
+        }
@@ -0,0 +1,272 @@
+# Resident copy of the scoring columns, shared by every worker process on a box.
+# The columns are written once as raw arrays (labels as int16 codes, floats as
+# float32) and each process maps them read-only, so the page cache holds a
+# single copy however many workers run and a worker only pays for the mapping.
+# Point the directory at a tmpfs such as /dev/shm to keep it in shared memory.
+#
+#     python resident.py large_dataset_new.csv --dir /dev/shm/engagement
+import argparse
+import fcntl
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas
+
+from schema import CATEGORY_COLUMNS, FLOAT_COLUMNS, INPUT_SCHEMA, POSE_ANGLES, SCORING_COLUMNS, ZONES, \
+    iter_report_chunks
+from scoring import EMOTIONS, engagement_scores
+
+# Rows read from the input at a time while building
+BUILD_CHUNKSIZE = 1_000_000
+
+# Rows scored at a time; bounds the float64 buffers of the scoring kernel
+SCORE_CHUNK_ROWS = 1_000_000
+
+CODE_DTYPE = np.int16
+FLOAT_DTYPE = np.float32
+
+MANIFEST_NAME = "manifest.json"
+
+
+def resident_dir(data_file, directory=None):
+    """Directory holding the resident columns of ``data_file``, under ``directory`` or the input's ``.cache``."""
+    if directory is None:
+        directory = os.path.join(os.path.dirname(os.path.abspath(data_file)), ".cache")
+    stem = os.path.splitext(os.path.basename(data_file))[0]
+    return os.path.join(directory, f"{stem}.resident")
+
+
+def load_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST_NAME), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _manifest_matches(manifest, fingerprint):
+    return manifest is not None and manifest.get("fingerprint") == fingerprint and manifest.get("schema") == INPUT_SCHEMA
+
+
+def _label_codes(column, labels):
+    """Codes of a categorical chunk column in the running ``labels`` dict, which grows with new labels."""
+    lookup = np.array([labels.setdefault(label, len(labels)) for label in column.cat.categories] + [-1],
+                      dtype=CODE_DTYPE)
+    return lookup[column.cat.codes.to_numpy()]
+
+
+def build_resident(data_file, path, fingerprint):
+    """Write the scoring columns of ``data_file`` to ``path`` one chunk at a time and return the manifest.
+
+    Every column goes to its own raw file; the manifest, written last, holds
+    the row count, the dtypes and the label of each code.
+    """
+    os.makedirs(path, exist_ok=True)
+    labels = {column: {} for column in CATEGORY_COLUMNS}
+    files = {column: open(os.path.join(path, f"{column}.bin.tmp"), "wb") for column in SCORING_COLUMNS}
+    rows = 0
+    try:
+        for chunk in iter_report_chunks(pandas, data_file, SCORING_COLUMNS, chunksize=BUILD_CHUNKSIZE):
+            for column in CATEGORY_COLUMNS:
+                files[column].write(_label_codes(chunk[column], labels[column]).tobytes())
+            for column in FLOAT_COLUMNS:
+                files[column].write(chunk[column].to_numpy(dtype=FLOAT_DTYPE).tobytes())
+            rows += len(chunk)
+    finally:
+        for f in files.values():
+            f.close()
+
+    # Renamed into place so processes still mapping an older copy keep reading it
+    for column in SCORING_COLUMNS:
+        os.replace(os.path.join(path, f"{column}.bin.tmp"), os.path.join(path, f"{column}.bin"))
+    manifest = {
+        "fingerprint": fingerprint,
+        "schema": INPUT_SCHEMA,
+        "rows": rows,
+        "columns": {
+            column: {"file": f"{column}.bin",
+                     "dtype": np.dtype(CODE_DTYPE if column in labels else FLOAT_DTYPE).name,
+                     "labels": list(labels[column]) if column in labels else None}
+            for column in SCORING_COLUMNS
+        },
+    }
+    with open(os.path.join(path, MANIFEST_NAME + ".tmp"), "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(os.path.join(path, MANIFEST_NAME + ".tmp"), os.path.join(path, MANIFEST_NAME))
+    return manifest
+
+
+def ensure_resident(data_file, directory=None):
+    """Return the resident directory of ``data_file`` and whether it had to be (re)built.
+
+    Processes starting together take a file lock, so the first one builds
+    the columns and the others wait for it and then map them.
+    """
+    from result_cache import dataset_fingerprint
+
+    path = resident_dir(data_file, directory)
+    fingerprint = dataset_fingerprint(data_file)
+    if _manifest_matches(load_manifest(path), fingerprint):
+        return path, False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if _manifest_matches(load_manifest(path), fingerprint):
+                return path, False
+            build_resident(data_file, path, fingerprint)
+            return path, True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class ResidentDataset:
+    """Scoring columns mapped read-only from a resident directory.
+
+    ``columns`` maps each scoring column to a NumPy array over the file,
+    holding codes for the label columns, and ``labels`` gives the label of
+    each code (-1 is missing). Nothing is read until the arrays are used.
+    """
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.fingerprint = manifest["fingerprint"]
+        self.rows = manifest["rows"]
+        self.columns = {}
+        self.labels = {}
+        for column, info in manifest["columns"].items():
+            dtype = np.dtype(info["dtype"])
+            if self.rows:
+                self.columns[column] = np.memmap(os.path.join(path, info["file"]), dtype=dtype, mode="r",
+                                                 shape=(self.rows,))
+            else:
+                self.columns[column] = np.empty(0, dtype=dtype)
+            if info["labels"] is not None:
+                self.labels[column] = info["labels"]
+
+    def codes_in(self, column, categories, start=0, stop=None):
+        """Codes of ``column`` rows ``start:stop`` re-indexed to ``categories`` (-1 for anything else)."""
+        index = {label: code for code, label in enumerate(categories)}
+        lookup = np.array([index.get(label, -1) for label in self.labels[column]] + [-1], dtype=CODE_DTYPE)
+        return lookup[self.columns[column][start:stop]]
+
+
+# Datasets mapped by this process, by directory
+_DATASETS = {}
+_datasets_lock = threading.Lock()
+
+
+def open_resident(data_file, directory=None):
+    """Map the resident columns of ``data_file``, building them first when missing or stale.
+
+    Returns the dataset and ``"resident-cold"`` when it was just built, else
+    ``"resident"``. A process keeps its mapping until the input changes.
+    """
+    path, built = ensure_resident(data_file, directory)
+    with _datasets_lock:
+        dataset = _DATASETS.get(path)
+        manifest = load_manifest(path)
+        if dataset is None or dataset.fingerprint != manifest["fingerprint"]:
+            dataset = _DATASETS[path] = ResidentDataset(path, manifest)
+    return dataset, "resident-cold" if built else "resident"
+
+
+def find_common_viewpoint_resident(dataset):
+    """Median head pose per zone over the mapped columns, as ``find_common_viewpoint`` returns it.
+
+    Medians are taken in float64 like pandas' grouped ``median()``; only one
+    zone's values of one angle are copied out at a time.
+    """
+    zone_codes = dataset.codes_in("zone", ZONES)
+    zone_median_pose = {}
+    for code, zone in enumerate(ZONES):
+        in_zone = zone_codes == code
+        if not in_zone.any():
+            continue
+        pose = {}
+        for angle in POSE_ANGLES:
+            values = dataset.columns[f"pose.{angle}"][in_zone].astype(np.float64)
+            values = values[~np.isnan(values)]
+            pose[f"median_{angle}"] = float(np.median(values)) if len(values) else float("nan")
+        zone_median_pose[zone] = pose
+    return zone_median_pose
+
+
+def _means(sums, counts, labels, name):
+    scored = counts > 0
+    means = pandas.Series(sums[scored] / counts[scored], index=pandas.Index(np.array(labels, dtype=object)[scored],
+                                                                              name=name), name="engagement_score")
+    return means.sort_values(ascending=False)
+
+
+def score_resident(dataset, zone_median_pose, cube=None, chunk_rows=SCORE_CHUNK_ROWS):
+    """Score the mapped rows with the fused NumPy kernel and return region, institution and overall scores.
+
+    Rows are scored ``chunk_rows`` at a time into reused buffers and summed
+    per region and college with ``bincount``; the scored rows are added to
+    ``cube`` when one is given.
+    """
+    from cube import DIMENSIONS
+
+    columns = dataset.columns
+    out = np.empty(min(chunk_rows, dataset.rows), dtype=np.float64)
+    scratch = np.empty_like(out)
+    totals = {column: (np.zeros(len(dataset.labels[column])), np.zeros(len(dataset.labels[column]), dtype=np.int64))
+              for column in ("region", "college_name")}
+    score_sum, score_count = 0.0, 0
+
+    for start in range(0, dataset.rows, chunk_rows):
+        stop = min(start + chunk_rows, dataset.rows)
+        scores = engagement_scores(
+            dataset.codes_in("zone", ZONES, start, stop),
+            dataset.codes_in("emotion", EMOTIONS, start, stop),
+            columns["confidence"][start:stop],
+            columns["pose.pitch"][start:stop],
+            columns["pose.yaw"][start:stop],
+            zone_median_pose, out=out, scratch=scratch,
+        )
+        scored = ~np.isnan(scores)
+        for column, (sums, counts) in totals.items():
+            codes = columns[column][start:stop]
+            valid = scored & (codes >= 0)
+            sums += np.bincount(codes[valid], weights=scores[valid], minlength=len(sums))
+            counts += np.bincount(codes[valid], minlength=len(counts))
+        score_sum += float(scores[scored].sum())
+        score_count += int(np.count_nonzero(scored))
+        if cube is not None:
+            cube.add_codes(scores, [columns[dimension][start:stop] for dimension in DIMENSIONS],
+                           [dataset.labels[dimension] for dimension in DIMENSIONS])
+
+    region_scores = _means(*totals["region"], dataset.labels["region"], "region")
+    institution_scores = _means(*totals["college_name"], dataset.labels["college_name"], "college_name")
+    overall_score = score_sum / score_count if score_count else float("nan")
+    return region_scores, institution_scores, overall_score
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Write the resident scoring columns of a dataset.")
+    parser.add_argument("data_file", nargs="?", default="large_dataset_new.csv",
+                        help="CSV, Parquet or Arrow file, or a shard manifest")
+    parser.add_argument("--dir", default=None, help="directory to write to, e.g. under /dev/shm "
+                                                    "(default: .cache next to the input)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    start_time = time.time()
+    path, built = ensure_resident(args.data_file, args.dir)
+    manifest = load_manifest(path)
+    size = sum(os.path.getsize(os.path.join(path, info["file"])) for info in manifest["columns"].values())
+    action = "Wrote" if built else "Up to date:"
+    print(f"{action} {manifest['rows']:,} rows ({size / 2 ** 20:.1f} MiB) in {path} "
+          f"({time.time() - start_time:.2f} seconds).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+import functools
+import hashlib
+import importlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+# The scoring modules import pandas and pyarrow, so they are imported when a key
+# is first computed; the Flask app only needs ResultCache.stats() at startup.
+
+# Modules whose code determines the report result, besides the report module itself
+SCORING_MODULES = ("aggregates", "cube", "dataset_cache", "engine.backends", "incremental", "medians", "parallel",
+                   "partitions", "resident", "schema", "scoring")
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "results")
+DEFAULT_MEMORY_ENTRIES = 32
+DEFAULT_DISK_BYTES = 64 * 1024 * 1024
+
+
+@functools.lru_cache(maxsize=None)
+def code_fingerprint(backend_file):
+    """Hash the source of the scoring modules and ``backend_file``; computed once per process."""
+    digest = hashlib.blake2b(digest_size=16)
+    paths = [importlib.import_module(name).__file__ for name in SCORING_MODULES] + [backend_file]
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+# Content fingerprints by (path, size, mtime_ns), so a repeat request only stats the files
+_fingerprints = {}
+
+
+def dataset_fingerprint(path):
+    """Fingerprints of an input file, or of a shard manifest and every shard it lists."""
+    from dataset_cache import file_fingerprint
+    from schema import dataset_files
+
+    files = [file for file, file_format in dataset_files(path)]
+    if path not in files:
+        files.insert(0, path)
+
+    fingerprints = []
+    for file in files:
+        stat = os.stat(file)
+        memo_key = (os.path.abspath(file), stat.st_size, stat.st_mtime_ns)
+        if memo_key not in _fingerprints:
+            _fingerprints[memo_key] = dict(file_fingerprint(file), path=memo_key[0])
+        fingerprints.append(_fingerprints[memo_key])
+    return fingerprints
+
+
+def report_cache_key(data_file, backend, backend_file, median_mode="exact", params=None, window=None,
+                     tolerance=None):
+    """Key identifying a report result: input version, backend, median mode, scoring parameters and code.
+
+    ``params`` defaults to ``scoring.SCORING_PARAMS``. ``window`` is the
+    ``partitions.window_key`` of a time-window report, left out of the key
+    for whole-dataset reports. ``tolerance`` is the median tolerance of an
+    incremental report, whose scores may use medians up to that far from the
+    current ones; it is left out for every other report. Execution options
+    that do not change the result (kernel, chunk size, workers, columnar
+    cache) are left out, so e.g. a streamed run can serve a later in-memory
+    request.
+    """
+    if params is None:
+        from scoring import SCORING_PARAMS
+        params = SCORING_PARAMS
+    key = {
+        "dataset": dataset_fingerprint(data_file),
+        "backend": backend,
+        "median_mode": median_mode,
+        "params": params,
+        "code": code_fingerprint(backend_file),
+    }
+    if window is not None:
+        key["window"] = window
+    if tolerance is not None:
+        key["incremental_tolerance"] = tolerance
+    return hashlib.blake2b(json.dumps(key, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+class ResultCache:
+    """Two-tier cache of report results: an in-process LRU over pickles on disk.
+
+    The disk tier keeps at most ``disk_bytes``; the least recently used
+    files are deleted first. Hits on either tier and misses are counted.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, memory_entries=DEFAULT_MEMORY_ENTRIES,
+                 disk_bytes=DEFAULT_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.memory_entries = memory_entries
+        self.disk_bytes = disk_bytes
+        self.memory = OrderedDict()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self.lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key):
+        """Return the cached result for ``key``, or None."""
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return self.memory[key]
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            os.utime(path)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            with self.lock:
+                self.counters["misses"] += 1
+            return None
+
+        with self.lock:
+            self.counters["disk_hits"] += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        """Store ``value`` in both tiers, then trim the disk tier to its size limit."""
+        with self.lock:
+            self._remember(key, value)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._evict_disk()
+
+    def _remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _disk_entries(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".pkl"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
+
+    def _evict_disk(self):
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self):
+        """Hit and miss counters and the size of both tiers."""
+        with self.lock:
+            stats = dict(self.counters, memory_entries=len(self.memory))
+        stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+        entries = self._disk_entries() if os.path.isdir(self.cache_dir) else []
+        stats["disk_entries"] = len(entries)
+        stats["disk_bytes"] = sum(size for _, size, _ in entries)
+        return stats
+
+
+# Shared by both report backends in this process
+RESULT_CACHE = ResultCache()
@@ -0,0 +1,185 @@
+import json
+import os
+
+import pandas
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Declared input schema of the face detection CSV, shared by the report backends.
+# Columns the engagement report reads and the dtype each is parsed as. Labels are
+# parsed straight into categories and floats into float32, so no conversion pass
+# is needed after reading. Categories are inferred rather than fixed: FireDucks
+# mis-computes grouped medians on categoricals with a prescribed category order.
+INPUT_SCHEMA = {
+    'region': 'category',
+    'college_name': 'category',
+    'zone': 'category',
+    'emotion': 'category',
+    'confidence': 'float32',
+    'pose.pitch': 'float32',
+    'pose.yaw': 'float32',
+}
+
+SCORING_COLUMNS = list(INPUT_SCHEMA)
+CATEGORY_COLUMNS = [column for column, dtype in INPUT_SCHEMA.items() if dtype == 'category']
+FLOAT_COLUMNS = [column for column, dtype in INPUT_SCHEMA.items() if dtype == 'float32']
+
+# Detection timestamp written by generator.py; only read for time-window reports
+TIME_COLUMN = 'created_at'
+
+ZONES = ("left", "center", "right")
+POSE_ANGLES = ("pitch", "yaw")
+POSE_COLUMNS = [f"pose.{angle}" for angle in POSE_ANGLES]
+MEDIAN_COLUMNS = ['zone'] + POSE_COLUMNS
+
+# Input file formats by extension. A ``.json`` input is a shard manifest written
+# by generator.py that lists data files of one of these formats.
+DATA_FORMATS = {".csv": "csv", ".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+
+
+class SchemaError(ValueError):
+    """Raised when an input file lacks columns the report needs."""
+
+
+def read_header(csv_file):
+    """Return the column names of a CSV file and the byte offset where its rows start."""
+    with open(csv_file, "rb") as f:
+        header = f.readline()
+        return header.decode("utf-8").rstrip("\r\n").split(","), f.tell()
+
+
+def validate_columns(columns, required=SCORING_COLUMNS, source="input"):
+    """Raise SchemaError if any of the ``required`` columns is missing."""
+    missing = [column for column in required if column not in columns]
+    if missing:
+        raise SchemaError(f"{source} is missing required columns: {', '.join(missing)}")
+
+
+def column_dtypes(columns=SCORING_COLUMNS):
+    """Return the parse dtypes for a subset of the schema columns.
+
+    Columns outside the schema, such as ``TIME_COLUMN``, keep the type the
+    reader gives them.
+    """
+    return {column: INPUT_SCHEMA[column] for column in columns if column in INPUT_SCHEMA}
+
+
+def read_report_csv(pd, csv_file, columns=SCORING_COLUMNS, chunksize=None):
+    """Parse only ``columns`` of the CSV with their schema dtypes, using module ``pd``.
+
+    The header is validated first so a malformed file fails with a clear
+    SchemaError instead of a parser error. With ``chunksize`` an iterator of
+    chunks is returned, as with ``read_csv``.
+    """
+    validate_columns(read_header(csv_file)[0], columns, source=csv_file)
+    return pd.read_csv(csv_file, usecols=columns, dtype=column_dtypes(columns), chunksize=chunksize)
+
+
+def data_format(path):
+    """Return the format of a data file from its extension."""
+    try:
+        return DATA_FORMATS[os.path.splitext(path)[1].lower()]
+    except KeyError:
+        raise SchemaError(f"{path} is not a CSV, Parquet or Arrow file") from None
+
+
+def dataset_files(path):
+    """Expand an input path into ``(file, format)`` pairs, following a shard manifest."""
+    if os.path.splitext(path)[1].lower() != ".json":
+        return [(path, data_format(path))]
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    base = os.path.dirname(path)
+    return [(os.path.join(base, shard["path"]), manifest["format"]) for shard in manifest["shards"]]
+
+
+def file_columns(path, file_format):
+    """Return the column names of a data file without reading its rows."""
+    if file_format == "csv":
+        return read_header(path)[0]
+    if file_format == "parquet":
+        return pq.read_schema(path).names
+    with pa.memory_map(path, "r") as source:
+        return pa.ipc.open_file(source).schema.names
+
+
+def to_backend_frame(pd, frame):
+    """Convert a pandas frame to module ``pd``'s DataFrame.
+
+    Readers whose ``DataFrame`` is pandas' own get the frame unchanged.
+    FireDucks returns wrong grouped medians on categoricals handed over from
+    pandas, so the labels are passed as strings and re-encoded on its side.
+    """
+    if pd is None or pd is pandas or pd.DataFrame is pandas.DataFrame:
+        return frame
+    frame = pd.DataFrame(frame.astype({column: object for column in CATEGORY_COLUMNS if column in frame}))
+    for column in CATEGORY_COLUMNS:
+        if column in frame:
+            frame[column] = frame[column].astype('category')
+    return frame
+
+
+def _table_frame(table, columns):
+    """Convert an Arrow table to pandas with the schema dtypes of ``columns``."""
+    return table.to_pandas().astype(column_dtypes(columns))
+
+
+def iter_columnar_chunks(path, file_format, columns=SCORING_COLUMNS, chunksize=None):
+    """Yield pandas chunks of a Parquet or Arrow file.
+
+    Without ``chunksize`` one chunk is yielded per row group (Parquet) or
+    record batch (Arrow), which is how generator.py lays out its batches.
+    """
+    if file_format == "parquet":
+        parquet_file = pq.ParquetFile(path)
+        if chunksize:
+            for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+                yield _table_frame(pa.Table.from_batches([batch]), columns)
+        else:
+            for row_group in range(parquet_file.num_row_groups):
+                yield _table_frame(parquet_file.read_row_group(row_group, columns=columns), columns)
+        return
+
+    with pa.memory_map(path, "r") as source:
+        reader = pa.ipc.open_file(source)
+        for batch_index in range(reader.num_record_batches):
+            table = pa.Table.from_batches([reader.get_batch(batch_index)]).select(columns)
+            for offset in range(0, table.num_rows, chunksize or table.num_rows or 1):
+                yield _table_frame(table.slice(offset, chunksize), columns)
+
+
+def read_report_data(pd, path, columns=SCORING_COLUMNS):
+    """Read ``columns`` of a CSV, Parquet or Arrow file, or of every shard in a manifest.
+
+    Columns get their schema dtypes and the result is a ``pd.DataFrame``. A
+    single CSV file is parsed by ``pd`` itself; anything else is read with
+    pandas and pyarrow, then handed over with ``to_backend_frame``.
+    """
+    files = dataset_files(path)
+    if len(files) == 1 and files[0][1] == "csv":
+        return read_report_csv(pd, files[0][0], columns)
+
+    frames = []
+    for file, file_format in files:
+        validate_columns(file_columns(file, file_format), columns, source=file)
+        if file_format == "csv":
+            frames.append(pandas.read_csv(file, usecols=columns, dtype=column_dtypes(columns)))
+        else:
+            frames.extend(iter_columnar_chunks(file, file_format, columns))
+    # Shards parsed separately can infer different categories, so the dtypes are re-applied
+    frame = pandas.concat(frames, ignore_index=True).astype(column_dtypes(columns))
+    return to_backend_frame(pd, frame)
+
+
+def iter_report_chunks(pd, path, columns=SCORING_COLUMNS, chunksize=None):
+    """Yield chunks of ``columns`` of a CSV, Parquet or Arrow file, or of every shard in a manifest.
+
+    CSV files are read with ``pd.read_csv``; Parquet and Arrow chunks are
+    pandas frames.
+    """
+    for file, file_format in dataset_files(path):
+        if file_format == "csv":
+            yield from read_report_csv(pd, file, columns, chunksize=chunksize)
+        else:
+            validate_columns(file_columns(file, file_format), columns, source=file)
+            yield from iter_columnar_chunks(file, file_format, columns, chunksize)
@@ -0,0 +1,105 @@
+import numpy as np
+
+from medians import category_codes
+from schema import ZONES
+
+# Scoring parameters shared by the reference calculate_engagement and the NumPy
+# kernel. They are part of the result cache key, so changing one invalidates
+# cached reports.
+EMOTION_WEIGHTS = {
+    "neutral": 20,
+    "happy": -5,
+    "sad": 20,
+    "angry": 5,
+    "surprise": -10,
+    "fear": -5,
+    "disgust": -30,
+    "NaN": -100
+}
+EMOTIONS = tuple(EMOTION_WEIGHTS)
+MAX_DEVIATION = 45
+
+SCORING_PARAMS = {
+    "emotion_weights": EMOTION_WEIGHTS,
+    "max_deviation": MAX_DEVIATION,
+    "yaw_weight": 0.7,
+    "pitch_weight": 0.3,
+    "head_pose_weight": 0.8,
+    "emotion_blend_weight": 0.2,
+}
+
+
+def _lookup(values, missing):
+    """Build a lookup array indexed by category code; code -1 hits the trailing ``missing`` slot."""
+    return np.array(list(values) + [missing], dtype=np.float64)
+
+
+def _pose_score(angle, median_lookup, zone_codes, dest, max_deviation=MAX_DEVIATION):
+    """Write the 0-100 pose score for one angle into ``dest`` without temporaries."""
+    np.take(median_lookup, zone_codes, out=dest)
+    np.subtract(angle, dest, out=dest)
+    np.abs(dest, out=dest)
+    np.minimum(dest, 100, out=dest)
+    np.divide(dest, max_deviation, out=dest)
+    np.multiply(dest, 100, out=dest)
+    np.subtract(100, dest, out=dest)
+    np.maximum(dest, 0, out=dest)
+    return dest
+
+
+def engagement_scores(zone_codes, emotion_codes, confidence, pitch, yaw, zone_median_pose, out=None, scratch=None,
+                      params=SCORING_PARAMS):
+    """Fused engagement score kernel over plain arrays.
+
+    ``zone_codes`` index ``ZONES`` and ``emotion_codes`` index ``EMOTIONS``
+    (-1 for unknown); the emotion weights come from ``params``, which must
+    list them in ``EMOTIONS`` order. The result is written to ``out`` and ``scratch`` is the
+    only other buffer used; both are allocated when not supplied. The
+    operations follow calculate_engagement step by step, so the scores match
+    it to the last bit.
+    """
+    n = len(zone_codes)
+    out = np.empty(n, dtype=np.float64) if out is None else out[:n]
+    scratch = np.empty(n, dtype=np.float64) if scratch is None else scratch[:n]
+
+    median_pitch = _lookup((zone_median_pose.get(zone, {}).get("median_pitch", np.nan) for zone in ZONES), np.nan)
+    median_yaw = _lookup((zone_median_pose.get(zone, {}).get("median_yaw", np.nan) for zone in ZONES), np.nan)
+    emotion_weights = _lookup((params["emotion_weights"].get(emotion, 0) for emotion in EMOTIONS), 0)
+    max_deviation = params["max_deviation"]
+
+    # Head pose score: yaw * 0.7 + pitch * 0.3
+    _pose_score(yaw, median_yaw, zone_codes, out, max_deviation)
+    np.multiply(out, params["yaw_weight"], out=out)
+    _pose_score(pitch, median_pitch, zone_codes, scratch, max_deviation)
+    np.multiply(scratch, params["pitch_weight"], out=scratch)
+    np.add(out, scratch, out=out)
+    np.multiply(out, params["head_pose_weight"], out=out)
+
+    # Normalized emotion: weight * confidence shifted into 0-100
+    np.take(emotion_weights, emotion_codes, out=scratch)
+    np.multiply(scratch, confidence, out=scratch)
+    np.add(scratch, 50, out=scratch)
+    np.clip(scratch, 0, 100, out=scratch)
+    np.multiply(scratch, params["emotion_blend_weight"], out=scratch)
+
+    np.add(out, scratch, out=out)
+    np.clip(out, 0, 100, out=out)
+    return out
+
+
+def calculate_engagement_numpy(chunk, zone_median_pose, params=SCORING_PARAMS):
+    """Calculate engagement scores for a chunk with the fused NumPy kernel.
+
+    Drop-in replacement for calculate_engagement: no merge and no intermediate
+    columns, only ``engagement_score`` is added to the chunk.
+    """
+    chunk["engagement_score"] = engagement_scores(
+        category_codes(chunk["zone"], ZONES),
+        category_codes(chunk["emotion"], EMOTIONS),
+        chunk["confidence"].to_numpy(),
+        chunk["pose.pitch"].to_numpy(),
+        chunk["pose.yaw"].to_numpy(),
+        zone_median_pose,
+        params=params,
+    )
+    return chunk[["engagement_score", "zone", "region", "college_name", "emotion"]]
@@ -0,0 +1,250 @@
+# What-if sweeps over the scoring parameters. K parameter sets are scored in one
+# pass over the resident columns (see resident.py): the zone medians, category
+# codes and pose deviations are computed once per chunk and shared by every
+# variant, and the K score columns come out of one batch of broadcast NumPy
+# operations. Each variant reports its region and institution scores and how
+# their ranks moved against the current SCORING_PARAMS.
+#
+#     python sweep.py large_dataset_new.csv --max-deviation 30,45,60
+#     python sweep.py large_dataset_new.csv --variants variants.json --output sweep.json
+import argparse
+import json
+import math
+import numbers
+import sys
+import time
+
+import numpy as np
+
+from resident import find_common_viewpoint_resident, open_resident
+from schema import ZONES
+from scoring import EMOTIONS, SCORING_PARAMS
+
+# Scores held per chunk across all variants; each chunk has this many cells
+# divided by the number of variants as rows
+SWEEP_CHUNK_CELLS = 4_000_000
+
+BASELINE_NAME = "baseline"
+
+
+def _check_number(name, value):
+    """Raise ValueError unless ``value`` is a finite real number (booleans and numeric strings are not)."""
+    if isinstance(value, bool) or not isinstance(value, numbers.Real) or not math.isfinite(value):
+        raise ValueError(f"{name} must be a finite number, got {value!r}")
+
+
+def variant_params(overrides):
+    """Full scoring parameters of a variant: ``SCORING_PARAMS`` with ``overrides`` applied.
+
+    ``emotion_weights`` overrides are merged into the current weights, so a
+    variant only lists the emotions it changes. Raises ValueError for unknown
+    parameters or emotions and for values that are not finite numbers.
+    """
+    unknown = set(overrides) - set(SCORING_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown scoring parameters: {', '.join(sorted(unknown))}")
+    emotion_weights = overrides.get("emotion_weights", {})
+    if not isinstance(emotion_weights, dict):
+        raise ValueError(f"emotion_weights must map emotions to weights, got {emotion_weights!r}")
+    for name, value in overrides.items():
+        if name != "emotion_weights":
+            _check_number(name, value)
+    for emotion, weight in emotion_weights.items():
+        _check_number(f"emotion_weights[{emotion!r}]", weight)
+    params = dict(SCORING_PARAMS, **overrides)
+    params["emotion_weights"] = {**SCORING_PARAMS["emotion_weights"], **emotion_weights}
+    unknown = set(params["emotion_weights"]) - set(EMOTIONS)
+    if unknown:
+        raise ValueError(f"Unknown emotions: {', '.join(sorted(map(str, unknown)))}")
+    if params["max_deviation"] <= 0:
+        raise ValueError("max_deviation must be positive")
+    return params
+
+
+def parse_variants(variants):
+    """Normalize variants (dicts of overrides, optionally with a ``name``) into ``(name, params)`` pairs.
+
+    The baseline, ``SCORING_PARAMS`` itself, always comes first.
+    """
+    parsed = [(BASELINE_NAME, variant_params({}))]
+    for number, variant in enumerate(variants, 1):
+        if not isinstance(variant, dict):
+            raise ValueError(f"Variant {number} is not an object of parameter overrides")
+        overrides = dict(variant)
+        name = str(overrides.pop("name", f"variant-{number}"))
+        parsed.append((name, variant_params(overrides)))
+    return parsed
+
+
+def _median_lookup(zone_median_pose, angle):
+    return np.array([zone_median_pose.get(zone, {}).get(f"median_{angle}", np.nan) for zone in ZONES] + [np.nan])
+
+
+def sweep_scores(yaw_deviation, pitch_deviation, emotion_codes, confidence, table):
+    """Scores of every variant for one chunk, shaped (variants, rows).
+
+    ``table`` holds the per-variant parameters as columns (see
+    ``_parameter_table``). Pose scores are computed once per distinct
+    ``max_deviation`` and shared by the variants using it; the operations
+    follow ``scoring.engagement_scores`` step by step, so every row matches
+    the single-variant kernel to the last bit.
+    """
+    deviations = table["max_deviation_values"][:, None]
+    yaw_scores = np.maximum(100 - yaw_deviation / deviations * 100, 0)
+    pitch_scores = np.maximum(100 - pitch_deviation / deviations * 100, 0)
+    group = table["max_deviation_group"]
+
+    # Head pose score: yaw * 0.7 + pitch * 0.3 by default
+    scores = yaw_scores[group] * table["yaw_weight"][:, None]
+    scores += pitch_scores[group] * table["pitch_weight"][:, None]
+    scores *= table["head_pose_weight"][:, None]
+
+    # Normalized emotion: weight * confidence shifted into 0-100
+    emotion = table["emotion_weights"][:, emotion_codes] * confidence
+    emotion += 50
+    np.clip(emotion, 0, 100, out=emotion)
+    emotion *= table["emotion_blend_weight"][:, None]
+
+    scores += emotion
+    np.clip(scores, 0, 100, out=scores)
+    return scores
+
+
+def _parameter_table(variants):
+    """Per-variant parameter arrays for ``sweep_scores``."""
+    all_params = [params for _, params in variants]
+    deviations = np.array([params["max_deviation"] for params in all_params], dtype=np.float64)
+    values, group = np.unique(deviations, return_inverse=True)
+    table = {name: np.array([params[name] for params in all_params], dtype=np.float64)
+             for name in ("yaw_weight", "pitch_weight", "head_pose_weight", "emotion_blend_weight")}
+    # Code -1 (unknown emotion) hits the trailing zero weight, as in the kernel
+    table["emotion_weights"] = np.array([[params["emotion_weights"].get(emotion, 0) for emotion in EMOTIONS] + [0]
+                                         for params in all_params], dtype=np.float64)
+    table["max_deviation_values"] = values
+    table["max_deviation_group"] = group
+    return table
+
+
+def _ranked(sums, counts, labels, baseline=None):
+    """Labels with their mean score and rank (1 is best), highest first, plus the rank change against ``baseline``."""
+    rows = [{"label": label, "score": float(sums[code] / counts[code])}
+            for code, label in enumerate(labels) if counts[code] > 0]
+    rows.sort(key=lambda row: row["score"], reverse=True)
+    for rank, row in enumerate(rows, 1):
+        row["rank"] = rank
+        if baseline is not None:
+            baseline_rank = baseline.get(row["label"])
+            row["rank_change"] = None if baseline_rank is None else baseline_rank - rank
+    return rows
+
+
+def sweep_engagement(data_file, variants, directory=None, chunk_cells=SWEEP_CHUNK_CELLS):
+    """Score ``data_file`` under the baseline parameters and every variant in a single pass.
+
+    ``variants`` are dicts overriding ``scoring.SCORING_PARAMS`` (plus an
+    optional ``name``), e.g. ``{"max_deviation": 30}`` or
+    ``{"emotion_weights": {"happy": 10}, "yaw_weight": 0.5, "pitch_weight": 0.5}``.
+    The data is read through the resident columns of ``resident.py``
+    (written on first use, under ``directory`` when given). Returns a dict
+    with one entry per variant: its parameters, overall score, and the
+    region and institution scores with their rank and rank change against
+    the baseline (positive moved up).
+    """
+    start_time = time.time()
+    variants = parse_variants(variants)
+    table = _parameter_table(variants)
+    dataset, load_source = open_resident(data_file, directory)
+    columns = dataset.columns
+
+    zone_median_pose = find_common_viewpoint_resident(dataset)
+    median_yaw, median_pitch = _median_lookup(zone_median_pose, "yaw"), _median_lookup(zone_median_pose, "pitch")
+
+    count = len(variants)
+    dimensions = ("region", "college_name")
+    sums = {column: np.zeros((count, len(dataset.labels[column]))) for column in dimensions}
+    counts = {column: np.zeros((count, len(dataset.labels[column])), dtype=np.int64) for column in dimensions}
+    score_sums, score_counts = np.zeros(count), np.zeros(count, dtype=np.int64)
+    variant_offsets = np.arange(count)[:, None]
+    chunk_rows = max(1, chunk_cells // count)
+
+    for start in range(0, dataset.rows, chunk_rows):
+        stop = min(start + chunk_rows, dataset.rows)
+        # Shared by every variant: codes and the capped deviation from the zone median
+        zone_codes = dataset.codes_in("zone", ZONES, start, stop)
+        yaw_deviation = np.minimum(np.abs(columns["pose.yaw"][start:stop] - median_yaw[zone_codes]), 100)
+        pitch_deviation = np.minimum(np.abs(columns["pose.pitch"][start:stop] - median_pitch[zone_codes]), 100)
+        scores = sweep_scores(yaw_deviation, pitch_deviation, dataset.codes_in("emotion", EMOTIONS, start, stop),
+                              columns["confidence"][start:stop], table)
+
+        scored = ~np.isnan(scores)
+        for column in dimensions:
+            codes = columns[column][start:stop]
+            labels = len(dataset.labels[column])
+            valid = scored & (codes >= 0)
+            cells = (variant_offsets * labels + codes)[valid]
+            sums[column] += np.bincount(cells, weights=scores[valid], minlength=count * labels).reshape(count, -1)
+            counts[column] += np.bincount(cells, minlength=count * labels).reshape(count, -1)
+        score_sums += np.where(scored, scores, 0).sum(axis=1)
+        score_counts += scored.sum(axis=1)
+
+    results = []
+    baseline_ranks = {}
+    for index, (name, params) in enumerate(variants):
+        entry = {"name": name, "params": params,
+                 "overall_score": float(score_sums[index] / score_counts[index]) if score_counts[index] else None}
+        for column, key in (("region", "region_scores"), ("college_name", "institution_scores")):
+            ranked = _ranked(sums[column][index], counts[column][index], dataset.labels[column],
+                             baseline_ranks.get(column))
+            if index == 0:
+                baseline_ranks[column] = {row["label"]: row["rank"] for row in ranked}
+                for row in ranked:
+                    row["rank_change"] = 0
+            entry[key] = ranked
+        results.append(entry)
+
+    return {"rows": dataset.rows, "load_source": load_source, "zone_median_pose": zone_median_pose,
+            "seconds": time.time() - start_time, "variants": results}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Score a dataset under several scoring parameter sets at once.")
+    parser.add_argument("data_file", nargs="?", default="large_dataset_new.csv",
+                        help="CSV, Parquet or Arrow file, or a shard manifest")
+    parser.add_argument("--variants", default=None,
+                        help="JSON file with a list of parameter overrides, each optionally named")
+    parser.add_argument("--max-deviation", default=None,
+                        help="comma separated max_deviation values, one variant each")
+    parser.add_argument("--dir", default=None, help="directory of the resident columns (default: .cache next to "
+                                                    "the input)")
+    parser.add_argument("--output", default=None, help="write the full results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    variants = []
+    if args.variants:
+        with open(args.variants, "r") as f:
+            variants.extend(json.load(f))
+    if args.max_deviation:
+        variants.extend({"name": f"max_deviation={value}", "max_deviation": float(value)}
+                        for value in args.max_deviation.split(","))
+    if not variants:
+        raise SystemExit("Give the variants with --variants or --max-deviation.")
+
+    result = sweep_engagement(args.data_file, variants, args.dir)
+    print(f"Scored {result['rows']:,} rows under {len(result['variants'])} parameter sets "
+          f"in {result['seconds']:.2f} seconds.\n")
+    for variant in result["variants"]:
+        print(f"{variant['name']}: overall {variant['overall_score']:.4f}")
+        for row in variant["region_scores"]:
+            print(f"  {row['rank']}. {row['label']:8} {row['score']:.4f} ({row['rank_change']:+d})")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=4)
+        print(f"\nResults saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
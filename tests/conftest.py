@@ -0,0 +1,61 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The modules live at the top of the repository, next to app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generator import RegionalCollegeDataGenerator
+from schema import INPUT_SCHEMA
+
+# Rows of the generated test dataset; small enough to score in well under a second
+DATASET_ROWS = 20_000
+
+# Largest score difference between two report paths still counted as the same result
+PARITY_TOLERANCE = 1e-9
+
+
+def scoring_frame(rows=2_000, seed=0):
+    """A frame of the scoring columns with awkward rows mixed in.
+
+    Besides the generator's labels it has an emotion outside the weights,
+    missing emotions, a zone without a median and missing poses.
+    """
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        "region": rng.choice(["North", "South", "East", "West"], rows),
+        "college_name": rng.choice(["IIT Delhi", "NIT Trichy", "BITS Pilani"], rows),
+        "zone": rng.choice(["left", "center", "right", "back"], rows, p=[0.3, 0.4, 0.25, 0.05]),
+        "emotion": rng.choice(["neutral", "happy", "sad", "disgust", "bored", None], rows),
+        "confidence": rng.uniform(0.85, 1.0, rows).round(2),
+        "pose.pitch": rng.normal(5, 10, rows).round(2),
+        "pose.yaw": rng.normal(0, 15, rows).round(2),
+    })
+    frame.loc[rng.random(rows) < 0.05, "pose.pitch"] = np.nan
+    frame.loc[rng.random(rows) < 0.05, "pose.yaw"] = np.nan
+    return frame.astype(INPUT_SCHEMA)
+
+
+def assert_reports_match(result, expected, tolerance=PARITY_TOLERANCE):
+    """Region, institution and overall scores of two reports agree within ``tolerance``."""
+    for scores, expected_scores in zip(result[:2], expected[:2]):
+        assert sorted(scores.index) == sorted(expected_scores.index)
+        assert (scores - expected_scores).abs().max() <= tolerance
+    assert abs(result[2] - expected[2]) <= tolerance
+
+
+@pytest.fixture(scope="session")
+def dataset(tmp_path_factory):
+    """A generated CSV dataset, shared by the tests of a session."""
+    path = str(tmp_path_factory.mktemp("data") / "dataset.csv")
+    RegionalCollegeDataGenerator(seed=7).write_dataset(path, DATASET_ROWS)
+    return path
+
+
+@pytest.fixture
+def report_options():
+    """Options that keep a report run from touching the caches and metrics store of the checkout."""
+    return {"use_result_cache": False, "record_metrics": False}
@@ -0,0 +1,74 @@
+import math
+
+import pandas
+import pytest
+
+from cube import DIMENSIONS, EngagementCube
+from engine.report import find_common_viewpoint, generate_engagement_report
+from schema import read_report_csv
+from scoring import calculate_engagement_numpy
+
+# Largest difference between a cube statistic and the pandas groupby result
+CUBE_TOLERANCE = 1e-9
+
+
+@pytest.fixture(scope="module")
+def scored(dataset):
+    """The scored rows of ``dataset``, as the in-memory report scores them."""
+    data = read_report_csv(pandas, dataset)
+    processed = calculate_engagement_numpy(data, find_common_viewpoint(data))
+    processed = processed[processed["engagement_score"].notna()]
+    return processed.astype({dimension: object for dimension in DIMENSIONS})
+
+
+@pytest.fixture(scope="module")
+def cube(dataset):
+    cube = EngagementCube()
+    generate_engagement_report(dataset, backend="numpy", use_result_cache=False, record_metrics=False, cube=cube)
+    return cube
+
+
+def assert_matches_groupby(rows, frame, by):
+    grouped = frame.groupby(list(by), dropna=False)["engagement_score"]
+    expected = pandas.DataFrame({"mean": grouped.mean(), "count": grouped.size()})
+    assert len(rows) == len(expected)
+    for row in rows:
+        key = tuple(row[dimension] for dimension in by)
+        mean, count = expected.loc[key if len(key) > 1 else key[0]]
+        assert row["count"] == count
+        assert math.isclose(row["mean"], mean, abs_tol=CUBE_TOLERANCE)
+
+
+@pytest.mark.parametrize("dimension", DIMENSIONS)
+def test_rollup_matches_groupby(cube, scored, dimension):
+    assert_matches_groupby(cube.rollup([dimension]), scored, [dimension])
+
+
+def test_drill_down_matches_groupby(cube, scored):
+    region = scored["region"].iloc[0]
+    rows = cube.rollup(["college_name", "zone"], {"region": [region]})
+
+    assert_matches_groupby(rows, scored[scored["region"] == region], ["college_name", "zone"])
+
+
+def test_total_matches_the_report(cube, scored):
+    (total,) = cube.rollup()
+    assert total["count"] == len(scored)
+    assert math.isclose(total["mean"], scored["engagement_score"].mean(), abs_tol=CUBE_TOLERANCE)
+
+
+def test_cube_endpoint(dataset, scored, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "DATA_FILE", dataset)
+    generate_engagement_report(dataset, backend="numpy", use_result_cache=False, record_metrics=False)
+    client = app.app.test_client()
+
+    response = client.get("/cube?backend=numpy&by=region")
+    assert response.status_code == 200
+    assert_matches_groupby(response.get_json()["rows"], scored, ["region"])
+
+    zone = scored["zone"].iloc[0]
+    response = client.get(f"/cube?backend=numpy&by=emotion&zone={zone}")
+    assert_matches_groupby(response.get_json()["rows"], scored[scored["zone"] == zone], ["emotion"])
+    assert client.get("/cube?backend=numpy&by=bogus").status_code == 400
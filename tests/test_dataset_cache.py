@@ -0,0 +1,34 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+
+from dataset_cache import cache_path, file_fingerprint, load_scoring_frame, read_cache
+
+
+def test_warm_load_maps_the_cold_copy(dataset, tmp_path):
+    cold, cold_info = load_scoring_frame(dataset, cache_dir=str(tmp_path))
+    warm, warm_info = load_scoring_frame(dataset, cache_dir=str(tmp_path))
+
+    assert (cold_info["load_source"], warm_info["load_source"]) == ("cache-cold", "cache-warm")
+    assert warm.equals(cold)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_fingerprint_lives_in_the_arrow_file(dataset, tmp_path):
+    load_scoring_frame(dataset, cache_dir=str(tmp_path))
+    arrow_path = cache_path(dataset, str(tmp_path))
+    with pa.memory_map(arrow_path, "r") as source:
+        assert b"engagement_cache" in pa.ipc.open_file(source).schema.metadata
+
+    fingerprint = file_fingerprint(dataset)
+    assert read_cache(arrow_path, fingerprint) is not None
+    assert read_cache(arrow_path, dict(fingerprint, size=0)) is None
+
+
+def test_concurrent_cold_loads_write_once(dataset, tmp_path):
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda _: load_scoring_frame(dataset, cache_dir=str(tmp_path)), range(4)))
+
+    assert [info["load_source"] for _, info in results].count("cache-cold") == 1
+    assert all(frame.equals(results[0][0]) for frame, _ in results)
@@ -0,0 +1,43 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from generator import RegionalCollegeDataGenerator, main
+
+
+def test_small_datasets_fill_every_requested_shard(tmp_path):
+    output = str(tmp_path / "data.csv")
+    summary = RegionalCollegeDataGenerator(seed=3).write_dataset(output, 2000, batch_size=500, shards=8)
+
+    assert len(summary.files) == 8
+    with open(summary.manifest) as f:
+        manifest = json.load(f)
+    assert len(manifest["shards"]) == 8
+    assert all(shard["rows"] > 0 for shard in manifest["shards"])
+    assert sum(len(pd.read_csv(path)) for path in summary.files) == summary.rows == 2000
+
+
+def test_single_batch_is_still_sharded(tmp_path):
+    output = str(tmp_path / "data.csv")
+    summary = RegionalCollegeDataGenerator(seed=3).write_dataset(output, 2000, shards=3)
+
+    assert len(summary.files) == 3
+    assert not os.path.exists(output)
+    assert os.path.exists(summary.manifest)
+
+
+def test_more_shards_than_records_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        RegionalCollegeDataGenerator(seed=3).write_dataset(str(tmp_path / "data.csv"), 5, shards=8)
+    with pytest.raises(ValueError):
+        RegionalCollegeDataGenerator(seed=3).write_dataset(str(tmp_path / "data.csv"), 2000, shards=0)
+
+
+def test_main_reports_the_files_written(tmp_path, capsys):
+    output = str(tmp_path / "data.csv")
+    main(["--rows", "2000", "--seed", "3", "--shards", "3", "--output", output])
+
+    printed = capsys.readouterr().out
+    assert "Data saved to 3 csv shards, see " + os.path.splitext(output)[0] + ".manifest.json" in printed
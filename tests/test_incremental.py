@@ -0,0 +1,84 @@
+import math
+
+import pandas
+import pytest
+
+from aggregates import ScoreAccumulator
+from conftest import assert_reports_match
+from engine.report import generate_engagement_report, get_scoring_kernel
+from incremental import incremental_engagement_totals, save_state, state_path
+from schema import SchemaError, read_report_csv
+
+
+@pytest.fixture
+def growing_csv(dataset, tmp_path):
+    """A copy of the first half of ``dataset`` and a function appending the rest."""
+    with open(dataset, "rb") as f:
+        lines = f.readlines()
+    half = len(lines) // 2
+    path = str(tmp_path / "growing.csv")
+    with open(path, "wb") as f:
+        f.writelines(lines[:half])
+
+    def append_rest():
+        with open(path, "ab") as f:
+            f.writelines(lines[half:])
+
+    return path, append_rest
+
+
+def update(path, tolerance):
+    zone_median_pose, accumulator, info = incremental_engagement_totals(
+        path, "pandas", pandas, get_scoring_kernel("numpy"), tolerance=tolerance)
+    return zone_median_pose, accumulator.result(), info["mode"]
+
+
+def test_first_run_matches_full_report(growing_csv, report_options):
+    path, _ = growing_csv
+    _, result, mode = update(path, tolerance=math.inf)
+
+    assert mode == "full"
+    assert_reports_match(result, generate_engagement_report(path, **report_options))
+    assert update(path, tolerance=math.inf)[2] == "unchanged"
+
+
+def test_appended_rows_are_scored_with_the_stored_medians(growing_csv):
+    path, append_rest = growing_csv
+    zone_median_pose, _, _ = update(path, tolerance=math.inf)
+    append_rest()
+
+    _, result, mode = update(path, tolerance=math.inf)
+
+    expected = ScoreAccumulator()
+    expected.update(get_scoring_kernel("numpy")(read_report_csv(pandas, path), zone_median_pose))
+    assert mode == "incremental"
+    assert_reports_match(result, expected.result())
+
+
+def test_median_drift_beyond_tolerance_rescores_everything(growing_csv, report_options):
+    path, append_rest = growing_csv
+    update(path, tolerance=0.0)
+    append_rest()
+
+    _, result, mode = update(path, tolerance=0.0)
+
+    assert mode == "full"
+    assert_reports_match(result, generate_engagement_report(path, **report_options))
+
+
+def test_non_csv_input_is_rejected(tmp_path):
+    path = tmp_path / "data.parquet"
+    path.write_bytes(b"PAR1\xff\xfe")
+    with pytest.raises(SchemaError):
+        update(str(path), tolerance=0.0)
+
+
+@pytest.mark.parametrize("state", [{"offset": 0}, ["not", "a", "state"], None])
+def test_foreign_state_is_rebuilt(growing_csv, report_options, state):
+    path, _ = growing_csv
+    save_state(state_path(path, "pandas"), state)
+
+    _, result, mode = update(path, tolerance=math.inf)
+
+    assert mode == "full"
+    assert_reports_match(result, generate_engagement_report(path, **report_options))
@@ -0,0 +1,27 @@
+import pytest
+
+from live import LiveEngagement
+from schema import SchemaError
+
+
+def record(created_at, region="North", **fields):
+    return dict({"region": region, "college_name": "IIT Delhi", "zone": "center", "emotion": "happy",
+                 "confidence": 0.9, "pose.pitch": 1.0, "pose.yaw": 2.0, "created_at": created_at}, **fields)
+
+
+@pytest.mark.parametrize("label", [["North"], {"name": "North"}, 7])
+def test_non_string_labels_are_rejected(label):
+    live = LiveEngagement(window_seconds=60)
+    with pytest.raises(SchemaError):
+        live.ingest([record(0, region=label)])
+    assert live.snapshot["rows"] == 0
+
+
+def test_rows_leave_the_window_in_arrival_order():
+    live = LiveEngagement(window_seconds=60)
+    live.ingest([record(0, region="North"), record(30, region="South")])
+    live.ingest([record(80, region="East")])
+
+    assert live.snapshot["rows"] == 2
+    assert set(live.snapshot["region_scores"]) == {"South", "East"}
+    assert live.ingest([record(10)])["late"] == 1
@@ -0,0 +1,95 @@
+import math
+
+import pytest
+
+from conftest import assert_reports_match, scoring_frame
+from engine.report import (find_common_viewpoint, find_common_viewpoint_sketch, find_common_viewpoint_streaming,
+                           generate_engagement_report)
+from medians import BIN_WIDTH, PoseMedianSketch, category_codes, streaming_zone_medians
+from schema import POSE_COLUMNS, ZONES, read_report_csv
+
+# pandas may average the two middle float32 values in float32; the sketches average them in float64
+FLOAT32_ROUNDING = 1e-6
+
+
+def chunks_of(frame, size):
+    return [frame.iloc[start:start + size] for start in range(0, len(frame), size)]
+
+
+def groupby_medians(frame):
+    """``groupby().median()`` per zone on float64 copies of the pose columns."""
+    medians = frame.astype({column: "float64" for column in POSE_COLUMNS}).groupby(
+        "zone", observed=True)[POSE_COLUMNS].median()
+    return {zone: {f"median_{column.split('.')[1]}": float(medians.at[zone, column]) for column in POSE_COLUMNS}
+            for zone in ZONES if zone in medians.index}
+
+
+def assert_medians_equal(medians, expected, tolerance=0.0):
+    assert medians.keys() == expected.keys()
+    for zone, pose in expected.items():
+        for name, value in pose.items():
+            assert math.isclose(medians[zone][name], value, rel_tol=0, abs_tol=tolerance), (zone, name)
+
+
+@pytest.mark.parametrize("chunk_rows", [97, 500, 5_000])
+def test_exact_sketch_matches_groupby_median(chunk_rows):
+    frame = scoring_frame(rows=3_000, seed=5)
+    chunks = chunks_of(frame, chunk_rows)
+
+    medians = streaming_zone_medians(lambda: iter(chunks), mode="exact")
+
+    assert_medians_equal(medians, groupby_medians(frame))
+    assert_medians_equal(medians, find_common_viewpoint(frame), tolerance=FLOAT32_ROUNDING)
+
+
+def test_approximate_sketch_is_within_one_bucket():
+    frame = scoring_frame(rows=3_000, seed=6)
+
+    medians = streaming_zone_medians(lambda: iter(chunks_of(frame, 400)), mode="approx")
+
+    assert_medians_equal(medians, find_common_viewpoint(frame), tolerance=BIN_WIDTH)
+
+
+def test_in_memory_sketch_matches_groupby_median():
+    frame = scoring_frame(rows=3_000, seed=8)
+    assert_medians_equal(find_common_viewpoint_sketch(frame), groupby_medians(frame))
+
+
+def test_merged_sketches_match_one_sketch():
+    frame = scoring_frame(rows=3_000, seed=9)
+    whole = PoseMedianSketch().update(frame)
+    merged = PoseMedianSketch()
+    for chunk in chunks_of(frame, 700):
+        merged.merge(PoseMedianSketch().update(chunk))
+
+    assert (merged.counts == whole.counts).all()
+
+
+def test_streaming_medians_of_a_file_match_groupby(dataset):
+    import pandas
+
+    expected = groupby_medians(read_report_csv(pandas, dataset))
+    assert_medians_equal(find_common_viewpoint_streaming(dataset, chunksize=3_000), expected)
+
+
+def test_category_codes_mark_unknown_labels():
+    frame = scoring_frame(rows=500, seed=10)
+    codes = category_codes(frame["zone"], ZONES)
+
+    for label, code in zip(frame["zone"], codes):
+        assert code == (ZONES.index(label) if label in ZONES else -1)
+    assert (category_codes(["left", "back", None], ZONES) == [0, -1, -1]).all()
+
+
+@pytest.mark.parametrize("backend", ["pandas", "numpy"])
+def test_in_memory_approx_medians_match_streaming(dataset, report_options, backend):
+    expected = generate_engagement_report(dataset, backend, median_mode="approx", chunksize=3_000, **report_options)
+
+    result = generate_engagement_report(dataset, backend, median_mode="approx", **report_options)
+
+    assert_reports_match(result, expected)
+
+
+def test_unknown_median_mode_is_rejected(dataset, report_options):
+    with pytest.raises(ValueError, match="Unknown median mode"):
+        generate_engagement_report(dataset, median_mode="bogus", **report_options)
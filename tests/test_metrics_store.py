@@ -0,0 +1,82 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from metrics_store import MetricsSnapshot, MetricsStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MetricsStore(str(tmp_path / "metrics.db"), legacy_json=None)
+
+
+def numbers(sessions):
+    return [int(session["session"].split("_")[1]) for session in sessions]
+
+
+def test_concurrent_appends_get_consecutive_numbers(store):
+    backends = ["pandas", "numpy"] * 20
+    with ThreadPoolExecutor(8) as pool:
+        appended = list(pool.map(lambda backend: store.append(backend, 1.0), backends))
+
+    assert len({session["id"] for session in appended}) == len(backends)
+    for backend in ("pandas", "numpy"):
+        assert sorted(numbers(store.sessions(backend=backend))) == list(range(1, 21))
+
+
+def test_since_returns_only_newer_sessions(store):
+    first = store.append("pandas", 1.0)
+    later = [store.append("numpy", 2.0), store.append("pandas", 3.0)]
+
+    assert store.sessions(since=first["id"]) == later
+    assert store.sessions(since=later[-1]["id"]) == []
+    assert store.last_id() == later[-1]["id"]
+
+
+def test_compact_keeps_the_newest_sessions_per_backend(store):
+    for _ in range(5):
+        store.append("pandas", 1.0)
+        store.append("numpy", 1.0)
+
+    assert store.compact(keep_per_backend=2) == 6
+    assert numbers(store.sessions(backend="pandas")) == [4, 5]
+    assert numbers(store.sessions(backend="numpy")) == [4, 5]
+    assert numbers([store.append("pandas", 1.0)]) == [6]
+
+
+def test_compact_drops_old_sessions(store):
+    store.append("pandas", 1.0)
+    assert store.compact(max_age_days=1) == 0
+    assert store.compact(max_age_days=-1) == 1
+    assert store.count() == 0
+
+
+def test_legacy_json_is_imported_once(tmp_path):
+    legacy = tmp_path / "metrics_history.json"
+    legacy.write_text(json.dumps({"pandas": {"session_1": {"processing_time": 2.0},
+                                             "session_2": {"processing_time": 3.0}}}))
+    path = str(tmp_path / "metrics.db")
+
+    store = MetricsStore(path, legacy_json=str(legacy))
+    assert [session["processing_time"] for session in store.sessions(backend="pandas")] == [2.0, 3.0]
+    assert numbers([store.append("pandas", 4.0)]) == [3]
+    assert MetricsStore(path, legacy_json=str(legacy)).count() == 3
+
+
+def test_snapshot_reloads_after_compaction(store):
+    for _ in range(3):
+        store.append("pandas", 1.0)
+    snapshot = MetricsSnapshot(store).refresh()
+    assert len(snapshot.sessions) == 3
+
+    store.compact(keep_per_backend=1)
+    # Make sure the file version changes even on coarse mtime clocks
+    time.sleep(0.01)
+    latest = store.append("pandas", 2.0)
+    snapshot.refresh()
+
+    assert numbers(snapshot.sessions) == [3, 4]
+    assert snapshot.since(snapshot.ids[0]) == [latest]
+    assert snapshot.aggregates["pandas"]["sessions"] == 2
@@ -0,0 +1,40 @@
+import pytest
+
+from conftest import assert_reports_match
+from engine.report import generate_engagement_report
+from parallel import parallel_engagement_totals, split_byte_ranges
+
+
+def test_byte_ranges_cover_every_row_once(dataset):
+    ranges = split_byte_ranges(dataset, 7)
+    with open(dataset, "rb") as f:
+        header = f.readline()
+        body = f.read()
+
+    assert ranges[0][0] == len(header)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+    with open(dataset, "rb") as f:
+        parts = []
+        for start, end in ranges:
+            f.seek(start)
+            parts.append(f.read(end - start))
+    assert all(part.endswith(b"\n") for part in parts)
+    assert b"".join(parts) == body
+
+
+@pytest.mark.parametrize("median_mode", ["exact", "approx"])
+def test_workers_match_single_process(dataset, report_options, median_mode):
+    expected = generate_engagement_report(dataset, median_mode=median_mode, chunksize=5_000, **report_options)
+
+    result = generate_engagement_report(dataset, workers=2, median_mode=median_mode, **report_options)
+
+    assert_reports_match(result, expected)
+
+
+def test_small_ranges_match_single_process(dataset, report_options):
+    # Many more ranges than workers, so units are queued and merged out of order
+    expected = generate_engagement_report(dataset, **report_options)
+
+    zone_median_pose, accumulator = parallel_engagement_totals(dataset, "pandas", workers=3, range_bytes=64 * 1024)
+
+    assert_reports_match(accumulator.result(), expected)
@@ -0,0 +1,43 @@
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas
+import pytest
+
+from conftest import assert_reports_match
+from engine.report import generate_engagement_report
+from partitions import ensure_time_partitions, last_window, window_key
+
+
+def test_relative_windows_align_to_partitions():
+    start, end = last_window("30m", now=datetime(2024, 5, 1, 10, 7, 13), minutes=5)
+
+    assert (start, end) == (pandas.Timestamp("2024-05-01 09:40"), pandas.Timestamp("2024-05-01 10:10"))
+    later = last_window("30m", now=datetime(2024, 5, 1, 10, 9, 59), minutes=5)
+    assert window_key(later) == window_key((start, end))
+    assert last_window("30m", now=datetime(2024, 5, 1, 10, 7), minutes=None)[0] == pandas.Timestamp("2024-05-01 09:37")
+
+
+@pytest.fixture
+def window(dataset):
+    times = pandas.to_datetime(pandas.read_csv(dataset, usecols=["created_at"])["created_at"])
+    middle = times.min() + (times.max() - times.min()) / 2
+    return (middle - pandas.Timedelta(minutes=47)).isoformat(), (middle + pandas.Timedelta(minutes=31)).isoformat()
+
+
+def test_partitioned_window_matches_full_scan(dataset, report_options, window):
+    expected = generate_engagement_report(dataset, window=window, use_cache=False, **report_options)
+
+    assert_reports_match(generate_engagement_report(dataset, window=window, **report_options), expected)
+
+
+def test_concurrent_builds_write_once(dataset, tmp_path):
+    path = str(tmp_path / "copy.csv")
+    shutil.copy(dataset, path)
+
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda _: ensure_time_partitions(path), range(4)))
+
+    assert [built for _, built in results].count(True) == 1
+    assert not [entry for entry in tmp_path.iterdir() if entry.name.endswith(".tmp")]
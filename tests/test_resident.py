@@ -0,0 +1,24 @@
+import pytest
+
+from conftest import assert_reports_match
+from engine.report import generate_engagement_report, resident_engagement_report
+
+
+def test_resident_matches_in_memory_numpy(dataset, report_options, tmp_path):
+    expected = generate_engagement_report(dataset, backend="numpy", use_cache=False, **report_options)
+
+    result = generate_engagement_report(dataset, backend="numpy", resident=str(tmp_path), **report_options)
+
+    assert_reports_match(result, expected)
+
+
+@pytest.mark.parametrize("options", [{"backend": "pandas"}, {"backend": "numpy", "kernel": "reference"},
+                                     {"backend": "numpy", "median_mode": "approx"}])
+def test_resident_rejects_other_backends_and_modes(dataset, report_options, tmp_path, options):
+    with pytest.raises(ValueError):
+        generate_engagement_report(dataset, resident=str(tmp_path), **options, **report_options)
+
+
+def test_resident_runs_are_recorded_as_numpy_only(dataset, tmp_path):
+    with pytest.raises(ValueError):
+        resident_engagement_report(dataset, "pandas", str(tmp_path), record_metrics=False)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from conftest import scoring_frame
+from engine.report import calculate_engagement, find_common_viewpoint
+from scoring import SCORING_PARAMS, calculate_engagement_numpy
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_numpy_kernel_matches_reference_per_row(seed):
+    frame = scoring_frame(seed=seed)
+    medians = find_common_viewpoint(frame)
+
+    expected = calculate_engagement(frame.copy(), medians)["engagement_score"].to_numpy()
+    scores = calculate_engagement_numpy(frame.copy(), medians)["engagement_score"].to_numpy()
+
+    np.testing.assert_array_equal(scores, expected)
+
+
+def test_unknown_emotions_and_missing_values():
+    frame = scoring_frame(seed=3)
+    medians = find_common_viewpoint(frame)
+    scores = calculate_engagement_numpy(frame.copy(), medians)["engagement_score"]
+
+    # A zone without a median or a missing pose leaves the score undefined
+    undefined = ~frame["zone"].isin(list(medians)) | frame["pose.pitch"].isna() | frame["pose.yaw"].isna()
+    assert undefined.any()
+    assert scores[undefined].isna().all()
+    assert scores[~undefined].between(0, 100).all()
+
+    # Unknown and missing emotions weigh nothing, like a zero weight
+    unweighted = ~undefined & ~frame["emotion"].isin(list(SCORING_PARAMS["emotion_weights"]))
+    assert unweighted.any()
+    as_neutral = dict(SCORING_PARAMS, emotion_weights=dict(SCORING_PARAMS["emotion_weights"], neutral=0))
+    neutral = frame.copy()
+    neutral.loc[unweighted, "emotion"] = "neutral"
+    rescored = calculate_engagement_numpy(neutral, medians, params=as_neutral)["engagement_score"]
+    np.testing.assert_array_equal(scores[unweighted].to_numpy(), rescored[unweighted].to_numpy())
+
+
+def test_custom_parameters_match_reference():
+    frame = scoring_frame(seed=4)
+    medians = find_common_viewpoint(frame)
+    params = dict(SCORING_PARAMS, max_deviation=30, yaw_weight=0.5, pitch_weight=0.5,
+                  emotion_weights=dict(SCORING_PARAMS["emotion_weights"], happy=15))
+
+    expected = calculate_engagement(frame.copy(), medians, params)["engagement_score"].to_numpy()
+    scores = calculate_engagement_numpy(frame.copy(), medians, params)["engagement_score"].to_numpy()
+
+    np.testing.assert_array_equal(scores, expected)
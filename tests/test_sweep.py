@@ -0,0 +1,66 @@
+import threading
+
+import pandas
+import pytest
+
+from aggregates import ScoreAccumulator
+from conftest import assert_reports_match
+from engine.report import calculate_engagement, generate_engagement_report
+from schema import read_report_csv
+from sweep import sweep_engagement, variant_params
+
+VARIANTS = [{"name": "strict", "max_deviation": 30},
+            {"emotion_weights": {"happy": 10}, "yaw_weight": 0.5, "pitch_weight": 0.5}]
+
+
+@pytest.fixture(scope="module")
+def swept(dataset, tmp_path_factory):
+    return sweep_engagement(dataset, VARIANTS, directory=str(tmp_path_factory.mktemp("resident")))
+
+
+def as_report(variant):
+    region = pandas.Series({row["label"]: row["score"] for row in variant["region_scores"]})
+    institution = pandas.Series({row["label"]: row["score"] for row in variant["institution_scores"]})
+    return region, institution, variant["overall_score"]
+
+
+def test_baseline_matches_the_report(dataset, report_options, swept):
+    expected = generate_engagement_report(dataset, backend="numpy", use_cache=False, **report_options)
+
+    assert swept["variants"][0]["name"] == "baseline"
+    assert_reports_match(as_report(swept["variants"][0]), expected)
+    assert all(row["rank_change"] == 0 for row in swept["variants"][0]["region_scores"])
+
+
+@pytest.mark.parametrize("index", range(len(VARIANTS)))
+def test_variants_match_the_reference_scoring(dataset, swept, index):
+    overrides = dict(VARIANTS[index])
+    overrides.pop("name", None)
+    accumulator = ScoreAccumulator()
+    accumulator.update(calculate_engagement(read_report_csv(pandas, dataset), swept["zone_median_pose"],
+                                            params=variant_params(overrides)))
+
+    assert_reports_match(as_report(swept["variants"][index + 1]), accumulator.result())
+
+
+@pytest.mark.parametrize("overrides", [{"max_deviation": "30"}, {"max_deviation": 0}, {"yaw_weight": True},
+                                       {"emotion_weights": {"happy": None}}, {"emotion_weights": ["happy"]},
+                                       {"roll_weight": 1.0}])
+def test_invalid_variants_are_rejected(overrides):
+    with pytest.raises(ValueError):
+        variant_params(overrides)
+
+
+def test_sweep_endpoint_writes_resident_columns_on_first_use(dataset, monkeypatch, tmp_path):
+    import app
+
+    assert app.startup["resident"]["status"] == "off"
+    assert "resident-build" not in [thread.name for thread in threading.enumerate()]
+    monkeypatch.setattr(app, "DATA_FILE", dataset)
+    monkeypatch.setattr(app, "RESIDENT", str(tmp_path))
+
+    response = app.app.test_client().post("/sweep", json=VARIANTS)
+
+    assert response.status_code == 200
+    assert [variant["name"] for variant in response.get_json()["variants"]][0] == "baseline"
+    assert any(tmp_path.iterdir())